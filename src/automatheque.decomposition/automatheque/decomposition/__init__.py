@@ -2,30 +2,46 @@
 """Décomposition de chaînes et d'arborescences par patrons."""
 
 from .decomposeur import (
+    COMBINAISONS_AUTO,
     DECOMPOSE_ANALYSE_ARBO_COMPLETE,
     DECOMPOSE_ANALYSE_ARBO_CONCATENE,
     DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
     DECOMPOSE_RESULTAT_CUMULE,
     DECOMPOSE_RESULTAT_MAX_INFOS,
     DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    CacheRepertoires,
     Decomposable,
     Decomposeur,
     Decomposeurs,
     Identificateur,
+    resout_decomposeurs,
 )
 from .exceptions import DecompositionEchecPatron, DecompositionEchecTousPatrons
+from .index import IndexDecomposition
+from .lot import decompose_lot, decompose_lot_async, decompose_parallele
+from .ordre import OrdreAdaptatif
+from .profil import Profil
 
 __all__ = [
+    "COMBINAISONS_AUTO",
     "DECOMPOSE_ANALYSE_ARBO_COMPLETE",
     "DECOMPOSE_ANALYSE_ARBO_CONCATENE",
     "DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU",
     "DECOMPOSE_RESULTAT_CUMULE",
     "DECOMPOSE_RESULTAT_MAX_INFOS",
     "DECOMPOSE_RESULTAT_PREMIER_NON_NUL",
+    "CacheRepertoires",
     "Decomposable",
     "Decomposeur",
     "Decomposeurs",
     "DecompositionEchecPatron",
     "DecompositionEchecTousPatrons",
     "Identificateur",
+    "IndexDecomposition",
+    "OrdreAdaptatif",
+    "Profil",
+    "decompose_lot",
+    "decompose_lot_async",
+    "decompose_parallele",
+    "resout_decomposeurs",
 ]
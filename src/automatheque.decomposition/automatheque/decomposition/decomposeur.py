@@ -10,17 +10,26 @@ chaînes. Un chemin lui est donné, il en tire des informations ; c'est
 l'appelant qui décide ensuite quoi en faire.
 """
 
+import datetime
+import enum
+import functools
+import inspect
 import logging
 import pickle
 import re
-from copy import deepcopy
+import time
+from collections import OrderedDict
+from copy import copy, deepcopy
+from pathlib import PurePath
 
 import attr
 
 from automatheque.exceptions import ArgumentManquant
-from automatheque.util.repertoire import remonte_arborescence
+from automatheque.util.repertoire import Arborescence
 
 from .exceptions import DecompositionEchecPatron, DecompositionEchecTousPatrons
+from .fenetre import fenetre_de
+from .prefiltre import Prefiltre, prefiltre_de
 
 LOGGER = logging.getLogger(__name__)
 
@@ -56,23 +65,77 @@ DECOMPOSE_ANALYSE_ARBO_CONCATENE = "analyse_arbo_concatene"
 # confondre (un résultat vide vu comme *falsy*) faisait perdre une décomposition
 # gagnante et poursuivre l'analyse sur les répertoires parents. Cf. #116.
 _CONTINUER = object()
+# Aucune correspondance pour un patron (cf. `_exec_decomposition`).
+_ECHEC = object()
 
 
-def _valeurs_champs(obj):
-    """Valeurs des attributs de ``obj``, que sa classe soit à *slots* ou non.
+@functools.lru_cache(maxsize=None)
+def _noms_champs_attrs(classe):
+    """Noms des champs attrs d'une classe, ou None si elle n'est pas attrs."""
+    if not attr.has(classe):
+        return None
+    return tuple(a.name for a in attr.fields(classe))
+
+
+def _champs(obj):
+    """Attributs de ``obj`` et leurs valeurs, que sa classe soit à *slots* ou non.
 
     ``obj.__dict__`` n'existe pas sur une classe attrs à *slots* (`attrs.define`,
     le style moderne, et le défaut de la bibliothèque) : on passe alors par
-    ``attr.asdict`` (sans récursion, pour rester au niveau des attributs comme le
-    faisait ``__dict__``). Repli **explicite** sur ``[]`` plutôt qu'une
-    ``AttributeError`` avalée qui faisait échouer toute la décomposition. Cf. #116.
+    la liste des champs attrs (sans récursion, pour rester au niveau des
+    attributs comme le faisait ``__dict__``), mise en cache par classe : le score
+    de `MAX_INFOS` la consulte plusieurs fois par patron. Repli **explicite** sur
+    ``{}`` plutôt qu'une ``AttributeError`` avalée qui faisait échouer toute la
+    décomposition. Cf. #116.
+    """
+    noms = _noms_champs_attrs(type(obj))
+    if noms is not None:
+        return {nom: getattr(obj, nom) for nom in noms}
+    try:
+        return dict(vars(obj))
+    except TypeError:
+        return {}
+
+
+# Types dont une valeur ne peut pas être modifiée en place : un objet qui n'en
+# porte pas d'autres peut être copié superficiellement sans que ses copies
+# partagent quoi que ce soit de modifiable.
+_TYPES_IMMUABLES = (
+    str,
+    bytes,
+    int,
+    float,
+    complex,
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+    PurePath,
+    enum.Enum,
+    type(None),
+)
+
+
+def _immuable(valeur):
+    """Vrai si la valeur ne peut pas être modifiée en place."""
+    if isinstance(valeur, (tuple, frozenset)):
+        return all(_immuable(v) for v in valeur)
+    return isinstance(valeur, _TYPES_IMMUABLES)
+
+
+def _copie_superficielle_sure(obj):
+    """Vrai si une copie superficielle de l'objet vaut une copie profonde.
+
+    C'est le cas quand aucun de ses attributs — champs attrs ou attributs
+    d'instance — n'est modifiable en place : un appel en retour qui remplit la
+    copie ne peut alors qu'en **réaffecter** les attributs, sans toucher à
+    l'original.
     """
-    if attr.has(type(obj)):
-        return list(attr.asdict(obj, recurse=False).values())
+    valeurs = list(_champs(obj).values())
     try:
-        return list(vars(obj).values())
+        valeurs.extend(vars(obj).values())
     except TypeError:
-        return []
+        pass  # classe à *slots* : les champs suffisent
+    return all(_immuable(v) for v in valeurs)
 
 
 def _appel_source_par_defaut(obj, valeur):
@@ -80,6 +143,24 @@ def _appel_source_par_defaut(obj, valeur):
     return obj._prepare_decomposition(valeur)
 
 
+# Une `Arborescence` par racine, partagée par tous les fichiers analysés sous
+# elle : la racine n'est découpée qu'une fois.
+_arborescence = functools.lru_cache(maxsize=64)(Arborescence)
+
+
+@functools.lru_cache(maxsize=4096)
+def _patron(chaine, drapeaux):
+    """L'expression compilée d'un patron, son préfiltre et sa fenêtre.
+
+    Un même patron est instancié par chaque jeu qui le déclare, et un jeu l'est
+    parfois à chaque fichier : l'analyse de l'expression — compilation,
+    extraction du littéral obligatoire, calcul de la fenêtre — n'est faite
+    qu'une fois par processus, au premier `(chaine, drapeaux)` rencontré.
+    """
+    patron = re.compile(chaine, flags=drapeaux)
+    return patron, prefiltre_de(patron), fenetre_de(patron)
+
+
 @attr.s
 class Decomposeur(object):
     """Un patron de décomposition : une expression rationnelle et ses appels.
@@ -98,6 +179,13 @@ class Decomposeur(object):
     :param drapeaux: drapeaux passés à :func:`re.compile`
     :param poids: priorité du patron, utilisée par
                   :data:`DECOMPOSE_RESULTAT_MAX_INFOS`
+
+    À la compilation, le plus long littéral que toute correspondance contient
+    est extrait dans :attr:`prefiltre` (cf. :mod:`.prefiltre`) : une source qui
+    ne le contient pas est écartée d'un simple `in`, sans jouer l'expression.
+    S'y ajoute :attr:`fenetre` (cf. :mod:`.fenetre`), la partie d'une chaîne
+    construite par préfixes qu'il suffit de lire. Tout cela n'est calculé
+    qu'une fois par processus pour un même couple `(chaine, drapeaux)`.
     """
 
     chaine = attr.ib()
@@ -106,40 +194,99 @@ class Decomposeur(object):
     drapeaux = attr.ib(default=0)
     poids = attr.ib(default=1)
     compile = attr.ib(init=False, default=None)
+    prefiltre = attr.ib(init=False, default=None, eq=False, repr=False)
+    fenetre = attr.ib(init=False, default=None, eq=False, repr=False)
 
     def __attrs_post_init__(self):
         """Complète les propriétés déduites des autres."""
         if self.appel_source is None:
             self.appel_source = _appel_source_par_defaut
-        self.compile = re.compile(self.chaine, flags=self.drapeaux)
+        self.compile, prefiltre, self.fenetre = _patron(self.chaine, self.drapeaux)
+        if prefiltre is not None:
+            # Le préfiltre compte ses essais : chaque décomposeur a le sien.
+            prefiltre = Prefiltre(prefiltre.litteral, prefiltre.insensible)
+        self.prefiltre = prefiltre
 
     def _decomposer(self, obj, valeur=None, pos=None, endpos=None):
         """Applique l'expression rationnelle sur la source des données.
 
+        Une sous-classe peut le surcharger : l'identification l'appelle alors
+        à la place de sa propre recherche, sans cache, fenêtre ni mémo.
+
         :param valeur: si une valeur est donnée elle est passée à la fonction
                        :attr:`appel_source` qui prépare les données à
                        décomposer.
         """
+        return self._applique(self.appel_source(obj, valeur), pos=pos, endpos=endpos)
+
+    def _applique(self, source, pos=None, endpos=None):
+        """Applique l'expression rationnelle sur une source déjà obtenue."""
         # `pos is not None` et non `if pos` : 0 est une position valide (début de
         # chaîne), qu'un test de véracité écarterait. Et `endpos` fourni seul est
         # respecté au lieu d'être silencieusement jeté.
+        prefiltre = self.prefiltre
+        if prefiltre is not None and not prefiltre.laisse_passer(source, pos, endpos):
+            return []
         kwargs = {}
         if pos is not None:
             kwargs["pos"] = pos
         if endpos is not None:
             kwargs["endpos"] = endpos
 
-        return self.compile.findall(self.appel_source(obj, valeur), **kwargs)
+        return self.compile.findall(source, **kwargs)
+
+
+def _surcharge_decomposer(decomposeur):
+    """Vrai si la classe du décomposeur surcharge :meth:`Decomposeur._decomposer`."""
+    methode = getattr(type(decomposeur), "_decomposer", Decomposeur._decomposer)
+    return methode is not Decomposeur._decomposer
 
 
 @attr.s
 class Decomposeurs(object):
     """Classe « abstraite » dont doivent hériter tous les jeux de patrons.
 
+    :param ordre: :class:`~automatheque.decomposition.ordre.OrdreAdaptatif`
+                  qui, en `DECOMPOSE_RESULTAT_PREMIER_NON_NUL`, fait essayer
+                  d'abord les patrons qui réussissent le plus souvent ; sans
+                  lui, l'ordre est celui de :attr:`decomposeurs`
+
     TODO: rendre la classe vraiment abstraite !
     """
 
-    decomposeurs = attr.ib(init=False, factory=list)
+    decomposeurs: list = attr.ib(init=False, factory=list)
+    ordre = attr.ib(default=None, kw_only=True, eq=False)
+
+    # Jeux désignés par leur chemin d'import, partagés par tout le processus
+    # (cf. :meth:`depuis_chemin`).
+    _partages: dict = {}
+
+    @classmethod
+    def depuis_chemin(cls, chemin):
+        """Le jeu de patrons dont la classe a pour chemin d'import `chemin`.
+
+        La classe n'est importée (`pydoc.locate`) et instanciée qu'une fois par
+        processus : les appels suivants rendent **la même instance**, qu'il
+        ne faut donc pas modifier. Pour un jeu à part — combiné, ordonné… —,
+        instancier soi-même la classe.
+
+        :raise ArgumentManquant: si le chemin ne désigne aucune classe
+        """
+        jeu = Decomposeurs._partages.get(chemin)
+        if jeu is None:
+            from pydoc import locate
+
+            classe = locate(chemin)
+            if classe is None:
+                raise ArgumentManquant("decomposeurs")
+            jeu = Decomposeurs._partages.setdefault(chemin, classe())
+        return jeu
+
+    @staticmethod
+    def oublie_partages():
+        """Oublie les jeux partagés : le prochain :meth:`depuis_chemin` réimporte
+        et réinstancie."""
+        Decomposeurs._partages.clear()
 
     def __iter__(self):
         """Itère sur les décomposeurs."""
@@ -197,34 +344,28 @@ class Decomposable(object):
             return valeur
         return self.basename
 
-    def auto_decompose(self, racine=None, decomposeurs=None):
+    def auto_decompose(
+        self, racine=None, decomposeurs=None, cache=None, index=None, profil=None
+    ):
         """Essaie les combinaisons d'options jusqu'à ce que l'une réussisse.
 
-        Les combinaisons sont parcourues de la plus riche à la plus simple.
+        Les combinaisons sont parcourues de la plus riche à la plus simple, par
+        un même :class:`Identificateur` (cf. :meth:`Identificateur.identifie_auto`).
 
+        :param cache: :class:`CacheRepertoires` partagé entre objets
+        :param index: :class:`~automatheque.decomposition.index.IndexDecomposition`
+                      où retrouver, ou garder, le résultat
+        :param profil: :class:`~automatheque.decomposition.profil.Profil` où
+                       relever les statistiques des décomposeurs
         :raise DecompositionEchecTousPatrons: si aucune combinaison n'aboutit
         """
-        for options_resultat in [
-            DECOMPOSE_RESULTAT_MAX_INFOS,
-            DECOMPOSE_RESULTAT_CUMULE,
-            DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
-        ]:
-            for option in [
-                DECOMPOSE_ANALYSE_ARBO_COMPLETE,
-                DECOMPOSE_ANALYSE_ARBO_CONCATENE,
-            ]:
-                try:
-                    self.decompose(
-                        decomposeurs=decomposeurs,
-                        racine=racine,
-                        options_analyse=option,
-                        options_resultat=options_resultat,
-                    )
-                except DecompositionEchecTousPatrons:
-                    pass
-                else:
-                    return
-        raise DecompositionEchecTousPatrons()
+        identificateur = Identificateur(
+            self, decomposeurs=decomposeurs, cache=cache, profil=profil
+        )
+        if index is not None:
+            index.identifie(identificateur, racine=racine, auto=True)
+        else:
+            identificateur.identifie_auto(racine=racine)
 
     def decompose(
         self,
@@ -232,9 +373,29 @@ class Decomposable(object):
         racine=None,
         options_resultat=DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
         options_analyse=DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+        cache=None,
+        index=None,
+        profil=None,
     ):
-        """Décompose l'objet suivant les decomposeurs donnés."""
-        identificateur = Identificateur(self, decomposeurs=decomposeurs)
+        """Décompose l'objet suivant les decomposeurs donnés.
+
+        :param cache: :class:`CacheRepertoires` partagé entre objets
+        :param index: :class:`~automatheque.decomposition.index.IndexDecomposition`
+                      où retrouver le résultat sans jouer un seul patron si le
+                      fichier et les patrons n'ont pas changé, ou le garder
+        :param profil: :class:`~automatheque.decomposition.profil.Profil` où
+                       relever les statistiques des décomposeurs
+        """
+        identificateur = Identificateur(
+            self, decomposeurs=decomposeurs, cache=cache, profil=profil
+        )
+        if index is not None:
+            return index.identifie(
+                identificateur,
+                racine=racine,
+                options_resultat=options_resultat,
+                options_analyse=options_analyse,
+            )
         return identificateur.identifie(
             racine=racine,
             options_resultat=options_resultat,
@@ -242,6 +403,111 @@ class Decomposable(object):
         )
 
 
+# Les combinaisons d'options essayées par `auto_decompose`, de la plus riche à
+# la plus simple.
+COMBINAISONS_AUTO = tuple(
+    (options_resultat, options_analyse)
+    for options_resultat in (
+        DECOMPOSE_RESULTAT_MAX_INFOS,
+        DECOMPOSE_RESULTAT_CUMULE,
+        DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    )
+    for options_analyse in (
+        DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+        DECOMPOSE_ANALYSE_ARBO_CONCATENE,
+    )
+)
+
+
+def resout_decomposeurs(decomposeurs, obj=None):
+    """Renvoie l'instance de :class:`Decomposeurs` désignée par `decomposeurs`.
+
+    :param decomposeurs: une instance de :class:`Decomposeurs` (renvoyée
+                         telle quelle), la chaîne d'import de sa classe, ou
+                         None pour prendre ceux que `obj` renvoie par
+                         ``_decomposeurs_par_defaut()``
+    :param obj: l'objet à décomposer, consulté seulement à défaut de
+                décomposeurs
+    :raise ArgumentManquant: si aucun jeu de patrons n'a pu être trouvé
+    """
+    if not decomposeurs:
+        try:
+            decomposeurs = obj._decomposeurs_par_defaut()
+        except (AttributeError, NotImplementedError):
+            # L'objet n'est pas décomposable, ou ne propose pas de patrons
+            # par défaut : sans patron on ne peut rien identifier.
+            raise ArgumentManquant("decomposeurs")
+
+    if isinstance(decomposeurs, str):
+        # Cas où le decomposeur est donné par son chemin :
+        decomposeurs = Decomposeurs.depuis_chemin(decomposeurs)
+    return decomposeurs
+
+
+class CacheRepertoires(object):
+    """Cache LRU des correspondances trouvées dans les noms de répertoires.
+
+    En analyse `DECOMPOSE_ANALYSE_ARBO_COMPLETE`, chaque fichier fait
+    décomposer les noms de ses répertoires parents : les 5 000 épisodes rangés
+    dans 50 dossiers décomposent 5 000 fois les mêmes 50 noms. Passé à
+    l'identification (``decompose(cache=…)``, ``decompose_lot(cache=…)``…), ce
+    cache garde, par jeu de patrons et par nom de répertoire, ce que chaque
+    patron y a trouvé : les 50 dossiers ne sont plus décomposés que 50 fois.
+
+    Une entrée est remplie au fil des besoins — en `PREMIER_NON_NUL`, les
+    patrons suivant celui qui a réussi n'y figurent pas —, et seules les
+    **correspondances** sont gardées : les appels en retour sont rejoués sur
+    chaque objet.
+
+    :param taille_max: nombre de répertoires gardés ; au-delà, le moins
+                       récemment utilisé est oublié
+    :raise ValueError: si `taille_max` est inférieur à 1
+    """
+
+    def __init__(self, taille_max=1024):
+        if taille_max < 1:
+            raise ValueError("taille_max doit être >= 1")
+        self.taille_max = taille_max
+        self.succes = 0
+        self.echecs = 0
+        self._entrees = OrderedDict()
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def niveau(self, jeu, nom):
+        """L'entrée du répertoire `nom` pour le jeu de patrons `jeu`, créée vide
+        si elle manque : un dictionnaire `(patron compilé, source) -> résultats`.
+        """
+        cle = (jeu, nom)
+        entree = self._entrees.get(cle)
+        if entree is not None:
+            self.succes += 1
+            self._entrees.move_to_end(cle)
+            return entree
+        self.echecs += 1
+        entree = self._entrees[cle] = {}
+        if len(self._entrees) > self.taille_max:
+            self._entrees.popitem(last=False)
+        return entree
+
+    def vide(self):
+        """Oublie toutes les entrées et remet les compteurs à zéro."""
+        self._entrees.clear()
+        self.succes = self.echecs = 0
+
+    def statistiques(self):
+        """Compteurs du cache, en dictionnaire."""
+        demandes = self.succes + self.echecs
+        return {
+            "succes": self.succes,
+            "echecs": self.echecs,
+            "taux_succes": self.succes / demandes if demandes else 0.0,
+            "taille": len(self._entrees),
+            "taille_max": self.taille_max,
+        }
+
+
 @attr.s
 class Identificateur(object):
     """Identifie une chaîne grâce à une liste de décomposeurs.
@@ -259,6 +525,12 @@ class Identificateur(object):
                          ``"mon_paquet.decomposeurs_serie.SerieSaisonDecomposeurs"``.
                          À défaut, ceux que l'objet renvoie par
                          ``_decomposeurs_par_defaut()``.
+    :param cache: :class:`CacheRepertoires` où garder les correspondances
+                  trouvées dans les noms des répertoires parents, d'un objet à
+                  l'autre
+    :param profil: :class:`~automatheque.decomposition.profil.Profil` où
+                   relever, par décomposeur, appels, correspondances et temps
+                   passés ; sans profil, rien n'est mesuré
 
     TODO renommer DECOMPOSE_XX en IDENTIFIE_XXX
     TODO : attr utiliser validator et converter
@@ -266,31 +538,72 @@ class Identificateur(object):
 
     obj = attr.ib()
     decomposeurs = attr.ib(default=None)
+    cache = attr.ib(default=None, kw_only=True, repr=False)
+    profil = attr.ib(default=None, kw_only=True, repr=False)
+    _obj_temoin = attr.ib(init=False, default=None, repr=False)
+    # Longueur du témoin sérialisé : cf. `_score_max_infos`.
+    _taille_temoin = attr.ib(init=False, default=None, repr=False)
+    _temoin_copiable = attr.ib(init=False, default=False, repr=False)
+    # Mémos d'`identifie_auto`, le temps d'un appel (None en dehors) :
+    # correspondances par (patron, chaîne), et noms des parents par racine.
+    _memo_correspondances = attr.ib(init=False, default=None, repr=False)
+    _memo_parents = attr.ib(init=False, default=None, repr=False)
+    # Appels en retour joués sur l'objet, `(rang du décomposeur, résultats)`,
+    # quand on les relève (cf. `index.IndexDecomposition`) ; None sinon.
+    journal = attr.ib(init=False, default=None, repr=False)
 
     def __attrs_post_init__(self):
-        """Résout les décomposeurs et prend un témoin de l'objet d'origine."""
-        if not self.decomposeurs:
-            try:
-                self.decomposeurs = self.obj._decomposeurs_par_defaut()
-            except (AttributeError, NotImplementedError):
-                # L'objet n'est pas décomposable, ou ne propose pas de patrons
-                # par défaut : sans patron on ne peut rien identifier.
-                raise ArgumentManquant("decomposeurs")
-
-        if isinstance(self.decomposeurs, str):
-            # Cas où le decomposeur est donné par son chemin :
-            from pydoc import locate
+        """Résout les décomposeurs."""
+        self.decomposeurs = resout_decomposeurs(self.decomposeurs, self.obj)
+
+    @property
+    def obj_temoin(self):
+        """Copie de l'objet d'origine, à laquelle `MAX_INFOS` compare.
+
+        Prise au premier besoin — au début de la première identification en
+        `MAX_INFOS`, avant que l'objet ne soit rempli — et non à la création :
+        les autres modes n'en ont pas l'usage, et la copie profonde d'un objet
+        par fichier pèse sur les gros lots. Elle n'est d'ailleurs profonde que
+        si l'objet porte des valeurs modifiables en place (cf. :meth:`_copie_temoin`).
+        """
+        if self._obj_temoin is None:
+            # Calculés une fois pour toutes les comparaisons : le témoin ne
+            # change plus.
+            self._temoin_copiable = _copie_superficielle_sure(self.obj)
+            if self._temoin_copiable:
+                self._obj_temoin = copy(self.obj)
+            else:
+                self._obj_temoin = deepcopy(self.obj)
+            self._taille_temoin = len(pickle.dumps(self._obj_temoin))
+        return self._obj_temoin
+
+    def _copie_temoin(self):
+        """Une copie neuve du témoin, que remplira un seul décomposeur.
+
+        Chaque patron est jugé sur une copie **neuve** du témoin. Quand le
+        témoin ne porte que des valeurs immuables, une copie superficielle
+        suffit : l'appel en retour ne peut qu'en réaffecter les attributs.
+        Sinon — une liste d'étiquettes que l'appel en retour compléterait en
+        place, par exemple — la copie reste profonde.
+        """
+        temoin = self.obj_temoin
+        return copy(temoin) if self._temoin_copiable else deepcopy(temoin)
 
-            classe = locate(self.decomposeurs)
-            if classe is None:
-                raise ArgumentManquant("decomposeurs")
-            self.decomposeurs = classe()
+    def _exec_decomposition(
+        self, options_resultat, valeur=None, niveau=None, concatene=None
+    ):
+        """Joue tous les décomposeurs sur la valeur donnée.
 
-        # Pour comparer RESULTAT_MAX_INFOS il faut un objet témoin :
-        self.obj_temoin = deepcopy(self.obj)
+        :param niveau: entrée du :class:`CacheRepertoires` pour cette valeur :
+                       les correspondances déjà connues y sont prises, les
+                       nouvelles y sont gardées
+        :param concatene: en analyse concaténée, `(source, trouvé)` de chaque
+                          décomposeur au niveau précédent, mis à jour ici : les
+                          patrons qui le permettent ne lisent que la partie
+                          utile de la chaîne (cf. :mod:`.fenetre`)
 
-    def _exec_decomposition(self, options_resultat, valeur=None):
-        """Joue tous les décomposeurs sur la valeur donnée.
+        C'est un générateur d'étapes (cf. :func:`_conduit`) : il produit ce que
+        rendent les appels asynchrones, et en reçoit le résultat.
 
         :return: tuple `(decomposition_reussie, sortir)` où `sortir` porte le
                  résultat à renvoyer immédiatement (y compris une chaîne vide),
@@ -298,12 +611,35 @@ class Identificateur(object):
         """
         decomposition_reussie = False
         sortir = _CONTINUER
-        for decomposeur in self.decomposeurs:
-            LOGGER.debug(
-                "exec_decomposition : {} // {}".format(
-                    decomposeur.chaine, valeur or self.obj.basename
+        profil = self.profil
+        # L'ordre adaptatif ne vaut qu'ici : ailleurs, l'ordre des patrons
+        # compte pour le résultat (cumul, comparaison des candidats).
+        ordre = (
+            getattr(self.decomposeurs, "ordre", None)
+            if options_resultat == DECOMPOSE_RESULTAT_PREMIER_NON_NUL
+            else None
+        )
+        paires = (
+            enumerate(self.decomposeurs)
+            if ordre is None
+            else ordre.ordonne(self.decomposeurs)
+        )
+        # Une fois par passe, et non à chaque patron : les messages ne sont
+        # préparés que si quelqu'un les lit.
+        journalise = LOGGER.isEnabledFor(logging.DEBUG)
+        # Score de l'objet en `MAX_INFOS`, gardé tant qu'il n'est pas rempli.
+        score_obj = None
+        for index, decomposeur in paires:
+            if journalise:
+                LOGGER.debug(
+                    "exec_decomposition : %s // %s",
+                    decomposeur.chaine,
+                    valeur or self.obj.basename,
                 )
-            )
+            stats = None
+            if profil is not None:
+                stats = profil.stats(decomposeur)
+                stats.appels += 1
             # Le `try` ne couvre que l'**extraction** — propre à ce décomposeur
             # (sa source, sa regex). Un patron qui ne capture rien, ou dont la
             # source échoue, ne doit pas interrompre les autres : on journalise
@@ -313,57 +649,190 @@ class Identificateur(object):
             # « aucun patron trouvé » comme le faisait le `except Exception`
             # englobant d'origine.
             try:
-                resultats = decomposeur._decomposer(self.obj, valeur)
+                if _surcharge_decomposer(decomposeur):
+                    # Un `_decomposer` surchargé garde la main, comme à
+                    # l'origine : il obtient sa source et cherche lui-même.
+                    # Cache, fenêtre et mémo supposent la recherche standard :
+                    # il s'en passe.
+                    if concatene is not None:
+                        concatene.pop(id(decomposeur), None)
+                    debut = time.perf_counter()
+                    resultats = decomposeur._decomposer(self.obj, valeur)
+                    if inspect.isawaitable(resultats):
+                        resultats = yield resultats
+                    if stats is not None:
+                        stats.temps_regex += time.perf_counter() - debut
+                else:
+                    source = decomposeur.appel_source(self.obj, valeur)
+                    if not isinstance(source, str) and inspect.isawaitable(source):
+                        source = yield source
+                    endpos = None
+                    if concatene is not None:
+                        # Oublié d'abord : un échec d'extraction ne doit pas
+                        # laisser croire au niveau suivant que rien n'a été
+                        # trouvé.
+                        precedent = concatene.pop(id(decomposeur), None)
+                        if decomposeur.fenetre is not None:
+                            endpos = decomposeur.fenetre.fin(source, precedent)
+                    if stats is None:
+                        resultats = self._extrait(decomposeur, source, niveau, endpos)
+                    else:
+                        debut = time.perf_counter()
+                        resultats = self._extrait(decomposeur, source, niveau, endpos)
+                        stats.temps_regex += time.perf_counter() - debut
+                    if concatene is not None:
+                        concatene[id(decomposeur)] = (source, bool(resultats))
                 try:
                     resultats = resultats[0]
                 except IndexError:
-                    raise DecompositionEchecPatron(decomposeur)
+                    # Sans lever `DecompositionEchecPatron` : son message, qui
+                    # formate tout le décomposeur, se payait à chaque patron
+                    # sans correspondance.
+                    resultats = _ECHEC
             except DecompositionEchecPatron:
-                LOGGER.debug(
-                    "Echec de la décomposition: {} {}".format(
-                        valeur, decomposeur.chaine
-                    )
-                )
-                continue
+                resultats = _ECHEC
             except Exception:
+                if stats is not None:
+                    stats.erreurs += 1
+                if ordre is not None:
+                    ordre.note(decomposeur, False)
                 LOGGER.exception(
-                    "Echec durant l'extraction: {} {}".format(
-                        valeur, decomposeur.chaine
-                    )
+                    "Echec durant l'extraction: %s %s", valeur, decomposeur.chaine
                 )
                 continue
+            if resultats is _ECHEC:
+                if ordre is not None:
+                    ordre.note(decomposeur, False)
+                if journalise:
+                    LOGGER.debug(
+                        "Echec de la décomposition: %s %s", valeur, decomposeur.chaine
+                    )
+                continue
+            if stats is not None:
+                stats.correspondances += 1
+            if ordre is not None:
+                ordre.note(decomposeur, True)
 
             if options_resultat == DECOMPOSE_RESULTAT_PREMIER_NON_NUL:
                 # Puis on appelle le callback pour remplir l'objet :
-                decomposeur.appel_en_retour(self.obj, resultats)
+                yield from self._remplit(index, decomposeur, resultats)
                 decomposition_reussie = True
                 sortir = resultats
                 # on s'arrête ici
                 break
             elif options_resultat == DECOMPOSE_RESULTAT_CUMULE:
                 # Puis on appelle le callback pour remplir l'objet :
-                decomposeur.appel_en_retour(self.obj, resultats)
+                yield from self._remplit(index, decomposeur, resultats)
                 decomposition_reussie = True
                 # mais on continue le traitement :
                 continue
             elif options_resultat == DECOMPOSE_RESULTAT_MAX_INFOS:
-                obj_temoin = deepcopy(self.obj_temoin)
-                decomposeur.appel_en_retour(obj_temoin, resultats)
+                candidat = self._copie_temoin()
+                yield from self._appel_en_retour(decomposeur, candidat, resultats)
 
-                # On compare la taille des deux objets sérialisés, grosso modo.
-                # On n'attribue un modificateur qu'à l'objet témoin pour prendre
+                # On compare la quantité d'informations des deux objets, grosso
+                # modo. On n'attribue un modificateur qu'au candidat pour prendre
                 # en compte la « qualité » du décomposeur en cours.
-                temoin = self._score_max_infos(obj_temoin, decomposeur.poids)
-                if temoin >= self._score_max_infos(self.obj):
+                temoin = self._score_max_infos(candidat, decomposeur.poids)
+                if score_obj is None:
+                    score_obj = self._score_max_infos(self.obj)
+                if temoin >= score_obj:
                     # Puis on appelle le callback pour remplir l'objet :
-                    decomposeur.appel_en_retour(self.obj, resultats)
+                    yield from self._remplit(index, decomposeur, resultats)
                     decomposition_reussie = True
+                    score_obj = None  # l'objet a changé
                 # mais on continue le traitement :
                 continue
 
-        LOGGER.debug("exec decomposition obj resultant : {}".format(self.obj))
+        if journalise:
+            LOGGER.debug("exec decomposition obj resultant : %s", self.obj)
         return (decomposition_reussie, sortir)
 
+    def _extrait(self, decomposeur, source, niveau, endpos=None):
+        """Ce que le décomposeur trouve dans la source : pris dans l'entrée du
+        cache s'il y est, cherché sinon.
+
+        :param endpos: fin de la partie de la source à lire, quand elle suffit
+                       à trouver la même première correspondance
+        """
+        cle = (decomposeur.compile, source)
+        resultats = niveau.get(cle) if niveau is not None else None
+        if resultats is None:
+            resultats = self._correspondances(decomposeur, source, endpos)
+            if niveau is not None:
+                niveau[cle] = resultats
+        return resultats
+
+    def _appel_en_retour(self, decomposeur, obj, resultats):
+        """Joue l'appel en retour du décomposeur — attendu s'il est asynchrone —,
+        chronométré s'il y a un profil. Générateur d'étapes."""
+        profil = self.profil
+        if profil is not None:
+            debut = time.perf_counter()
+        try:
+            retour = decomposeur.appel_en_retour(obj, resultats)
+            if retour is not None and inspect.isawaitable(retour):
+                yield retour
+        finally:
+            if profil is not None:
+                stats = profil.stats(decomposeur)
+                stats.temps_appel_en_retour += time.perf_counter() - debut
+
+    def _remplit(self, index, decomposeur, resultats):
+        """Reverse les résultats dans l'objet, et le note au journal s'il y en a.
+        Générateur d'étapes."""
+        yield from self._appel_en_retour(decomposeur, self.obj, resultats)
+        if self.journal is not None:
+            self.journal.append((index, resultats))
+
+    def _correspondances(self, decomposeur, source, endpos=None):
+        """Ce que le décomposeur trouve dans la source, mémorisé si demandé.
+
+        Ce que trouve un patron dans une chaîne ne dépend que des deux : le
+        résultat est réutilisable d'une combinaison d'options à l'autre. Lue
+        jusqu'à `endpos` seulement, la source peut donner moins de
+        correspondances (la première est la même) : elle est mémorisée à part.
+        """
+        memo = self._memo_correspondances
+        if memo is None:
+            return decomposeur._applique(source, endpos=endpos)
+        cle = (decomposeur.compile, source, endpos)
+        try:
+            return memo[cle]
+        except KeyError:
+            resultats = memo[cle] = decomposeur._applique(source, endpos=endpos)
+            return resultats
+
+    def _niveau(self, nom):
+        """L'entrée du cache pour le répertoire `nom`, ou None sans cache."""
+        if self.cache is None:
+            return None
+        jeu = tuple(d.compile for d in self.decomposeurs)
+        return self.cache.niveau(jeu, nom)
+
+    def _noms_parents(self, racine):
+        """Noms des répertoires qui séparent l'objet de la racine, du plus proche
+        au plus lointain — ou None si la racine ne contient pas l'objet.
+
+        La remontée lève `ValueError` si le fichier n'est pas sous
+        `racine` : c'est un échec d'**analyse** (cette racine ne s'applique
+        pas), pas une panne. On le traduit donc en « rien trouvé par cette
+        option » plutôt que de laisser l'exception interrompre la boucle. #116
+        Seule la remontée est sous le `try` : un `ValueError` levé par un
+        `appel_en_retour` est un bug de l'appelant, et remonte.
+        """
+        memo = self._memo_parents
+        if memo is not None and racine in memo:
+            return memo[racine]
+        try:
+            noms = _arborescence(racine).noms(self.obj.source)
+        except ValueError:
+            LOGGER.debug("racine %r ne contient pas le fichier", racine)
+            noms = None
+        if memo is not None:
+            memo[racine] = noms
+        return noms
+
     def _score_max_infos(self, obj, poids=None):
         """Estime la quantité d'informations portée par un objet décomposé.
 
@@ -372,7 +841,9 @@ class Identificateur(object):
         * modificateur lié au poids du décomposeur en cours ; 2 pour l'objet
           déjà décomposé, afin de favoriser les infos préexistantes ;
         * nombre de champs non vides : bonus au plus rempli ;
-        * longueur des infos de l'objet relativement à l'objet témoin.
+        * longueur de l'objet sérialisé (`pickle`) relativement au témoin.
+          Le témoin n'est sérialisé qu'une fois ; la longueur compte tout ce
+          que `pickle` écrit, attributs d'instance hors champs attrs compris.
 
         Ce qui rapporte le plus est le nombre de champs non vides.
 
@@ -387,9 +858,11 @@ class Identificateur(object):
         """
         modificateur = 2 if poids is None else poids
 
-        nb_champs_non_vides = 2 * len([v for v in _valeurs_champs(obj) if v])
+        champs = _champs(obj)
+        nb_champs_non_vides = 2 * len([v for v in champs.values() if v])
 
-        longueur_relative = len(pickle.dumps(obj)) / len(pickle.dumps(self.obj_temoin))
+        self.obj_temoin  # garantit le calcul de la taille du témoin
+        longueur_relative = len(pickle.dumps(obj)) / self._taille_temoin
         return longueur_relative + modificateur + nb_champs_non_vides
 
     def identifie(
@@ -413,49 +886,77 @@ class Identificateur(object):
         :param options_analyse: une constante `DECOMPOSE_ANALYSE_*`, ou une
                                 collection de constantes pour les cumuler
         :raise DecompositionEchecTousPatrons: si aucun patron n'aboutit
+        :raise TypeError: si un appel de décomposeur est asynchrone (cf.
+                          :meth:`identifie_async`)
+        """
+        return _conduit(self._identification(racine, options_resultat, options_analyse))
+
+    async def identifie_async(
+        self,
+        racine=None,
+        options_resultat=DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+        options_analyse=DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+    ):
+        """Comme :meth:`identifie`, en attendant les appels asynchrones.
+
+        `appel_source` et `appel_en_retour` peuvent alors être des fonctions
+        `async` — lire un fichier annexe, interroger une base… — attendues
+        sans bloquer la boucle : d'autres identifications avancent pendant ce
+        temps (cf. :func:`~automatheque.decomposition.decompose_lot_async`).
+        Les appels ordinaires restent acceptés, et l'algorithme est le même.
         """
+        return await _conduit_async(
+            self._identification(racine, options_resultat, options_analyse)
+        )
+
+    def _identification(self, racine, options_resultat, options_analyse):
+        """Le corps de :meth:`identifie`, en générateur d'étapes."""
         # Une seule option est le cas courant ; on normalise pour que le test
         # d'appartenance ci-dessous soit une vraie appartenance et non une
         # recherche de sous-chaîne.
         if isinstance(options_analyse, str):
             options_analyse = (options_analyse,)
+        if options_resultat == DECOMPOSE_RESULTAT_MAX_INFOS:
+            # Le témoin doit être pris avant que la première passe ne remplisse
+            # l'objet.
+            self.obj_temoin
+
+        # Ce que chaque patron a trouvé au niveau précédent de l'analyse
+        # concaténée, qui ne relit ainsi que la partie utile de chaque chaîne
+        # (cf. `fenetre`). Le basename en est le premier niveau.
+        concatene = {} if DECOMPOSE_ANALYSE_ARBO_CONCATENE in options_analyse else None
 
         # Première décomposition :
-        succes, sortir = self._exec_decomposition(options_resultat=options_resultat)
+        succes, sortir = yield from self._exec_decomposition(
+            options_resultat=options_resultat, concatene=concatene
+        )
         if sortir is not _CONTINUER:
             return sortir
 
         # TODO par défaut on prend self.obj.source et basename comme valeurs
         # on pourrait en prendre d'autres et/ou le rendre paramétrable
-        #
-        # `remonte_arborescence` lève `ValueError` si le fichier n'est pas sous
-        # `racine` : c'est un échec d'**analyse** (cette racine ne s'applique
-        # pas), pas une panne. On le traduit donc en « rien trouvé par cette
-        # option » plutôt que de laisser l'exception interrompre la boucle. #116
         if DECOMPOSE_ANALYSE_ARBO_COMPLETE in options_analyse:
-            try:
-                for parent in remonte_arborescence(self.obj.source, racine):
-                    succes_, sortir = self._exec_decomposition(
-                        options_resultat=options_resultat, valeur=parent.name
-                    )
-                    succes = succes if succes else succes_
-                    if sortir is not _CONTINUER:
-                        return sortir
-            except ValueError:
-                LOGGER.debug("racine %r ne contient pas le fichier", racine)
+            for nom in self._noms_parents(racine) or ():
+                succes_, sortir = yield from self._exec_decomposition(
+                    options_resultat=options_resultat,
+                    valeur=nom,
+                    niveau=self._niveau(nom),
+                )
+                succes = succes if succes else succes_
+                if sortir is not _CONTINUER:
+                    return sortir
         if DECOMPOSE_ANALYSE_ARBO_CONCATENE in options_analyse:
             valeur_orig = self.obj.basename
-            try:
-                for parent in remonte_arborescence(self.obj.source, racine):
-                    valeur_orig = "{} {}".format(parent.name, valeur_orig)
-                    succes_, sortir = self._exec_decomposition(
-                        options_resultat=options_resultat, valeur=valeur_orig
-                    )
-                    succes = succes if succes else succes_
-                    if sortir is not _CONTINUER:
-                        return sortir
-            except ValueError:
-                LOGGER.debug("racine %r ne contient pas le fichier", racine)
+            for nom in self._noms_parents(racine) or ():
+                valeur_orig = "{} {}".format(nom, valeur_orig)
+                succes_, sortir = yield from self._exec_decomposition(
+                    options_resultat=options_resultat,
+                    valeur=valeur_orig,
+                    concatene=concatene,
+                )
+                succes = succes if succes else succes_
+                if sortir is not _CONTINUER:
+                    return sortir
         # TODO comparer les infos trouvées et ne garder que la meilleure
         # Pour l'instant on fait comme filebot : on s'arrête à la première.
 
@@ -463,3 +964,91 @@ class Identificateur(object):
         if not succes:
             raise DecompositionEchecTousPatrons()
         return None
+
+    def identifie_auto(self, racine=None):
+        """Essaie les combinaisons d'options jusqu'à ce que l'une réussisse.
+
+        Les combinaisons (cf. :data:`COMBINAISONS_AUTO`) sont parcourues de la
+        plus riche à la plus simple. Elles analysent toutes les mêmes chaînes :
+        ce que chaque patron trouve dans chaque chaîne, et la remontée de
+        l'arborescence, sont donc mémorisés le temps de l'appel. Un objet qui
+        n'aboutit qu'à la dernière combinaison ne coûte ainsi qu'une passe de
+        chaque patron par niveau, et non six.
+
+        :raise DecompositionEchecTousPatrons: si aucune combinaison n'aboutit
+        """
+        return _conduit(self._identification_auto(racine))
+
+    async def identifie_auto_async(self, racine=None):
+        """Comme :meth:`identifie_auto`, en attendant les appels asynchrones
+        (cf. :meth:`identifie_async`)."""
+        return await _conduit_async(self._identification_auto(racine))
+
+    def _identification_auto(self, racine):
+        """Le corps de :meth:`identifie_auto`, en générateur d'étapes."""
+        self._memo_correspondances = {}
+        self._memo_parents = {}
+        try:
+            for options_resultat, options_analyse in COMBINAISONS_AUTO:
+                try:
+                    return (
+                        yield from self._identification(
+                            racine, options_resultat, options_analyse
+                        )
+                    )
+                except DecompositionEchecTousPatrons:
+                    pass
+            raise DecompositionEchecTousPatrons()
+        finally:
+            self._memo_correspondances = None
+            self._memo_parents = None
+
+
+# L'algorithme d'identification est écrit une fois, en générateurs d'« étapes » :
+# quand un appel de décomposeur rend un objet à attendre (une coroutine), le
+# générateur le produit et reçoit en retour le résultat de l'attente. Deux
+# conducteurs le mènent à terme : `_conduit`, synchrone, pour qui aucun appel
+# n'est asynchrone, et `_conduit_async`, qui attend ce qui doit l'être.
+
+
+def _conduit(etapes):
+    """Mène à terme un générateur d'étapes dont aucun appel n'est asynchrone.
+
+    :raise TypeError: si un appel rend un objet à attendre
+    """
+    try:
+        attente = next(etapes)
+    except StopIteration as fin:
+        return fin.value
+    etapes.close()
+    if inspect.iscoroutine(attente):
+        # Fermée plutôt qu'oubliée : pas d'avertissement « never awaited ».
+        attente.close()
+    raise TypeError(
+        "un appel de décomposeur est asynchrone : utiliser identifie_async()"
+    )
+
+
+async def _conduit_async(etapes):
+    """Mène à terme un générateur d'étapes, en attendant ce qu'il produit.
+
+    Une exception levée par l'attente est renvoyée dans le générateur, là où
+    l'appel a été fait : elle y est traitée comme l'aurait été celle d'un
+    appel ordinaire.
+    """
+    envoi = erreur = None
+    try:
+        while True:
+            try:
+                if erreur is None:
+                    attente = etapes.send(envoi)
+                else:
+                    attente, erreur = etapes.throw(erreur), None
+            except StopIteration as fin:
+                return fin.value
+            try:
+                envoi = await attente
+            except Exception as exc:
+                envoi, erreur = None, exc
+    finally:
+        etapes.close()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Fenêtre d'analyse des patrons, pour l'analyse concaténée.
+
+`DECOMPOSE_ANALYSE_ARBO_CONCATENE` analyse le nom du fichier, puis
+« parent nom », puis « grand-parent parent nom »… : chaque niveau préfixe la
+chaîne précédente, et la relire entièrement à chaque niveau rend l'analyse
+quadratique en profondeur. Pour certains patrons, une partie bornée de la
+chaîne suffit — on la leur passe en `endpos` :
+
+* un patron **ancré en tête** (``^`` ou ``\\A``) de largeur bornée `L` ne peut
+  trouver que dans les `L` premiers caractères, quelle que soit la suite ;
+* un patron **sans ancre ni assertion** de largeur bornée `L`, qui n'a rien
+  trouvé dans la chaîne du niveau précédent, ne peut trouver dans la nouvelle
+  qu'une correspondance qui **commence** dans le segment ajouté : il suffit de
+  lire ce segment et `L` caractères de plus.
+
+Dans les deux cas, la correspondance trouvée est celle qu'aurait donnée la
+chaîne entière. Les autres patrons — largeur non bornée, fin de chaîne (``$``),
+assertions, références arrière… — la lisent toujours en entier.
+"""
+
+import re
+
+from .prefiltre import _constants, _parser
+
+_ASSERTIONS = (
+    _constants.ASSERT,
+    _constants.ASSERT_NOT,
+    _constants.GROUPREF,
+    _constants.GROUPREF_EXISTS,
+)
+# Frontières de mot : elles consultent un caractère de part et d'autre, d'où
+# le caractère de marge de la fenêtre de tête.
+_FRONTIERES = (_constants.AT_BOUNDARY, _constants.AT_NON_BOUNDARY)
+
+
+def _elements(arbre):
+    """Tous les `(op, arg)` de l'arbre, sous-arbres compris."""
+    for op, arg in arbre:
+        yield op, arg
+        if isinstance(arg, _parser.SubPattern):
+            yield from _elements(arg)
+        elif isinstance(arg, (tuple, list)):
+            for sous in arg:
+                if isinstance(sous, _parser.SubPattern):
+                    yield from _elements(sous)
+                elif isinstance(sous, list):
+                    for branche in sous:
+                        if isinstance(branche, _parser.SubPattern):
+                            yield from _elements(branche)
+
+
+class Fenetre(object):
+    """Ce qu'un patron a besoin de lire d'une chaîne construite par préfixes.
+
+    :param largeur: largeur maximale d'une correspondance
+    :param en_tete: vrai si le patron est ancré en tête de chaîne
+    """
+
+    __slots__ = ("largeur", "en_tete")
+
+    def __init__(self, largeur, en_tete):
+        self.largeur = largeur
+        self.en_tete = en_tete
+
+    def __repr__(self):
+        return "Fenetre(largeur={}, en_tete={})".format(self.largeur, self.en_tete)
+
+    def fin(self, source, precedent=None):
+        """L'`endpos` suffisant pour analyser `source`, ou None s'il faut tout lire.
+
+        :param precedent: `(source, trouvé)` du niveau précédent pour ce
+                          patron, s'il est connu
+        """
+        if self.en_tete:
+            fin = self.largeur + 1
+        elif (
+            precedent is not None and not precedent[1] and source.endswith(precedent[0])
+        ):
+            fin = len(source) - len(precedent[0]) + self.largeur
+        else:
+            return None
+        return fin if fin < len(source) else None
+
+
+def fenetre_de(patron):
+    """La :class:`Fenetre` d'un patron compilé, ou None s'il doit tout lire."""
+    try:
+        arbre = _parser.parse(patron.pattern, patron.flags)
+        largeur = arbre.getwidth()[1]
+    except Exception:  # l'analyseur est interne à `re` : on ne s'y fie pas
+        return None
+    if largeur >= _constants.MAXREPEAT - 1:
+        return None
+    elements = list(arbre)
+    en_tete = bool(elements) and elements[0] in (
+        (_constants.AT, _constants.AT_BEGINNING_STRING),
+        (_constants.AT, _constants.AT_BEGINNING),
+    )
+    if en_tete and elements[0][1] is _constants.AT_BEGINNING:
+        # Sous `re.MULTILINE`, « ^ » vaut aussi après chaque saut de ligne.
+        en_tete = not patron.flags & re.MULTILINE
+    reste = elements[1:] if en_tete else elements
+    for op, arg in _elements(reste):
+        if op in _ASSERTIONS:
+            return None
+        if op is _constants.AT and not (en_tete and arg in _FRONTIERES):
+            return None
+    return Fenetre(largeur, en_tete)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""Index persistant des décompositions.
+
+Une bibliothèque redécomposée chaque nuit ne change presque pas d'une nuit à
+l'autre. :class:`IndexDecomposition` garde, dans une base SQLite, ce que la
+décomposition de chaque fichier a donné, et le rejoue sans passer une seule
+expression régulière tant que rien n'a bougé.
+
+Une entrée est retrouvée par le chemin du fichier, le jeu de patrons et les
+options — et, si le jeu a un
+:class:`~automatheque.decomposition.ordre.OrdreAdaptatif`, l'ordre dans
+lequel ses patrons seront essayés : en `DECOMPOSE_RESULTAT_PREMIER_NON_NUL`,
+c'est lui qui désigne le gagnant. Elle n'est valable que si la date de
+modification et la taille du fichier sont celles relevées, et si l'empreinte
+du jeu de patrons n'a pas changé : modifier un patron, ses drapeaux, son poids
+ou ses appels invalide toutes les entrées qu'il a produites.
+
+Ce n'est pas l'objet rempli qui est gardé, mais le **journal** des appels en
+retour joués dessus — rang du décomposeur et captures. Le rejouer sur un objet
+neuf le remplit à l'identique, sans rien exiger de ses champs : l'index
+suppose seulement, comme la décomposition elle-même, que l'objet est construit
+de la même façon d'une fois à l'autre.
+
+Exemple ::
+
+    with IndexDecomposition() as index:
+        for ep in episodes:
+            ep.decompose(decomposeurs=SerieDecomposeurs(), index=index)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+from automatheque import constantes
+
+from .decomposeur import (
+    COMBINAISONS_AUTO,
+    DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+    DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    _conduit,
+)
+from .exceptions import DecompositionEchecTousPatrons
+
+LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decompositions (
+    chemin TEXT NOT NULL,
+    jeu TEXT NOT NULL,
+    options TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    taille INTEGER NOT NULL,
+    reussie INTEGER NOT NULL,
+    journal TEXT NOT NULL,
+    valeur TEXT NOT NULL,
+    PRIMARY KEY (chemin, jeu, options)
+)
+"""
+
+
+def chemin_index_par_defaut():
+    """``<config>/automatheque.decomposition/index.sqlite``."""
+    return os.path.join(
+        constantes.repertoire_config_script("automatheque.decomposition"),
+        "index.sqlite",
+    )
+
+
+def _nom_appel(appel):
+    return "{}.{}".format(
+        getattr(appel, "__module__", None),
+        getattr(appel, "__qualname__", repr(appel)),
+    )
+
+
+def empreinte_jeu(decomposeurs):
+    """Empreinte d'un jeu de patrons : change dès qu'un patron est modifié.
+
+    Elle porte sur la classe du jeu et, pour chaque décomposeur dans l'ordre,
+    son expression, ses drapeaux, son poids et le nom de ses appels. Le
+    **corps** des appels n'y entre pas : changer ce que fait un
+    `appel_en_retour` sans le renommer demande de vider l'index.
+    """
+    description = [_nom_appel(type(decomposeurs))]
+    for d in decomposeurs:
+        description.append(
+            [
+                d.chaine,
+                int(d.drapeaux),
+                d.poids,
+                _nom_appel(d.appel_source),
+                _nom_appel(d.appel_en_retour),
+            ]
+        )
+    texte = json.dumps(description, ensure_ascii=False)
+    return hashlib.sha256(texte.encode("utf-8")).hexdigest()
+
+
+def _encode(valeur):
+    """JSON d'un résultat de `findall` : les tuples sont distingués des chaînes."""
+    if isinstance(valeur, tuple):
+        return {"t": [_encode(v) for v in valeur]}
+    return valeur
+
+
+def _decode(valeur):
+    if isinstance(valeur, dict):
+        return tuple(_decode(v) for v in valeur["t"])
+    return valeur
+
+
+class IndexDecomposition(object):
+    """Index SQLite des décompositions, valable tant que rien n'a changé.
+
+    :param chemin: fichier de la base ; par défaut
+                   :func:`chemin_index_par_defaut`. ``":memory:"`` donne un
+                   index éphémère.
+    :param lot_ecritures: nombre d'écritures groupées par transaction ; tout
+                          est de toute façon validé à la fermeture
+    """
+
+    def __init__(self, chemin=None, lot_ecritures=500):
+        self.chemin = chemin or chemin_index_par_defaut()
+        if self.chemin != ":memory:":
+            os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+        self._connexion = sqlite3.connect(self.chemin)
+        self._connexion.execute(_SCHEMA)
+        self._lot_ecritures = lot_ecritures
+        self._en_attente = 0
+        # Empreinte par jeu de patrons, recalculée si le jeu change.
+        self._empreintes = {}
+        self.succes = 0
+        self.echecs = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.ferme()
+
+    def ferme(self):
+        """Valide les écritures en attente et ferme la base."""
+        if self._connexion is not None:
+            self._connexion.commit()
+            self._connexion.close()
+            self._connexion = None
+
+    def vide(self):
+        """Oublie toutes les entrées."""
+        self._connexion.execute("DELETE FROM decompositions")
+        self._connexion.commit()
+        self._en_attente = 0
+
+    def _empreinte(self, decomposeurs):
+        signature = (type(decomposeurs), *decomposeurs)
+        connue = self._empreintes.get(id(decomposeurs))
+        if connue is not None and connue[0] == signature:
+            return connue[1]
+        empreinte = empreinte_jeu(decomposeurs)
+        self._empreintes[id(decomposeurs)] = (signature, empreinte)
+        return empreinte
+
+    def identifie(
+        self,
+        identificateur,
+        racine=None,
+        options_resultat=DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+        options_analyse=DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+        auto=False,
+    ):
+        """Comme `identificateur.identifie` (ou `identifie_auto` si `auto`),
+        mais rejoue le résultat gardé quand il est encore valable.
+
+        Un objet sans `source`, ou dont le fichier est introuvable, est
+        décomposé normalement et n'est pas indexé. Le fichier est retrouvé par
+        son chemin absolu : une source relative et la même en absolu
+        partagent leur entrée.
+
+        :raise DecompositionEchecTousPatrons: comme la décomposition, y compris
+                                              quand l'échec est rejoué
+        :raise TypeError: si un appel de décomposeur est asynchrone, rejoué
+                          compris : l'index ne sert que la décomposition
+                          synchrone
+        """
+        obj = identificateur.obj
+        try:
+            chemin = os.path.abspath(os.fspath(obj.source))
+            etat = os.stat(chemin)
+        except (AttributeError, TypeError, OSError):
+            return self._decompose(
+                identificateur, racine, options_resultat, options_analyse, auto
+            )
+
+        if isinstance(options_analyse, str):
+            options_analyse = (options_analyse,)
+        options = [
+            None if racine is None else os.fspath(racine),
+            COMBINAISONS_AUTO if auto else options_resultat,
+            None if auto else sorted(options_analyse),
+        ]
+        ordre = getattr(identificateur.decomposeurs, "ordre", None)
+        if ordre is not None and (
+            auto or options_resultat == DECOMPOSE_RESULTAT_PREMIER_NON_NUL
+        ):
+            # Le premier patron qui trouve l'emporte : un résultat obtenu dans
+            # un autre ordre ne vaut pas pour celui-ci.
+            options.append(ordre.rangs(identificateur.decomposeurs))
+        cle = (
+            chemin,
+            self._empreinte(identificateur.decomposeurs),
+            json.dumps(options),
+        )
+        ligne = self._connexion.execute(
+            "SELECT mtime_ns, taille, reussie, journal, valeur FROM decompositions"
+            " WHERE chemin = ? AND jeu = ? AND options = ?",
+            cle,
+        ).fetchone()
+        if ligne is not None and ligne[:2] == (etat.st_mtime_ns, etat.st_size):
+            self.succes += 1
+            return self._rejoue(identificateur, *ligne[2:])
+
+        self.echecs += 1
+        identificateur.journal = []
+        try:
+            valeur = self._decompose(
+                identificateur, racine, options_resultat, options_analyse, auto
+            )
+        except DecompositionEchecTousPatrons:
+            self._enregistre(cle, etat, False, identificateur.journal, None)
+            raise
+        finally:
+            journal, identificateur.journal = identificateur.journal, None
+        self._enregistre(cle, etat, True, journal, valeur)
+        return valeur
+
+    @staticmethod
+    def _decompose(identificateur, racine, options_resultat, options_analyse, auto):
+        if auto:
+            return identificateur.identifie_auto(racine=racine)
+        return identificateur.identifie(
+            racine=racine,
+            options_resultat=options_resultat,
+            options_analyse=options_analyse,
+        )
+
+    @staticmethod
+    def _rejoue(identificateur, reussie, journal, valeur):
+        # Mené par `_conduit`, comme la décomposition : un appel en retour
+        # asynchrone est refusé (TypeError) plutôt que laissé sans attente.
+        _conduit(IndexDecomposition._rejoue_appels(identificateur, journal))
+        if not reussie:
+            raise DecompositionEchecTousPatrons()
+        return _decode(json.loads(valeur))
+
+    @staticmethod
+    def _rejoue_appels(identificateur, journal):
+        """Rejoue les appels en retour du journal. Générateur d'étapes."""
+        decomposeurs = list(identificateur.decomposeurs)
+        for rang, resultats in json.loads(journal):
+            yield from identificateur._appel_en_retour(
+                decomposeurs[rang], identificateur.obj, _decode(resultats)
+            )
+
+    def _enregistre(self, cle, etat, reussie, journal, valeur):
+        try:
+            journal = json.dumps([(rang, _encode(r)) for rang, r in journal])
+            valeur = json.dumps(_encode(valeur))
+        except TypeError:
+            # Un `appel_source` qui rend autre chose que du texte : on ne sait
+            # pas garder ses captures, le fichier est simplement re-décomposé.
+            LOGGER.debug("décomposition de %s non indexable", cle[0])
+            return
+        self._connexion.execute(
+            "INSERT OR REPLACE INTO decompositions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (*cle, etat.st_mtime_ns, etat.st_size, int(reussie), journal, valeur),
+        )
+        self._en_attente += 1
+        if self._en_attente >= self._lot_ecritures:
+            self._connexion.commit()
+            self._en_attente = 0
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""Décomposition par lots.
+
+`Decomposable.decompose` prépare tout pour un seul objet : il résout le jeu de
+patrons — jusqu'à un `pydoc.locate` quand il est donné par son chemin
+d'import —, l'instancie, puis joue l'analyse. Sur des millions de chemins,
+cette mise en place se paie autant de fois.
+
+`decompose_lot` la fait une fois pour tout le lot et **produit** les résultats
+au fil de l'eau : le lot peut être un générateur, il n'est jamais matérialisé.
+
+Décomposer une bibliothèque entière est un travail indépendant d'un fichier
+à l'autre : `decompose_parallele` répartit les chemins par tranches sur un pool
+de processus, et n'envoie le jeu de patrons qu'une fois à chacun.
+
+Quand ce sont les appels des décomposeurs qui attendent — une base, un service,
+un fichier annexe —, `decompose_lot_async` mène des milliers de décompositions
+de front dans une boucle `asyncio`, en bornant le nombre de celles en cours.
+
+Exemple ::
+
+    from automatheque.decomposition import decompose_lot
+
+    chemins = parcourt_fichiers(Path("/media/series"))
+    episodes = (Episode(source=str(p), basename=p.name) for p in chemins)
+    for resultat in decompose_lot(episodes, decomposeurs=SerieDecomposeurs()):
+        if resultat.reussi:
+            indexe(resultat.element)
+"""
+
+import asyncio
+import itertools
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from automatheque.util.parallele import Resultat
+
+from .decomposeur import (
+    DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+    DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    Identificateur,
+    resout_decomposeurs,
+)
+from .exceptions import DecompositionEchecTousPatrons
+
+
+def _resolveur(decomposeurs):
+    """Renvoie une fonction `obj -> Decomposeurs`, qui ne résout qu'une fois.
+
+    Un jeu donné est résolu tout de suite ; à défaut, les patrons par défaut
+    sont demandés une fois par classe d'objet.
+    """
+    if decomposeurs:
+        jeu = resout_decomposeurs(decomposeurs)
+        return lambda obj: jeu
+
+    resolus = {}
+
+    def _jeu_de(obj):
+        classe = type(obj)
+        jeu = resolus.get(classe)
+        if jeu is None:
+            jeu = resolus[classe] = resout_decomposeurs(None, obj)
+        return jeu
+
+    return _jeu_de
+
+
+def _identifie(
+    identificateur, racine, options_resultat, options_analyse, auto, index=None
+):
+    """Joue l'analyse demandée, ou les combinaisons de `auto_decompose`."""
+    if index is not None:
+        return index.identifie(
+            identificateur,
+            racine=racine,
+            options_resultat=options_resultat,
+            options_analyse=options_analyse,
+            auto=auto,
+        )
+    if auto:
+        return identificateur.identifie_auto(racine=racine)
+    return identificateur.identifie(
+        racine=racine,
+        options_resultat=options_resultat,
+        options_analyse=options_analyse,
+    )
+
+
+def decompose_lot(
+    objets,
+    decomposeurs=None,
+    racine=None,
+    options_resultat=DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    options_analyse=DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+    auto=False,
+    cache=None,
+    index=None,
+    profil=None,
+):
+    """Décompose chaque objet du lot, et produit un résultat par objet.
+
+    Le jeu de patrons est résolu **une fois** : donné par son chemin d'import,
+    il n'est importé et instancié qu'une fois pour tout le lot ; à défaut, les
+    patrons par défaut sont demandés une fois par classe d'objet.
+
+    Chaque résultat est un :class:`~automatheque.util.parallele.Resultat` dont
+    `element` est l'objet — rempli par la décomposition — et `valeur` ce
+    qu'aurait renvoyé `decompose`. Un objet qu'aucun patron ne décompose donne
+    un résultat en échec (`erreur` porte la
+    :class:`DecompositionEchecTousPatrons`) sans interrompre le lot. Toute
+    autre exception — un bug d'un `appel_en_retour`, typiquement — remonte,
+    comme pour `decompose`.
+
+    :param objets: itérable de :class:`Decomposable`, consommé paresseusement
+    :param decomposeurs: comme pour :meth:`Decomposable.decompose`
+    :param auto: essaie les combinaisons d'options d'`auto_decompose` au lieu
+                 de `options_resultat` et `options_analyse`
+    :param cache: :class:`~automatheque.decomposition.CacheRepertoires` partagé
+                  par tout le lot : les fichiers d'un même dossier ne
+                  décomposent plus chacun le nom de leurs répertoires parents
+    :param index: :class:`~automatheque.decomposition.index.IndexDecomposition`
+                  où retrouver les décompositions des fichiers inchangés
+    :param profil: :class:`~automatheque.decomposition.profil.Profil` où
+                   relever les statistiques des décomposeurs sur tout le lot
+    :raise ArgumentManquant: dès le premier objet pour lequel aucun jeu de
+                             patrons n'a pu être trouvé
+    """
+    return _decompose(
+        objets,
+        _resolveur(decomposeurs),
+        {
+            "racine": racine,
+            "options_resultat": options_resultat,
+            "options_analyse": options_analyse,
+            "auto": auto,
+            "index": index,
+        },
+        cache,
+        profil,
+    )
+
+
+def _decompose(objets, jeu_de, options, cache=None, profil=None):
+    """Le cœur de :func:`decompose_lot`, jeu de patrons déjà résolu."""
+    for obj in objets:
+        identificateur = Identificateur(
+            obj, decomposeurs=jeu_de(obj), cache=cache, profil=profil
+        )
+        try:
+            valeur = _identifie(identificateur, **options)
+        except DecompositionEchecTousPatrons as exc:
+            yield Resultat(obj, erreur=exc)
+        else:
+            yield Resultat(obj, valeur=valeur)
+
+
+# État d'un processus du pool de `decompose_parallele`, posé une fois par
+# `_initialise_travailleur` : le jeu de patrons n'est ainsi transmis qu'au
+# démarrage du processus, et non avec chaque tranche.
+_TRAVAILLEUR = {}
+
+
+def _initialise_travailleur(decomposeurs, fabrique, options):
+    """Initialise un processus du pool."""
+    _TRAVAILLEUR["jeu_de"] = _resolveur(decomposeurs)
+    _TRAVAILLEUR["fabrique"] = fabrique
+    _TRAVAILLEUR["options"] = options
+
+
+def _decompose_tranche(chemins):
+    """Décompose une tranche de chemins, dans un processus du pool."""
+    fabrique = _TRAVAILLEUR["fabrique"]
+    return list(
+        _decompose(
+            (fabrique(chemin) for chemin in chemins),
+            _TRAVAILLEUR["jeu_de"],
+            _TRAVAILLEUR["options"],
+        )
+    )
+
+
+def _tranches(elements, taille):
+    """Découpe un itérable en listes de `taille` éléments, paresseusement."""
+    iterateur = iter(elements)
+    while True:
+        tranche = list(itertools.islice(iterateur, taille))
+        if not tranche:
+            return
+        yield tranche
+
+
+def decompose_parallele(
+    chemins,
+    fabrique,
+    decomposeurs=None,
+    racine=None,
+    options_resultat=DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    options_analyse=DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+    auto=False,
+    *,
+    workers=None,
+    taille_tranche=256,
+    ordonne=True,
+):
+    """Décompose des chemins sur un pool de processus.
+
+    Les chemins — typiquement ceux d'`util.repertoire.parcourt_fichiers` — sont
+    découpés en tranches de `taille_tranche`, soumises au pool au fur et à
+    mesure : au plus deux tranches par processus sont en vol, si bien qu'une
+    source de plusieurs millions de chemins n'est jamais matérialisée. Chaque
+    processus reçoit **une fois**, à son démarrage, le jeu de patrons (déjà
+    résolu et compilé) et la fabrique.
+
+    Les résultats sont ceux de :func:`decompose_lot` : un
+    :class:`~automatheque.util.parallele.Resultat` par chemin, dont `element`
+    est l'objet construit par `fabrique` puis rempli dans le processus — c'en
+    est donc une **copie**, renvoyée par sérialisation.
+
+    Tout ce qui franchit la frontière des processus doit être *picklable* : la
+    fabrique, les objets, les exceptions, et les appels des décomposeurs —
+    des fonctions de niveau module, pas des lambdas.
+
+    :param chemins: itérable de chemins, consommé paresseusement
+    :param fabrique: appelée en `fabrique(chemin)` dans le processus, renvoie
+                     le :class:`Decomposable` à remplir (la classe elle-même,
+                     souvent)
+    :param workers: nombre de processus ; par défaut, un par cœur
+    :param taille_tranche: nombre de chemins envoyés d'un coup à un processus
+    :param ordonne: si vrai (défaut), les résultats suivent l'ordre des
+                    chemins ; sinon, ils sont produits dès qu'une tranche est
+                    terminée
+    :raise ValueError: si `workers` ou `taille_tranche` est inférieur à 1 —
+                       dès l'appel, avant le démarrage du pool
+    """
+    if workers is not None and workers < 1:
+        raise ValueError("workers doit être >= 1")
+    if taille_tranche < 1:
+        raise ValueError("taille_tranche doit être >= 1")
+    workers = workers or os.cpu_count() or 1
+    if decomposeurs:
+        decomposeurs = resout_decomposeurs(decomposeurs)
+    options = {
+        "racine": racine,
+        "options_resultat": options_resultat,
+        "options_analyse": options_analyse,
+        "auto": auto,
+    }
+    return _decompose_parallele(
+        chemins, decomposeurs, fabrique, options, workers, taille_tranche, ordonne
+    )
+
+
+def _decompose_parallele(
+    chemins, decomposeurs, fabrique, options, workers, taille_tranche, ordonne
+):
+    """Le générateur de :func:`decompose_parallele` : le pool ne démarre qu'au
+    premier résultat demandé."""
+    en_vol_max = 2 * workers
+    executeur = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_initialise_travailleur,
+        initargs=(decomposeurs, fabrique, options),
+    )
+    try:
+        if ordonne:
+            file = deque()
+            for tranche in _tranches(chemins, taille_tranche):
+                file.append(executeur.submit(_decompose_tranche, tranche))
+                if len(file) >= en_vol_max:
+                    yield from file.popleft().result()
+            while file:
+                yield from file.popleft().result()
+        else:
+            en_vol = set()
+            for tranche in _tranches(chemins, taille_tranche):
+                en_vol.add(executeur.submit(_decompose_tranche, tranche))
+                if len(en_vol) >= en_vol_max:
+                    finis, en_vol = wait(en_vol, return_when=FIRST_COMPLETED)
+                    for futur in finis:
+                        yield from futur.result()
+            while en_vol:
+                finis, en_vol = wait(en_vol, return_when=FIRST_COMPLETED)
+                for futur in finis:
+                    yield from futur.result()
+    finally:
+        # Un consommateur qui s'arrête en route n'attend pas les tranches
+        # encore en file, qui sont annulées ; seules celles déjà commencées
+        # (au plus une par processus) vont à leur terme, pour que les
+        # processus s'arrêtent proprement plutôt que d'être abandonnés.
+        executeur.shutdown(wait=True, cancel_futures=True)
+
+
+async def _elements_async(objets):
+    """Parcourt un itérable ordinaire ou asynchrone."""
+    if hasattr(objets, "__aiter__"):
+        async for obj in objets:
+            yield obj
+    else:
+        for obj in objets:
+            yield obj
+
+
+async def _identifie_async(obj, jeu_de, options, cache, profil):
+    """Décompose un objet de :func:`decompose_lot_async`."""
+    identificateur = Identificateur(
+        obj, decomposeurs=jeu_de(obj), cache=cache, profil=profil
+    )
+    try:
+        if options["auto"]:
+            valeur = await identificateur.identifie_auto_async(racine=options["racine"])
+        else:
+            valeur = await identificateur.identifie_async(
+                racine=options["racine"],
+                options_resultat=options["options_resultat"],
+                options_analyse=options["options_analyse"],
+            )
+    except DecompositionEchecTousPatrons as exc:
+        return Resultat(obj, erreur=exc)
+    return Resultat(obj, valeur=valeur)
+
+
+async def decompose_lot_async(
+    objets,
+    decomposeurs=None,
+    racine=None,
+    options_resultat=DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    options_analyse=DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+    auto=False,
+    *,
+    concurrence=100,
+    ordonne=True,
+    cache=None,
+    profil=None,
+):
+    """Comme :func:`decompose_lot`, dans une boucle `asyncio` : générateur
+    asynchrone qui produit un résultat par objet.
+
+    Les appels des décomposeurs (`appel_source`, `appel_en_retour`) peuvent
+    être des fonctions `async` : chaque objet est décomposé par
+    :meth:`Identificateur.identifie_async`, et jusqu'à `concurrence` d'entre
+    eux avancent de front, chacun pendant que les autres attendent. Le lot est
+    consommé au fur et à mesure : au plus `concurrence` objets sont en cours,
+    si bien qu'un lot de plusieurs millions n'est jamais matérialisé.
+
+    `cache` et `profil` peuvent être partagés : la boucle n'exécute qu'une
+    décomposition à la fois entre deux attentes. L'index
+    (:class:`~automatheque.decomposition.index.IndexDecomposition`), dont les
+    accès à la base bloqueraient la boucle, n'est pas proposé ici.
+
+    Un consommateur qui s'arrête en route annule les décompositions en cours.
+
+    :param objets: itérable, ordinaire ou asynchrone, de :class:`Decomposable`
+    :param concurrence: nombre maximal de décompositions en cours
+    :param ordonne: si vrai (défaut), les résultats suivent l'ordre des
+                    objets ; sinon, ils sont produits dès qu'un objet est
+                    décomposé
+    :raise ValueError: si `concurrence` est inférieur à 1
+    :raise ArgumentManquant: dès le premier objet pour lequel aucun jeu de
+                             patrons n'a pu être trouvé
+    """
+    if concurrence < 1:
+        raise ValueError("concurrence doit être >= 1")
+    jeu_de = _resolveur(decomposeurs)
+    options = {
+        "racine": racine,
+        "options_resultat": options_resultat,
+        "options_analyse": options_analyse,
+        "auto": auto,
+    }
+
+    def _lance(obj):
+        return asyncio.ensure_future(
+            _identifie_async(obj, jeu_de, options, cache, profil)
+        )
+
+    en_vol = deque() if ordonne else set()
+    try:
+        if ordonne:
+            async for obj in _elements_async(objets):
+                en_vol.append(_lance(obj))
+                if len(en_vol) >= concurrence:
+                    yield await en_vol.popleft()
+            while en_vol:
+                yield await en_vol.popleft()
+        else:
+            async for obj in _elements_async(objets):
+                en_vol.add(_lance(obj))
+                if len(en_vol) >= concurrence:
+                    finies, en_vol = await asyncio.wait(
+                        en_vol, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for tache in finies:
+                        yield tache.result()
+            while en_vol:
+                finies, en_vol = await asyncio.wait(
+                    en_vol, return_when=asyncio.FIRST_COMPLETED
+                )
+                for tache in finies:
+                    yield tache.result()
+    finally:
+        for tache in en_vol:
+            tache.cancel()
+        if en_vol:
+            await asyncio.gather(*en_vol, return_exceptions=True)
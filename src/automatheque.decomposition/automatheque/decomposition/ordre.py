@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Ordre adaptatif des patrons.
+
+En `DECOMPOSE_RESULTAT_PREMIER_NON_NUL`, l'ordre des décomposeurs décide du
+nombre d'expressions jouées avant la première qui trouve. Sur un gros lot
+homogène — une bibliothèque de séries, de musique… — quelques patrons font
+l'essentiel du travail : les essayer d'abord épargne tous les autres.
+
+:class:`OrdreAdaptatif`, confié à un jeu de patrons
+(``SerieDecomposeurs(ordre=OrdreAdaptatif())``), relève le taux de réussite de
+chaque patron et les fait essayer du plus au moins fructueux. À taux égal,
+le plus lourd (`poids`) passe d'abord, puis l'ordre déclaré : pour un même état
+appris, l'ordre — donc le résultat — est déterministe. L'ordre appris peut être
+sauvé puis rechargé, et figé (``apprend=False``) pour qu'il ne bouge plus.
+
+Les autres modes de résultat cumulent ou comparent les décompositions : l'ordre
+y compte pour le résultat, il n'y est donc jamais modifié.
+"""
+
+import json
+
+
+class OrdreAdaptatif(object):
+    """Ordre des patrons d'un jeu, appris de leurs réussites.
+
+    Les compteurs sont tenus par patron — son expression et ses drapeaux —, et
+    non par rang : ils survivent à une réorganisation du jeu, et à une
+    sauvegarde.
+
+    :param periode: l'ordre n'est recalculé que toutes les `periode` passes
+                    (une chaîne analysée par le jeu), et non à chacune
+    :param apprend: si faux, les compteurs ne bougent plus : l'ordre est figé
+    """
+
+    def __init__(self, periode=64, apprend=True):
+        if periode < 1:
+            raise ValueError("periode doit être >= 1")
+        self.periode = periode
+        self.apprend = apprend
+        # (chaine, drapeaux) -> [essais, succès]
+        self._compteurs = {}
+        self._ordre = None
+        self._passes = 0
+
+    @staticmethod
+    def _cle(decomposeur):
+        return (decomposeur.chaine, int(decomposeur.drapeaux))
+
+    def taux(self, decomposeur):
+        """Part des essais du décomposeur qui ont trouvé quelque chose."""
+        essais, succes = self._compteurs.get(self._cle(decomposeur), (0, 0))
+        return succes / essais if essais else 0.0
+
+    def _a_jour(self, liste):
+        """L'ordre gardé, s'il vaut encore pour ce jeu ; None sinon."""
+        ordre = self._ordre
+        if (
+            ordre is None
+            or self._passes >= self.periode
+            or len(ordre[0]) != len(liste)
+            or not all(a is b for a, b in zip(ordre[0], liste))
+        ):
+            return None
+        return ordre
+
+    def _trie(self, liste):
+        return sorted(
+            enumerate(liste),
+            key=lambda paire: (-self.taux(paire[1]), -paire[1].poids, paire[0]),
+        )
+
+    def ordonne(self, decomposeurs):
+        """Les `(rang déclaré, décomposeur)` du jeu, dans l'ordre où les essayer."""
+        liste = tuple(decomposeurs)
+        ordre = self._a_jour(liste)
+        if ordre is None:
+            ordre = self._ordre = (liste, self._trie(liste))
+            self._passes = 0
+        self._passes += 1
+        return ordre[1]
+
+    def rangs(self, decomposeurs):
+        """Les rangs déclarés, dans l'ordre que rendra le prochain
+        :meth:`ordonne` — sans compter de passe.
+
+        C'est ce qui décide du résultat en `DECOMPOSE_RESULTAT_PREMIER_NON_NUL`
+        (cf. `index.IndexDecomposition`).
+        """
+        liste = tuple(decomposeurs)
+        ordre = self._a_jour(liste)
+        paires = ordre[1] if ordre is not None else self._trie(liste)
+        return [rang for rang, _ in paires]
+
+    def note(self, decomposeur, succes):
+        """Compte un essai du décomposeur, réussi ou non."""
+        if not self.apprend:
+            return
+        compteurs = self._compteurs.get(self._cle(decomposeur))
+        if compteurs is None:
+            compteurs = self._compteurs[self._cle(decomposeur)] = [0, 0]
+        compteurs[0] += 1
+        if succes:
+            compteurs[1] += 1
+
+    def vide(self):
+        """Oublie tout ce qui a été appris."""
+        self._compteurs.clear()
+        self._ordre = None
+
+    def sauve(self, chemin):
+        """Écrit les compteurs appris dans un fichier JSON."""
+        donnees = [
+            {"chaine": chaine, "drapeaux": drapeaux, "essais": e, "succes": s}
+            for (chaine, drapeaux), (e, s) in self._compteurs.items()
+        ]
+        with open(chemin, "w", encoding="utf-8") as fichier:
+            json.dump(donnees, fichier, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def charge(cls, chemin, **kwargs):
+        """Un ordre repris des compteurs sauvés par :meth:`sauve`.
+
+        Les patrons absents du fichier partent de zéro ; ceux du fichier qui
+        ne sont plus dans le jeu sont simplement ignorés.
+
+        :param kwargs: passés au constructeur (``apprend=False`` pour figer)
+        """
+        ordre = cls(**kwargs)
+        with open(chemin, encoding="utf-8") as fichier:
+            for ligne in json.load(fichier):
+                ordre._compteurs[(ligne["chaine"], ligne["drapeaux"])] = [
+                    ligne["essais"],
+                    ligne["succes"],
+                ]
+        return ordre
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Préfiltre littéral des patrons.
+
+Beaucoup de patrons exigent un texte fixe : ``S\\d+E\\d+`` ne trouve rien dans
+une chaîne sans ``S``… ni ``E``, ``\\.mkv$`` rien sans ``.mkv``. Chercher ce
+texte avec `in` coûte bien moins qu'appeler le moteur d'expressions : à la
+compilation d'un :class:`~automatheque.decomposition.Decomposeur`, on extrait
+de l'arbre de l'expression le plus long littéral **obligatoire**, et le patron
+n'est joué que si la source le contient.
+
+Est obligatoire un littéral qui figure dans toute correspondance : au niveau
+principal de l'expression, dans un groupe, ou dans une répétition d'au moins
+une occurrence. Les alternatives, les répétitions facultatives et les
+assertions sont ignorées — faute de littéral obligatoire, le patron n'a pas de
+préfiltre et est toujours joué.
+"""
+
+import re
+
+try:
+    # Modules privés de `re` depuis 3.11, absents des stubs : mypy (qui vise
+    # 3.10) ne les connaît pas.
+    from re import _constants, _parser  # type: ignore[attr-defined]
+except ImportError:  # Python 3.10
+    import sre_constants as _constants
+    import sre_parse as _parser
+
+_LITTERAL = _constants.LITERAL
+_SOUS_PATRON = _constants.SUBPATTERN
+# Constructions dont le contenu est joué au moins une fois, qu'on peut donc
+# explorer : les répétitions (quand leur minimum est >= 1) et, depuis 3.11, les
+# groupes atomiques.
+_REPETITIONS = tuple(
+    getattr(_constants, nom)
+    for nom in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(_constants, nom)
+)
+_GROUPE_ATOMIQUE = getattr(_constants, "ATOMIC_GROUP", None)
+
+
+def _litteraux(elements, insensible, trouves):
+    """Ajoute à `trouves` les suites de littéraux obligatoires de `elements`,
+    en `(codes, insensible à la casse)`."""
+    suite = []
+    for op, arg in elements:
+        if op is _LITTERAL:
+            suite.append(arg)
+            continue
+        if suite:
+            trouves.append((suite, insensible))
+            suite = []
+        if op is _SOUS_PATRON:
+            _, ajoutes, retires, sous = arg
+            _litteraux(
+                sous,
+                (insensible or bool(ajoutes & re.I)) and not retires & re.I,
+                trouves,
+            )
+        elif op in _REPETITIONS and arg[0] >= 1:
+            _litteraux(arg[2], insensible, trouves)
+        elif _GROUPE_ATOMIQUE is not None and op is _GROUPE_ATOMIQUE:
+            _litteraux(arg, insensible, trouves)
+    if suite:
+        trouves.append((suite, insensible))
+
+
+class Prefiltre(object):
+    """Un littéral que toute correspondance d'un patron contient.
+
+    Compte ses essais et ses rejets : :attr:`selectivite` dit quelle part des
+    sources il a épargnée au moteur d'expressions.
+
+    :param litteral: le texte obligatoire (`str` ou `bytes`, comme le patron),
+                     en minuscules s'il est insensible à la casse
+    :param insensible: si vrai, la recherche ignore la casse
+    """
+
+    def __init__(self, litteral, insensible=False):
+        self.litteral = litteral
+        self.insensible = insensible
+        self.essais = 0
+        self.rejets = 0
+
+    def __repr__(self):
+        return "Prefiltre({!r}, insensible={})".format(self.litteral, self.insensible)
+
+    @property
+    def selectivite(self):
+        """Part des sources écartées sans jouer le patron (0.0 sans essai)."""
+        return self.rejets / self.essais if self.essais else 0.0
+
+    def laisse_passer(self, source, pos=None, endpos=None):
+        """Faux si la source — entre `pos` et `endpos` — ne peut pas convenir."""
+        self.essais += 1
+        if self.insensible:
+            # Sous `re.IGNORECASE`, quelques caractères non ASCII équivalent à
+            # une lettre ASCII (« ſ » à « s », le signe kelvin à « k »…) : hors
+            # ASCII, `lower()` ne suffit plus, on laisse le patron juger.
+            if not source.isascii():
+                return True
+            if pos is not None or endpos is not None:
+                source = source[pos:endpos]
+            present = self.litteral in source.lower()
+        else:
+            present = (
+                source.find(
+                    self.litteral,
+                    0 if pos is None else pos,
+                    len(source) if endpos is None else endpos,
+                )
+                != -1
+            )
+        if not present:
+            self.rejets += 1
+        return present
+
+    def statistiques(self):
+        """Compteurs du préfiltre, en dictionnaire."""
+        return {
+            "litteral": self.litteral,
+            "essais": self.essais,
+            "rejets": self.rejets,
+            "selectivite": self.selectivite,
+        }
+
+
+def prefiltre_de(patron):
+    """Le :class:`Prefiltre` d'un patron compilé, ou None s'il n'a aucun
+    littéral obligatoire exploitable."""
+    if patron.flags & re.LOCALE:
+        return None
+    try:
+        arbre = _parser.parse(patron.pattern, patron.flags)
+    except Exception:  # l'analyseur est interne à `re` : on ne s'y fie pas
+        return None
+    trouves = []
+    _litteraux(arbre, bool(patron.flags & re.I), trouves)
+    if not trouves:
+        return None
+    # Le plus long, et à longueur égale le sensible à la casse : le plus sélectif.
+    codes, insensible = max(trouves, key=lambda t: (len(t[0]), not t[1]))
+    if isinstance(patron.pattern, bytes):
+        litteral = bytes(codes)
+    else:
+        litteral = "".join(map(chr, codes))
+    if insensible:
+        if not litteral.isascii():
+            return None
+        litteral = litteral.lower()
+    return Prefiltre(litteral, insensible)
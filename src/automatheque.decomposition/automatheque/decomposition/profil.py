@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Profil des décomposeurs.
+
+Avec des dizaines de patrons, savoir lesquels trouvent quelque chose — et
+lesquels coûtent — permet d'élaguer et de réordonner un jeu sur pièces. Passé à
+l'identification (``decompose(profil=…)``, ``decompose_lot(profil=…)``…), un
+:class:`Profil` relève pour chaque :class:`~automatheque.decomposition.Decomposeur`
+le nombre d'essais, de correspondances et d'erreurs d'extraction, le temps
+passé à chercher (préfiltre, moteur d'expressions) et celui passé dans les
+appels en retour.
+
+Sans profil, l'identification ne mesure rien.
+
+Exemple ::
+
+    profil = Profil()
+    for resultat in decompose_lot(episodes, auto=True, profil=profil):
+        ...
+    print(profil.en_json(indent=2))
+"""
+
+import json
+
+
+class StatsDecomposeur(object):
+    """Compteurs d'un décomposeur, tenus par un :class:`Profil`."""
+
+    __slots__ = (
+        "decomposeur",
+        "appels",
+        "correspondances",
+        "erreurs",
+        "temps_regex",
+        "temps_appel_en_retour",
+    )
+
+    def __init__(self, decomposeur):
+        self.decomposeur = decomposeur
+        self.appels = 0
+        self.correspondances = 0
+        self.erreurs = 0
+        self.temps_regex = 0.0
+        self.temps_appel_en_retour = 0.0
+
+    def en_dict(self):
+        """Les compteurs, et ce qui s'en déduit, en dictionnaire."""
+        d = self.decomposeur
+        prefiltre = getattr(d, "prefiltre", None)
+        return {
+            "chaine": d.chaine,
+            "drapeaux": int(d.drapeaux),
+            "poids": d.poids,
+            "appels": self.appels,
+            "correspondances": self.correspondances,
+            "taux_correspondance": (
+                self.correspondances / self.appels if self.appels else 0.0
+            ),
+            "erreurs": self.erreurs,
+            "temps_regex": self.temps_regex,
+            "temps_appel_en_retour": self.temps_appel_en_retour,
+            "selectivite_prefiltre": (
+                None if prefiltre is None else prefiltre.selectivite
+            ),
+        }
+
+
+class Profil(object):
+    """Statistiques par décomposeur, sur autant d'identifications qu'on veut.
+
+    Les décomposeurs sont distingués par identité : deux instances d'un même
+    patron ont chacune leur ligne.
+    """
+
+    def __init__(self):
+        self._stats = {}
+
+    def __len__(self):
+        return len(self._stats)
+
+    def stats(self, decomposeur):
+        """Les :class:`StatsDecomposeur` du décomposeur, créées au besoin."""
+        # Le décomposeur est gardé dans ses stats : son `id` ne peut donc pas
+        # être réattribué tant que le profil vit.
+        stats = self._stats.get(id(decomposeur))
+        if stats is None:
+            stats = self._stats[id(decomposeur)] = StatsDecomposeur(decomposeur)
+        return stats
+
+    def vide(self):
+        """Oublie toutes les statistiques."""
+        self._stats.clear()
+
+    def rapport(self, tri=None):
+        """Une ligne (dictionnaire) par décomposeur rencontré.
+
+        :param tri: clé du dictionnaire selon laquelle trier, par ordre
+                    décroissant (``"temps_regex"``, ``"correspondances"``…) ;
+                    par défaut, dans l'ordre où les décomposeurs ont été vus
+        """
+        lignes = [stats.en_dict() for stats in self._stats.values()]
+        if tri is not None:
+            lignes.sort(key=lambda ligne: ligne[tri], reverse=True)
+        return lignes
+
+    def en_json(self, tri=None, **kwargs):
+        """Le :meth:`rapport` en JSON ; `kwargs` va à :func:`json.dumps`."""
+        kwargs.setdefault("ensure_ascii", False)
+        return json.dumps(self.rapport(tri=tri), **kwargs)
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""Banc d'essai de la décomposition sur des arborescences synthétiques.
+
+Génère des corpus reproductibles de chemins — séries, musique, photos — et
+mesure, pour chacun, `decompose` dans toutes les combinaisons d'options puis
+`auto_decompose` : débit (fichiers par seconde) et pic de mémoire. Le pic est
+relevé par `tracemalloc` lors d'une seconde passe, pour ne pas fausser le
+débit, et sur les ``--memoire`` premiers fichiers seulement : `tracemalloc`
+ralentit l'analyse d'un facteur dix à vingt.
+
+Les mesures s'écrivent en JSON (``--sortie``) ; comparées à une référence
+(``--reference``), elles signalent toute baisse de débit ou hausse de mémoire
+au-delà de la tolérance, et tout changement du nombre de fichiers décomposés.
+Le code de sortie est alors 1, ce qui permet de s'en servir en intégration
+continue.
+
+Usage ::
+
+    python benchmarks/bench_decomposition.py [--taille 10000] [--graine 0]
+        [--corpus series musique photos] [--filtre max_infos] [--memoire 1000]
+        [--sortie mesures.json] [--reference mesures.json] [--tolerance 0.2]
+
+La taille va de quelques milliers à un million de fichiers : les chemins sont
+générés avant la mesure, les objets à décomposer pendant — leur création, la
+même pour tous les scénarios, est comprise dans le temps mesuré.
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+import attr
+from automatheque.decomposition import (
+    DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+    DECOMPOSE_ANALYSE_ARBO_CONCATENE,
+    DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,
+    DECOMPOSE_RESULTAT_CUMULE,
+    DECOMPOSE_RESULTAT_MAX_INFOS,
+    DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    DecompositionEchecTousPatrons,
+)
+
+RACINE = "/bibliotheque"
+
+
+@attr.s
+class Media(Decomposable):
+    source = attr.ib(default="")
+    basename = attr.ib(default="")
+    serie = attr.ib(default=None)
+    saison = attr.ib(default=None)
+    episode = attr.ib(default=None)
+    annee = attr.ib(default=None)
+    album = attr.ib(default=None)
+    piste = attr.ib(default=None)
+    titre = attr.ib(default=None)
+    date = attr.ib(default=None)
+    lieu = attr.ib(default=None)
+    appareil = attr.ib(default=None)
+
+
+# --- Appels en retour -------------------------------------------------------
+
+
+def _remplit_episode(obj, resultats):
+    obj.serie, obj.saison, obj.episode = resultats
+
+
+def _remplit_serie(obj, resultats):
+    obj.serie, obj.annee = resultats
+
+
+def _remplit_saison(obj, resultats):
+    obj.saison = resultats
+
+
+def _remplit_piste(obj, resultats):
+    obj.piste, obj.titre = resultats
+
+
+def _remplit_album(obj, resultats):
+    obj.album, obj.annee = resultats
+
+
+def _remplit_date(obj, resultats):
+    obj.date = "-".join(resultats[:3])
+
+
+def _remplit_evenement(obj, resultats):
+    _remplit_date(obj, resultats)
+    obj.lieu = resultats[3]
+
+
+def _remplit_appareil(obj, resultats):
+    obj.appareil = resultats
+
+
+# --- Jeux de patrons --------------------------------------------------------
+
+
+@attr.s
+class SeriesDecomposeurs(Decomposeurs):
+    def __attrs_post_init__(self):
+        self.decomposeurs = [
+            Decomposeur(r"(.+?)[. ]S(\d{2})E(\d{2})", _remplit_episode, drapeaux=re.I),
+            Decomposeur(r"(.+?)[. ](\d{1,2})x(\d{2})", _remplit_episode),
+            Decomposeur(r"^(.+) \((\d{4})\)$", _remplit_serie, poids=2),
+            Decomposeur(r"^Saison (\d+)$", _remplit_saison),
+        ]
+
+
+@attr.s
+class MusiqueDecomposeurs(Decomposeurs):
+    def __attrs_post_init__(self):
+        self.decomposeurs = [
+            Decomposeur(r"^(\d{2}) - (.+)\.(?:flac|mp3|ogg)$", _remplit_piste),
+            Decomposeur(r"^(\d{2})-(.+)\.mp3$", _remplit_piste),
+            Decomposeur(r"^(.+) \((\d{4})\)$", _remplit_album, poids=2),
+        ]
+
+
+@attr.s
+class PhotosDecomposeurs(Decomposeurs):
+    def __attrs_post_init__(self):
+        self.decomposeurs = [
+            Decomposeur(r"IMG_(\d{4})(\d{2})(\d{2})_\d{6}", _remplit_date),
+            Decomposeur(r"^(\d{4})-(\d{2})-(\d{2}) (.+)$", _remplit_evenement),
+            Decomposeur(r"DSC_?\d+\.jpe?g", _remplit_appareil, drapeaux=re.I),
+        ]
+
+
+# --- Corpus -----------------------------------------------------------------
+
+_MOTS = (
+    "Ombre Cercle Nord Rivage Lumiere Quartier Brume Fortune Empire Verger "
+    "Sentinelle Archipel Horizon Marelle Falaise Comete Orage Labyrinthe"
+).split()
+
+
+def _nom(aleatoire, mots=(1, 3)):
+    return " ".join(aleatoire.choice(_MOTS) for _ in range(aleatoire.randint(*mots)))
+
+
+def _chemins_series(aleatoire, taille):
+    """Séries : le numéro d'épisode est tantôt dans le fichier, tantôt seulement
+    dans les dossiers (« Saison 02 », « Serie (2010) »)."""
+    for _ in range(taille):
+        serie = _nom(aleatoire)
+        annee = aleatoire.randint(1960, 2025)
+        saison = aleatoire.randint(1, 12)
+        episode = aleatoire.randint(1, 24)
+        forme = aleatoire.random()
+        if forme < 0.5:
+            fichier = "{}.S{:02d}E{:02d}.720p.mkv".format(
+                serie.replace(" ", "."), saison, episode
+            )
+        elif forme < 0.75:
+            fichier = "{} {}x{:02d}.avi".format(serie, saison, episode)
+        else:
+            fichier = "{:02d} - {}.mkv".format(episode, _nom(aleatoire))
+        yield "{}/series/{} ({})/Saison {:02d}/{}".format(
+            RACINE, serie, annee, saison, fichier
+        )
+
+
+def _chemins_musique(aleatoire, taille):
+    """Musique : artiste / album (année) / piste."""
+    for _ in range(taille):
+        piste = aleatoire.randint(1, 20)
+        titre = _nom(aleatoire, (1, 5))
+        if aleatoire.random() < 0.8:
+            fichier = "{:02d} - {}.{}".format(
+                piste, titre, aleatoire.choice(("flac", "mp3", "ogg"))
+            )
+        else:
+            fichier = "{:02d}-{}.mp3".format(piste, titre.replace(" ", "_"))
+        yield "{}/musique/{}/{} ({})/{}".format(
+            RACINE,
+            _nom(aleatoire, (1, 2)),
+            _nom(aleatoire),
+            aleatoire.randint(1950, 2025),
+            fichier,
+        )
+
+
+def _chemins_photos(aleatoire, taille):
+    """Photos : année / « date lieu » / fichier d'appareil."""
+    for _ in range(taille):
+        annee = aleatoire.randint(2000, 2025)
+        mois, jour = aleatoire.randint(1, 12), aleatoire.randint(1, 28)
+        if aleatoire.random() < 0.6:
+            fichier = "IMG_{}{:02d}{:02d}_{:06d}.jpg".format(
+                annee, mois, jour, aleatoire.randint(0, 235959)
+            )
+        else:
+            fichier = "DSC{:05d}.JPG".format(aleatoire.randint(0, 99999))
+        yield "{}/photos/{}/{}-{:02d}-{:02d} {}/{}".format(
+            RACINE, annee, annee, mois, jour, _nom(aleatoire, (1, 2)), fichier
+        )
+
+
+CORPUS = {
+    "series": (_chemins_series, SeriesDecomposeurs),
+    "musique": (_chemins_musique, MusiqueDecomposeurs),
+    "photos": (_chemins_photos, PhotosDecomposeurs),
+}
+
+
+def corpus(nom, taille, graine=0):
+    """Les `taille` chemins du corpus `nom` : toujours les mêmes pour une graine."""
+    generateur, _ = CORPUS[nom]
+    return list(generateur(random.Random("{}:{}".format(nom, graine)), taille))
+
+
+# --- Scénarios --------------------------------------------------------------
+
+_RESULTATS = {
+    "premier_non_nul": DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    "cumule": DECOMPOSE_RESULTAT_CUMULE,
+    "max_infos": DECOMPOSE_RESULTAT_MAX_INFOS,
+}
+_ANALYSES = {
+    "un_niveau": (DECOMPOSE_ANALYSE_ARBO_UN_NIVEAU,),
+    "complete": (DECOMPOSE_ANALYSE_ARBO_COMPLETE,),
+    "concatene": (DECOMPOSE_ANALYSE_ARBO_CONCATENE,),
+    "complete+concatene": (
+        DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+        DECOMPOSE_ANALYSE_ARBO_CONCATENE,
+    ),
+}
+
+
+def scenarios():
+    """`(nom, fonction(obj, jeu))` : `decompose` dans chaque combinaison
+    d'options, puis `auto_decompose`."""
+    for nom_resultat, options_resultat in _RESULTATS.items():
+        for nom_analyse, options_analyse in _ANALYSES.items():
+
+            def _decompose(obj, jeu, r=options_resultat, a=options_analyse):
+                obj.decompose(
+                    decomposeurs=jeu,
+                    racine=RACINE,
+                    options_resultat=r,
+                    options_analyse=a,
+                )
+
+            yield "decompose {}/{}".format(nom_resultat, nom_analyse), _decompose
+
+    def _auto(obj, jeu):
+        obj.auto_decompose(racine=RACINE, decomposeurs=jeu)
+
+    yield "auto_decompose", _auto
+
+
+def _passe(chemins, jeu, fonction):
+    """Décompose tout le corpus ; renvoie le nombre de fichiers décomposés."""
+    reussis = 0
+    for chemin in chemins:
+        obj = Media(source=chemin, basename=chemin.rsplit("/", 1)[-1])
+        try:
+            fonction(obj, jeu)
+        except DecompositionEchecTousPatrons:
+            continue
+        reussis += 1
+    return reussis
+
+
+def mesure(chemins, jeu, fonction, memoire=1000):
+    """Débit et pic de mémoire d'un scénario sur un corpus.
+
+    :param memoire: nombre de fichiers sur lesquels relever le pic de mémoire
+                    (0 pour ne pas le relever)
+    """
+    debut = time.perf_counter()
+    reussis = _passe(chemins, jeu, fonction)
+    duree = time.perf_counter() - debut
+
+    pic = 0
+    if memoire:
+        tracemalloc.start()
+        try:
+            _passe(chemins[:memoire], jeu, fonction)
+            _, pic = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {
+        "fichiers": len(chemins),
+        "reussis": reussis,
+        "secondes": duree,
+        "debit": len(chemins) / duree if duree else 0.0,
+        "pic_memoire_kio": pic / 1024,
+    }
+
+
+def compare(mesures, reference, tolerance):
+    """Les écarts à la référence qui dépassent la tolérance, en texte."""
+    connues = {(m["corpus"], m["scenario"]): m for m in reference["mesures"]}
+    ecarts = []
+    for m in mesures:
+        ref = connues.get((m["corpus"], m["scenario"]))
+        if ref is None:
+            continue
+        cle = "{} / {}".format(m["corpus"], m["scenario"])
+        if ref["fichiers"] == m["fichiers"] and ref["reussis"] != m["reussis"]:
+            ecarts.append(
+                "{} : {} fichiers décomposés au lieu de {}".format(
+                    cle, m["reussis"], ref["reussis"]
+                )
+            )
+        if m["debit"] < ref["debit"] * (1 - tolerance):
+            ecarts.append(
+                "{} : débit {:.0f}/s au lieu de {:.0f}/s".format(
+                    cle, m["debit"], ref["debit"]
+                )
+            )
+        if m["pic_memoire_kio"] > ref["pic_memoire_kio"] * (1 + tolerance):
+            ecarts.append(
+                "{} : pic mémoire {:.0f} Kio au lieu de {:.0f} Kio".format(
+                    cle, m["pic_memoire_kio"], ref["pic_memoire_kio"]
+                )
+            )
+    return ecarts
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parseur.add_argument("--taille", type=int, default=10000)
+    parseur.add_argument("--graine", type=int, default=0)
+    parseur.add_argument(
+        "--corpus", nargs="+", choices=sorted(CORPUS), default=list(CORPUS)
+    )
+    parseur.add_argument(
+        "--filtre", default="", help="ne garde que les scénarios qui le contiennent"
+    )
+    parseur.add_argument(
+        "--memoire",
+        type=int,
+        default=1000,
+        help="fichiers sur lesquels relever le pic de mémoire (0 : aucun)",
+    )
+    parseur.add_argument("--sortie", help="fichier JSON où écrire les mesures")
+    parseur.add_argument("--reference", help="mesures JSON auxquelles comparer")
+    parseur.add_argument("--tolerance", type=float, default=0.2)
+    args = parseur.parse_args(arguments)
+
+    mesures = []
+    print(
+        "{:<8} {:<40} {:>9} {:>12} {:>12}".format(
+            "corpus", "scénario", "réussis", "fichiers/s", "pic (Kio)"
+        )
+    )
+    for nom in args.corpus:
+        chemins = corpus(nom, args.taille, args.graine)
+        jeu = CORPUS[nom][1]()
+        for scenario, fonction in scenarios():
+            if args.filtre not in scenario:
+                continue
+            m = dict(
+                corpus=nom,
+                scenario=scenario,
+                **mesure(chemins, jeu, fonction, args.memoire),
+            )
+            mesures.append(m)
+            print(
+                "{:<8} {:<40} {:>9} {:>12.0f} {:>12.0f}".format(
+                    nom, scenario, m["reussis"], m["debit"], m["pic_memoire_kio"]
+                )
+            )
+
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as fichier:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "plateforme": platform.platform(),
+                    "taille": args.taille,
+                    "graine": args.graine,
+                    "memoire": args.memoire,
+                    "mesures": mesures,
+                },
+                fichier,
+                ensure_ascii=False,
+                indent=1,
+            )
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as fichier:
+            ecarts = compare(mesures, json.load(fichier), args.tolerance)
+        for ecart in ecarts:
+            print("RÉGRESSION " + ecart)
+        return 1 if ecarts else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
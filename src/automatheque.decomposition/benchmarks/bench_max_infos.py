@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Banc d'essai du score `DECOMPOSE_RESULTAT_MAX_INFOS`.
+
+Compare le score actuel — témoin sérialisé une fois, copié superficiellement
+quand il est immuable — à l'ancien, qui sérialisait candidat et témoin avec
+`pickle` et copiait le témoin en profondeur pour chaque patron. L'ancien est
+reconstitué ici par surcharge, pour mesurer les deux sur le même lot.
+
+La colonne « de bout en bout » partage tout le reste de `_exec_decomposition`
+— y compris le score de l'objet, calculé une fois par passe tant qu'aucun
+patron ne le remplit : elle ne mesure que ce que la surcharge remplace.
+
+Usage ::
+
+    python benchmarks/bench_max_infos.py [nombre_de_fichiers]
+"""
+
+import pickle
+import re
+import sys
+import time
+from copy import deepcopy
+
+import attr
+from automatheque.decomposition import (
+    DECOMPOSE_RESULTAT_MAX_INFOS,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    DecompositionEchecTousPatrons,
+    Identificateur,
+)
+from automatheque.decomposition.decomposeur import _champs
+
+
+def _remplit_serie(obj, resultats):
+    obj.serie, obj.saison, obj.episode = resultats
+
+
+def _remplit_serie_seule(obj, resultats):
+    obj.serie = resultats
+
+
+def _remplit_annee(obj, resultats):
+    obj.annee = resultats
+
+
+@attr.s
+class BancDecomposeurs(Decomposeurs):
+    def __attrs_post_init__(self):
+        self.decomposeurs = [
+            Decomposeur(r"^([^.]+)\.", _remplit_serie_seule),
+            Decomposeur(r"(.+)[. ]S(\d{2})E(\d{2})", _remplit_serie, drapeaux=re.I),
+            Decomposeur(r"(.+)[. ](\d{1,2})x(\d{2})", _remplit_serie, poids=2),
+            Decomposeur(r"\((\d{4})\)", _remplit_annee),
+            Decomposeur(r"[. ](\d{4})[. ]", _remplit_annee),
+        ]
+
+
+@attr.s
+class Episode(Decomposable):
+    source = attr.ib(default="")
+    basename = attr.ib(default="")
+    serie = attr.ib(default=None)
+    saison = attr.ib(default=None)
+    episode = attr.ib(default=None)
+    annee = attr.ib(default=None)
+
+
+class IdentificateurPickle(Identificateur):
+    """Le score d'avant : sérialisation et copie profonde à chaque patron."""
+
+    @property
+    def obj_temoin(self):
+        if self._obj_temoin is None:
+            self._obj_temoin = deepcopy(self.obj)
+        return self._obj_temoin
+
+    def _copie_temoin(self):
+        return deepcopy(self.obj_temoin)
+
+    def _score_max_infos(self, obj, poids=None):
+        modificateur = 2 if poids is None else poids
+        nb_champs_non_vides = 2 * len([v for v in _champs(obj).values() if v])
+        longueur_relative = len(pickle.dumps(obj)) / len(pickle.dumps(self.obj_temoin))
+        return longueur_relative + modificateur + nb_champs_non_vides
+
+
+def _noms(nombre):
+    for i in range(nombre):
+        if i % 3 == 0:
+            yield "Serie.{}.S{:02d}E{:02d}.(2019).avi".format(i, i % 20, i % 30)
+        elif i % 3 == 1:
+            yield "Autre Serie {} {}x{:02d}.mkv".format(i, i % 9, i % 40)
+        else:
+            yield "divers.{}.txt".format(i)
+
+
+def mesure(classe, nombre):
+    """Durée de décomposition de `nombre` fichiers, et les objets décomposés."""
+    decomposeurs = BancDecomposeurs()
+    objets = []
+    debut = time.perf_counter()
+    for nom in _noms(nombre):
+        ep = Episode(source="/media/" + nom, basename=nom)
+        try:
+            classe(ep, decomposeurs=decomposeurs).identifie(
+                options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS
+            )
+        except DecompositionEchecTousPatrons:
+            pass
+        objets.append(ep)
+    return time.perf_counter() - debut, objets
+
+
+def mesure_score(classe, nombre):
+    """Durée du seul jugement d'un patron : copie du témoin, appel, deux scores.
+
+    Isole ce que le changement touche, sans le reste de l'analyse (moteur
+    d'expressions, journalisation…) qui dilue l'écart de bout en bout.
+    """
+    decomposeur = BancDecomposeurs().decomposeurs[1]
+    resultats = ("Serie", "01", "02")
+    identificateur = classe(Episode(basename="x.avi"), decomposeurs=[decomposeur])
+    debut = time.perf_counter()
+    for _ in range(nombre):
+        candidat = identificateur._copie_temoin()
+        decomposeur.appel_en_retour(candidat, resultats)
+        identificateur._score_max_infos(candidat, decomposeur.poids)
+        identificateur._score_max_infos(identificateur.obj)
+    return time.perf_counter() - debut
+
+
+def meilleure_mesure(classe, nombre, repetitions=5):
+    """La plus courte de plusieurs mesures, moins sensible au bruit."""
+    mesures = [mesure(classe, nombre) for _ in range(repetitions)]
+    return min(d for d, _ in mesures), mesures[0][1]
+
+
+def main(nombre=20000):
+    avant, objets_avant = meilleure_mesure(IdentificateurPickle, nombre)
+    apres, objets_apres = meilleure_mesure(Identificateur, nombre)
+    # Objets entiers, attributs d'instance compris, et non leur seule série.
+    identiques = sum(vars(a) == vars(b) for a, b in zip(objets_avant, objets_apres))
+    score_avant = min(mesure_score(IdentificateurPickle, nombre) for _ in range(5))
+    score_apres = min(mesure_score(Identificateur, nombre) for _ in range(5))
+    print("fichiers          : {}".format(nombre))
+    print("                    de bout en bout   score seul")
+    print("pickle + deepcopy : {:8.3f} s        {:8.3f} s".format(avant, score_avant))
+    print("témoin + copie    : {:8.3f} s        {:8.3f} s".format(apres, score_apres))
+    print(
+        "accélération      :    x{:.1f}             x{:.1f}".format(
+            avant / apres, score_avant / score_apres
+        )
+    )
+    print("résultats égaux   : {}/{}".format(identiques, nombre))
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Tests de la décomposition asynchrone."""
+
+import asyncio
+import re
+
+import attr
+import pytest
+from automatheque.decomposition import (
+    DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+    DECOMPOSE_RESULTAT_CUMULE,
+    DECOMPOSE_RESULTAT_MAX_INFOS,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    DecompositionEchecTousPatrons,
+    Identificateur,
+    Profil,
+    decompose_lot_async,
+)
+
+
+def _remplit_serie(obj, resultats):
+    obj.serie, obj.saison, obj.episode = resultats
+
+
+def _remplit_annee(obj, resultats):
+    obj.annee = resultats
+
+
+async def _remplit_serie_async(obj, resultats):
+    await asyncio.sleep(0)
+    _remplit_serie(obj, resultats)
+
+
+async def _remplit_annee_async(obj, resultats):
+    await asyncio.sleep(0)
+    _remplit_annee(obj, resultats)
+
+
+async def _source_async(obj, valeur=None):
+    await asyncio.sleep(0)
+    return obj.basename if valeur is None else valeur
+
+
+@attr.s
+class Episode(Decomposable):
+    source = attr.ib(default="")
+    basename = attr.ib(default="")
+    serie = attr.ib(default=None)
+    saison = attr.ib(default=None)
+    episode = attr.ib(default=None)
+    annee = attr.ib(default=None)
+
+
+def _jeu(asynchrone):
+    remplit_serie = _remplit_serie_async if asynchrone else _remplit_serie
+    remplit_annee = _remplit_annee_async if asynchrone else _remplit_annee
+    source = {"appel_source": _source_async} if asynchrone else {}
+    jeu = Decomposeurs()
+    jeu.decomposeurs = [
+        Decomposeur(
+            r"(.+)[. ]S(\d{2})E(\d{2})", remplit_serie, drapeaux=re.I, **source
+        ),
+        Decomposeur(r"\((\d{4})\)", remplit_annee, **source),
+    ]
+    return jeu
+
+
+def _episode(nom, dossier="/media/series"):
+    return Episode(source="{}/{}".format(dossier, nom), basename=nom)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"options_resultat": DECOMPOSE_RESULTAT_CUMULE},
+        {"options_resultat": DECOMPOSE_RESULTAT_MAX_INFOS},
+        {"options_analyse": DECOMPOSE_ANALYSE_ARBO_COMPLETE},
+    ],
+)
+def test_identifie_async_donne_le_resultat_synchrone(options):
+    nom = "Serie.S01E02.(2019).mkv"
+    reference = _episode(nom, "/media/Autre (1999)")
+    attendu = Identificateur(reference, decomposeurs=_jeu(False)).identifie(**options)
+
+    ep = _episode(nom, "/media/Autre (1999)")
+    obtenu = asyncio.run(
+        Identificateur(ep, decomposeurs=_jeu(True)).identifie_async(**options)
+    )
+
+    assert obtenu == attendu
+    assert ep == reference
+
+
+def test_identifie_auto_async():
+    ep = _episode("Serie.S01E02.mkv")
+    asyncio.run(Identificateur(ep, decomposeurs=_jeu(True)).identifie_auto_async())
+    assert (ep.serie, ep.saison, ep.episode) == ("Serie", "01", "02")
+
+
+def test_identifie_async_echec():
+    ep = _episode("rien.txt")
+    with pytest.raises(DecompositionEchecTousPatrons):
+        asyncio.run(Identificateur(ep, decomposeurs=_jeu(True)).identifie_async())
+
+
+def test_identifie_synchrone_refuse_un_appel_asynchrone():
+    ep = _episode("Serie.S01E02.mkv")
+    with pytest.raises(TypeError, match="identifie_async"):
+        Identificateur(ep, decomposeurs=_jeu(True)).identifie()
+
+
+def test_identifie_async_erreur_de_source_ignoree_comme_en_synchrone():
+    async def _source_en_echec(obj, valeur=None):
+        raise OSError("illisible")
+
+    jeu = _jeu(True)
+    jeu.decomposeurs.insert(
+        0, Decomposeur(r"(.+)", _remplit_annee_async, appel_source=_source_en_echec)
+    )
+    ep = _episode("Serie.S01E02.mkv")
+    asyncio.run(Identificateur(ep, decomposeurs=jeu).identifie_async())
+    assert ep.serie == "Serie" and ep.annee is None
+
+
+def test_identifie_async_profil_mesure_l_attente_de_l_appel_en_retour():
+    profil = Profil()
+    jeu = _jeu(True)
+    ep = _episode("Serie.S01E02.mkv")
+    asyncio.run(Identificateur(ep, decomposeurs=jeu, profil=profil).identifie_async())
+    stats = profil.stats(jeu.decomposeurs[0])
+    assert stats.correspondances == 1
+    assert stats.temps_appel_en_retour > 0
+
+
+def _noms(nombre):
+    return ["Serie.{}.S01E{:02d}.mkv".format(i, i % 50) for i in range(nombre)]
+
+
+def _lot(objets, **kwargs):
+    async def _collecte():
+        return [r async for r in decompose_lot_async(objets, **kwargs)]
+
+    return asyncio.run(_collecte())
+
+
+def test_decompose_lot_async_ordonne():
+    episodes = [_episode(nom) for nom in _noms(300)] + [_episode("rien.txt")]
+    resultats = _lot(episodes, decomposeurs=_jeu(True), concurrence=16)
+    assert [r.element for r in resultats] == episodes
+    assert all(r.reussi for r in resultats[:-1])
+    assert isinstance(resultats[-1].erreur, DecompositionEchecTousPatrons)
+    assert episodes[7].serie == "Serie.7"
+
+
+def test_decompose_lot_async_non_ordonne_et_source_asynchrone():
+    async def _episodes():
+        for nom in _noms(100):
+            await asyncio.sleep(0)
+            yield _episode(nom)
+
+    resultats = _lot(_episodes(), decomposeurs=_jeu(True), ordonne=False, auto=True)
+    assert len(resultats) == 100
+    assert {r.element.serie for r in resultats} == {
+        "Serie.{}".format(i) for i in range(100)
+    }
+
+
+def test_decompose_lot_async_borne_la_concurrence():
+    en_cours = maximum = 0
+
+    async def _remplit_lentement(obj, resultats):
+        nonlocal en_cours, maximum
+        en_cours += 1
+        maximum = max(maximum, en_cours)
+        await asyncio.sleep(0.001)
+        en_cours -= 1
+        _remplit_serie(obj, resultats)
+
+    jeu = Decomposeurs()
+    jeu.decomposeurs = [
+        Decomposeur(r"(.+)[. ]S(\d{2})E(\d{2})", _remplit_lentement, drapeaux=re.I)
+    ]
+    resultats = _lot([_episode(n) for n in _noms(200)], decomposeurs=jeu, concurrence=8)
+    assert all(r.reussi for r in resultats)
+    assert 1 < maximum <= 8
+
+
+def test_decompose_lot_async_arret_en_route_annule_le_reste():
+    async def _premier():
+        lot = decompose_lot_async(
+            [_episode(n) for n in _noms(50)], decomposeurs=_jeu(True), concurrence=10
+        )
+        async for resultat in lot:
+            await lot.aclose()
+            return resultat
+
+    assert asyncio.run(_premier()).reussi
+
+
+def test_decompose_lot_async_concurrence_invalide():
+    with pytest.raises(ValueError):
+        _lot([], concurrence=0)
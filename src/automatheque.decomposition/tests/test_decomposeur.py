@@ -16,6 +16,7 @@ from automatheque.decomposition import (
     DECOMPOSE_RESULTAT_CUMULE,
     DECOMPOSE_RESULTAT_MAX_INFOS,
     DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    CacheRepertoires,
     Decomposable,
     Decomposeur,
     Decomposeurs,
@@ -68,8 +69,7 @@ class EpisodeAvecDefaut(Episode):
 @attr.s(slots=True)
 class EpisodeSlots(Decomposable):
     """Décomposable **à slots** (`attrs.define` / `@attr.s(slots=True)`), donc
-    sans `__dict__`. Au niveau module pour rester *picklable* (`_score_max_infos`
-    sérialise l'objet)."""
+    sans `__dict__`."""
 
     basename = attr.ib(default="")
     source = attr.ib(default="")
@@ -119,6 +119,27 @@ def test_chemin_d_import_introuvable_reclame_l_argument():
         Identificateur(ep, decomposeurs="paquet.inexistant.PasDeClasse")
 
 
+def test_jeu_donne_par_chemin_d_import_instancie_une_fois_par_processus():
+    chemin = "{}.SerieDecomposeurs".format(__name__)
+    Decomposeurs.oublie_partages()
+    premier = Identificateur(Episode(), decomposeurs=chemin).decomposeurs
+    second = Identificateur(Episode(), decomposeurs=chemin).decomposeurs
+    assert isinstance(premier, SerieDecomposeurs)
+    assert premier is second
+    Decomposeurs.oublie_partages()
+    assert Identificateur(Episode(), decomposeurs=chemin).decomposeurs is not premier
+
+
+def test_patron_compile_une_fois_prefiltre_propre_a_chaque_decomposeur():
+    a = Decomposeur(r"S(\d+)E(\d+)", lambda obj, r: None, drapeaux=re.I)
+    b = Decomposeur(r"S(\d+)E(\d+)", lambda obj, r: None, drapeaux=re.I)
+    assert a.compile is b.compile
+    assert a.fenetre is b.fenetre
+    assert a.prefiltre is not b.prefiltre
+    a.prefiltre.laisse_passer("rien")
+    assert (a.prefiltre.essais, b.prefiltre.essais) == (1, 0)
+
+
 def test_appel_source_explicite_est_utilise():
     """Régression : un `appel_source` fourni levait un `UnboundLocalError`."""
 
@@ -335,3 +356,341 @@ def test_prepare_decomposition_respecte_une_valeur_vide_explicite():
     ep = Episode(basename="defaut.avi")
     assert ep._prepare_decomposition("") == ""
     assert ep._prepare_decomposition(None) == "defaut.avi"
+
+
+def test_un_decomposer_surcharge_est_appele():
+    """Une sous-classe qui surcharge `_decomposer` garde la main sur la
+    recherche, comme avant l'extraction par source."""
+
+    class DecomposeurMajuscules(Decomposeur):
+        def _decomposer(self, obj, valeur=None, pos=None, endpos=None):
+            resultats = super()._decomposer(obj, valeur, pos, endpos)
+            return [tuple(r.upper() for r in resultat) for resultat in resultats]
+
+    decs = SerieDecomposeurs()
+    decs.decomposeurs = [
+        DecomposeurMajuscules(
+            r"(.+)[. ]S(\d{2})E(\d{2})", _remplit_serie, drapeaux=re.I
+        )
+    ]
+    ep = Episode(basename="Ma.Serie.s01e02.avi")
+    ep.decompose(decomposeurs=decs)
+    assert (ep.serie, ep.saison, ep.episode) == ("MA.SERIE", "01", "02")
+
+
+# --- Score MAX_INFOS sans sérialisation --------------------------------------
+
+
+@attr.s
+class EpisodeEtiquete(Episode):
+    """Porte un attribut modifiable en place : ses copies doivent être profondes."""
+
+    etiquettes = attr.ib(factory=list)
+
+
+def _ajoute_etiquette(obj, resultats):
+    obj.etiquettes.append(resultats)
+
+
+def test_max_infos_un_candidat_ne_contamine_pas_le_suivant():
+    """Chaque patron est jugé sur un témoin vierge, même quand l'appel en retour
+    modifie une liste en place."""
+    decs = SerieDecomposeurs()
+    decs.decomposeurs = [
+        Decomposeur(r"(\w+)\.avi", _ajoute_etiquette),
+        Decomposeur(r"^(\w+)", _ajoute_etiquette),
+    ]
+    ep = EpisodeEtiquete(basename="video.avi")
+    identificateur = Identificateur(ep, decomposeurs=decs)
+    identificateur.identifie(options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS)
+    assert not identificateur._temoin_copiable
+    assert identificateur.obj_temoin.etiquettes == []
+    # Le second candidat (une étiquette) ne fait pas mieux que l'objet déjà
+    # rempli ; partagée avec le témoin, la liste en aurait porté deux.
+    assert ep.etiquettes == ["video"]
+
+
+def test_max_infos_temoin_immuable_copie_superficielle():
+    identificateur = Identificateur(Episode(basename="x"), SerieDecomposeurs())
+    assert identificateur.obj_temoin == Episode(basename="x")
+    assert identificateur._temoin_copiable
+
+
+def test_score_max_infos_favorise_les_champs_remplis_puis_le_poids():
+    identificateur = Identificateur(Episode(basename="x.avi"), SerieDecomposeurs())
+    un_champ = Episode(basename="x.avi", serie="x")
+    trois_champs = Episode(basename="x.avi", serie="x", saison="1", episode="2")
+    score = identificateur._score_max_infos
+    assert score(trois_champs, 1) > score(un_champ, 1)
+    assert score(un_champ, 3) > score(un_champ, 1)
+    # À champs égaux, le plus long l'emporte.
+    assert score(Episode(basename="x.avi", serie="long")) > score(un_champ)
+
+
+class IdentificateurPickle(Identificateur):
+    """Le score d'origine : candidat et témoin sérialisés à chaque patron."""
+
+    def _score_max_infos(self, obj, poids=None):
+        import pickle
+
+        from automatheque.decomposition.decomposeur import _champs
+
+        modificateur = 2 if poids is None else poids
+        nb_champs_non_vides = 2 * len([v for v in _champs(obj).values() if v])
+        longueur = len(pickle.dumps(obj)) / len(pickle.dumps(self.obj_temoin))
+        return longueur + modificateur + nb_champs_non_vides
+
+
+def _remplit_titre(obj, resultats):
+    obj.serie = resultats
+
+
+def _remplit_annee_entiere(obj, resultats):
+    obj.annee = int(resultats)
+
+
+@attr.s
+class EpisodeDate(Episode):
+    sortie = attr.ib(default=None)
+
+
+def _remplit_commentaire(obj, resultats):
+    # Attribut d'instance hors des champs attrs.
+    obj.commentaire = resultats
+
+
+def _remplit_sortie(obj, resultats):
+    import datetime
+
+    obj.sortie = datetime.date(int(resultats), 1, 1)
+
+
+@pytest.mark.parametrize(
+    "patrons, nom, classe",
+    [
+        # Poids faible et longue capture contre poids fort, autant de champs.
+        (
+            [
+                Decomposeur(r"^(.{60})", _remplit_titre, poids=1),
+                Decomposeur(r"^(\w+)", _remplit_titre, poids=3),
+            ],
+            "Un.Titre.De.Soixante.Caracteres.Ou.Plus.Pour.Le.Test.De.Regression.avi",
+            Episode,
+        ),
+        # Même année, en entier ou en chaîne.
+        (
+            [
+                Decomposeur(r"(\d{4})", _remplit_annee),
+                Decomposeur(r"(\d{4})", _remplit_annee_entiere),
+            ],
+            "Film (2019).mkv",
+            Episode,
+        ),
+        (
+            [
+                Decomposeur(r"(\d{4})", _remplit_annee_entiere),
+                Decomposeur(r"(\d{4})", _remplit_annee),
+            ],
+            "Film (2019).mkv",
+            Episode,
+        ),
+        # Séries : trois champs contre un, à poids différents.
+        (
+            [
+                Decomposeur(r"^([^.]+)\.", _remplit_titre, poids=4),
+                Decomposeur(r"(.+)[. ]S(\d{2})E(\d{2})", _remplit_serie, drapeaux=re.I),
+                Decomposeur(r"\((\d{4})\)", _remplit_annee, poids=0),
+            ],
+            "Ma.Serie.S01E02 (2019).avi",
+            Episode,
+        ),
+        # Un attribut d'instance ajouté hors des champs attrs pèse dans la
+        # taille, sans compter parmi les champs remplis.
+        (
+            [
+                Decomposeur(r"^(\w+)", _remplit_titre, poids=2),
+                Decomposeur(r"^(.+)\.", _remplit_commentaire, poids=2),
+            ],
+            "Film.De.Quatorze.Caracteres.Et.Bien.Plus.Encore.mkv",
+            Episode,
+        ),
+        # Une valeur non scalaire : l'objet entier est sérialisé.
+        (
+            [
+                Decomposeur(r"(\d{4})", _remplit_sortie),
+                Decomposeur(r"^(\w+)", _remplit_titre, poids=0),
+            ],
+            "Film (2019).mkv",
+            EpisodeDate,
+        ),
+    ],
+)
+def test_max_infos_choisit_comme_le_score_pickle(patrons, nom, classe):
+    """Le score sans sérialisation des candidats classe comme l'ancien."""
+    decs = SerieDecomposeurs()
+    decs.decomposeurs = patrons
+    objets = []
+    for identificateur in (Identificateur, IdentificateurPickle):
+        obj = classe(basename=nom)
+        identificateur(obj, decomposeurs=decs).identifie(
+            options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS
+        )
+        objets.append(obj)
+    assert objets[0] == objets[1]
+    assert type(objets[0].annee) is type(objets[1].annee)
+
+    # Et chaque score, candidat par candidat, vaut l'ancien.
+    class IdentificateurCompare(Identificateur):
+        def _score_max_infos(self, obj, poids=None):
+            score = super()._score_max_infos(obj, poids)
+            ancien = IdentificateurPickle._score_max_infos(self, obj, poids)
+            assert score == pytest.approx(ancien)
+            return score
+
+    IdentificateurCompare(classe(basename=nom), decomposeurs=decs).identifie(
+        options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS
+    )
+
+
+# --- auto_decompose : mémo entre combinaisons --------------------------------
+
+
+def _espionne_applique(monkeypatch):
+    joues = []
+    applique = Decomposeur._applique
+
+    def _espion(self, source, pos=None, endpos=None):
+        joues.append((self.chaine, source))
+        return applique(self, source, pos=pos, endpos=endpos)
+
+    monkeypatch.setattr(Decomposeur, "_applique", _espion)
+    return joues
+
+
+def test_auto_decompose_ne_rejoue_pas_un_patron_sur_la_meme_chaine(monkeypatch):
+    """Six combinaisons, mais chaque (patron, chaîne) n'est analysé qu'une fois."""
+    joues = _espionne_applique(monkeypatch)
+    ep = Episode(source="/media/series/rien/video.avi", basename="video.avi")
+    with pytest.raises(DecompositionEchecTousPatrons):
+        ep.auto_decompose(racine="/media", decomposeurs=SerieDecomposeurs())
+    assert len(joues) == len(set(joues))
+    assert {source for _, source in joues} == {
+        "video.avi",
+        "rien",
+        "series",
+        "rien video.avi",
+        "series rien video.avi",
+    }
+
+
+def test_auto_decompose_ne_remonte_l_arborescence_qu_une_fois(monkeypatch):
+    from automatheque.util.repertoire import Arborescence
+
+    appels = []
+    remonte = Arborescence.noms
+
+    def _espion(self, fichier):
+        appels.append(fichier)
+        return remonte(self, fichier)
+
+    monkeypatch.setattr(Arborescence, "noms", _espion)
+    ep = Episode(source="/media/series/rien/video.avi", basename="video.avi")
+    with pytest.raises(DecompositionEchecTousPatrons):
+        ep.auto_decompose(racine="/media", decomposeurs=SerieDecomposeurs())
+    assert len(appels) == 1
+
+
+def test_identifie_auto_oublie_le_memo_apres_l_appel():
+    ep = Episode(source="/media/series/Ma.Serie.S01E02/video.avi", basename="video.avi")
+    identificateur = Identificateur(ep, decomposeurs=SerieDecomposeurs())
+    identificateur.identifie_auto(racine="/media")
+    assert ep.serie == "Ma.Serie"
+    assert identificateur._memo_correspondances is None
+    assert identificateur._memo_parents is None
+
+
+def test_un_valueerror_du_callback_aux_niveaux_parents_remonte():
+    """Seule la remontée de l'arborescence transforme `ValueError` en échec."""
+
+    def _plante(obj, resultats):
+        raise ValueError("bug")
+
+    decs = Decomposeurs()
+    decs.decomposeurs = [Decomposeur(r"^(series)$", _plante)]
+    ep = Episode(source="/media/series/video.avi", basename="video.avi")
+    with pytest.raises(ValueError, match="bug"):
+        ep.decompose(
+            racine="/media",
+            decomposeurs=decs,
+            options_analyse=DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+        )
+
+
+# --- Cache des répertoires parents -------------------------------------------
+
+
+def test_cache_repertoires_ne_decompose_un_dossier_qu_une_fois(monkeypatch):
+    joues = _espionne_applique(monkeypatch)
+    cache = CacheRepertoires()
+    decs = SerieDecomposeurs()
+    eps = [
+        Episode(source="/media/series/Ma.Serie.S01E02/{}.avi".format(n), basename=n)
+        for n in ("a", "b", "c")
+    ]
+    for ep in eps:
+        ep.decompose(
+            racine="/media",
+            decomposeurs=decs,
+            options_analyse=DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+            cache=cache,
+        )
+    assert [ep.serie for ep in eps] == ["Ma.Serie"] * 3
+    assert [s for _, s in joues].count("Ma.Serie.S01E02") == 1
+    assert cache.statistiques()["succes"] == 2
+    assert cache.statistiques()["echecs"] == 1
+
+
+def test_cache_repertoires_oublie_le_moins_recemment_utilise():
+    cache = CacheRepertoires(taille_max=2)
+    premier = cache.niveau((), "a")
+    cache.niveau((), "b")
+    assert cache.niveau((), "a") is premier
+    cache.niveau((), "c")
+    assert len(cache) == 2
+    assert cache.niveau((), "a") is premier
+    cache.niveau((), "b")
+    assert cache.statistiques() == {
+        "succes": 2,
+        "echecs": 4,
+        "taux_succes": 2 / 6,
+        "taille": 2,
+        "taille_max": 2,
+    }
+    cache.vide()
+    assert len(cache) == 0 and cache.succes == cache.echecs == 0
+
+
+def test_cache_repertoires_taille_invalide():
+    with pytest.raises(ValueError):
+        CacheRepertoires(taille_max=0)
+
+
+def test_cache_repertoires_distingue_les_jeux_de_patrons():
+    cache = CacheRepertoires()
+    ep = Episode(source="/media/series/2019/video.avi", basename="video.avi")
+    annees = Decomposeurs()
+    annees.decomposeurs = [Decomposeur(r"^(\d{4})$", _remplit_annee)]
+    with pytest.raises(DecompositionEchecTousPatrons):
+        ep.decompose(
+            racine="/media",
+            decomposeurs=SerieDecomposeurs(),
+            options_analyse=DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+            cache=cache,
+        )
+    ep.decompose(
+        racine="/media",
+        decomposeurs=annees,
+        options_analyse=DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+        cache=cache,
+    )
+    assert ep.annee == "2019"
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'analyse concaténée incrémentale."""
+
+import random
+import re
+
+import attr
+import pytest
+from automatheque.decomposition import (
+    DECOMPOSE_ANALYSE_ARBO_CONCATENE,
+    DECOMPOSE_RESULTAT_CUMULE,
+    DECOMPOSE_RESULTAT_MAX_INFOS,
+    DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    DecompositionEchecTousPatrons,
+)
+from automatheque.decomposition.fenetre import fenetre_de
+
+
+@pytest.mark.parametrize(
+    "chaine, drapeaux, attendu",
+    [
+        (r"^(\d{4}) (\w{1,20})", 0, (25, True)),
+        (r"\A\b(CD)(\d)\b", 0, (3, True)),
+        (r"S(\d{2})E(\d{2})", re.I, (6, False)),
+        (r"(.+)[. ]S(\d{2})E(\d{2})", 0, None),
+        (r"^(\d{4})", re.M, None),
+        (r"(\d{4})$", 0, None),
+        (r"\b(\d{4})", 0, None),
+        (r"(?<=x)(\d)", 0, None),
+        (r"(\d)\1", 0, None),
+        (r"(?:a|b$)c", 0, None),
+    ],
+)
+def test_fenetre_des_patrons(chaine, drapeaux, attendu):
+    fenetre = fenetre_de(re.compile(chaine, drapeaux))
+    if attendu is None:
+        assert fenetre is None
+    else:
+        assert (fenetre.largeur, fenetre.en_tete) == attendu
+
+
+def _remplit(obj, resultats):
+    obj.trouves.append(resultats)
+
+
+@attr.s
+class Objet(Decomposable):
+    source = attr.ib(default="")
+    basename = attr.ib(default="")
+    trouves = attr.ib(factory=list)
+
+
+_PATRONS = [
+    r"^(\d{4}) ",
+    r"S(\d{2})E(\d{2})",
+    r"\A([A-Z]{2,3})-(\d)",
+    r"CD ?(\d)",
+    r"(\d)x(\d{2})",
+    r"^(.+) - (.+)$",
+    r"(\w+)\.flac",
+]
+
+
+def _jeu(fenetres):
+    jeu = Decomposeurs()
+    jeu.decomposeurs = [Decomposeur(p, _remplit) for p in _PATRONS]
+    if not fenetres:
+        for d in jeu.decomposeurs:
+            d.fenetre = None
+    return jeu
+
+
+def _segment(alea):
+    morceaux = ["2019 ", "S01E02", "AB-3", "CD 2", "1x05", " - ", "piste.flac"]
+    lettres = "abc xyz."
+    return "".join(
+        alea.choice(morceaux) if alea.random() < 0.15 else alea.choice(lettres)
+        for _ in range(alea.randint(1, 12))
+    )
+
+
+@pytest.mark.parametrize(
+    "options_resultat",
+    [
+        DECOMPOSE_RESULTAT_PREMIER_NON_NUL,
+        DECOMPOSE_RESULTAT_CUMULE,
+        DECOMPOSE_RESULTAT_MAX_INFOS,
+    ],
+)
+def test_meme_resultat_qu_en_relisant_tout(options_resultat):
+    alea = random.Random(1234)
+    for _ in range(300):
+        niveaux = [_segment(alea) for _ in range(alea.randint(1, 6))]
+        source = "/racine/" + "/".join(niveaux)
+        resultats = []
+        for fenetres in (True, False):
+            obj = Objet(source=source, basename=niveaux[-1])
+            try:
+                retour = obj.decompose(
+                    racine="/racine",
+                    decomposeurs=_jeu(fenetres),
+                    options_resultat=options_resultat,
+                    options_analyse=DECOMPOSE_ANALYSE_ARBO_CONCATENE,
+                )
+            except DecompositionEchecTousPatrons:
+                retour = "échec"
+            resultats.append((retour, obj.trouves))
+        assert resultats[0] == resultats[1], source
+
+
+def test_seul_le_segment_ajoute_est_relu(monkeypatch):
+    lus = []
+    applique = Decomposeur._applique
+
+    def _espion(self, source, pos=None, endpos=None):
+        lus.append((source, endpos))
+        return applique(self, source, pos=pos, endpos=endpos)
+
+    monkeypatch.setattr(Decomposeur, "_applique", _espion)
+    jeu = Decomposeurs()
+    jeu.decomposeurs = [Decomposeur(r"S(\d{2})E(\d{2})", _remplit)]
+    obj = Objet(source="/r/Serie S01E02/a/b/video.avi", basename="video.avi")
+    obj.decompose(
+        racine="/r",
+        decomposeurs=jeu,
+        options_analyse=DECOMPOSE_ANALYSE_ARBO_CONCATENE,
+    )
+    assert obj.trouves == [("01", "02")]
+    assert lus == [
+        ("video.avi", None),
+        ("b video.avi", 8),
+        ("a b video.avi", 8),
+        ("Serie S01E02 a b video.avi", 19),
+    ]
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'index persistant des décompositions."""
+
+import os
+import re
+
+import attr
+import pytest
+from automatheque.decomposition import (
+    DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+    DECOMPOSE_RESULTAT_MAX_INFOS,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    DecompositionEchecTousPatrons,
+    IndexDecomposition,
+    OrdreAdaptatif,
+    decompose_lot,
+)
+from automatheque.decomposition.index import empreinte_jeu
+
+
+def _remplit_serie(obj, resultats):
+    obj.serie, obj.saison, obj.episode = resultats
+
+
+def _remplit_annee(obj, resultats):
+    obj.annee = resultats
+
+
+@attr.s
+class SerieDecomposeurs(Decomposeurs):
+    def __attrs_post_init__(self):
+        self.decomposeurs = [
+            Decomposeur(r"(.+)[. ]S(\d{2})E(\d{2})", _remplit_serie, drapeaux=re.I),
+            Decomposeur(r"\((\d{4})\)", _remplit_annee),
+        ]
+
+
+@attr.s
+class Episode(Decomposable):
+    source = attr.ib(default="")
+    basename = attr.ib(default="")
+    serie = attr.ib(default=None)
+    saison = attr.ib(default=None)
+    episode = attr.ib(default=None)
+    annee = attr.ib(default=None)
+
+
+@pytest.fixture
+def fichier(tmp_path):
+    chemin = tmp_path / "Ma.Serie.S01E02 (2019).avi"
+    chemin.write_bytes(b"video")
+    return chemin
+
+
+@pytest.fixture
+def joues(monkeypatch):
+    joues = []
+    applique = Decomposeur._applique
+
+    def _espion(self, source, pos=None, endpos=None):
+        joues.append(self.chaine)
+        return applique(self, source, pos=pos, endpos=endpos)
+
+    monkeypatch.setattr(Decomposeur, "_applique", _espion)
+    return joues
+
+
+def _episode(chemin):
+    return Episode(source=str(chemin), basename=chemin.name)
+
+
+def test_fichier_inchange_rejoue_sans_expression(fichier, joues, tmp_path):
+    decs = SerieDecomposeurs()
+    with IndexDecomposition(str(tmp_path / "index.sqlite")) as index:
+        premier = _episode(fichier)
+        valeur = premier.decompose(decomposeurs=decs, index=index)
+        assert joues
+        joues.clear()
+        second = _episode(fichier)
+        assert second.decompose(decomposeurs=decs, index=index) == valeur
+        assert joues == []
+        assert second == premier
+        assert (index.succes, index.echecs) == (1, 1)
+
+
+def test_index_persiste_d_une_ouverture_a_l_autre(fichier, joues, tmp_path):
+    base = str(tmp_path / "index.sqlite")
+    with IndexDecomposition(base) as index:
+        _episode(fichier).decompose(
+            decomposeurs=SerieDecomposeurs(),
+            options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS,
+            index=index,
+        )
+    joues.clear()
+    with IndexDecomposition(base) as index:
+        ep = _episode(fichier)
+        ep.decompose(
+            decomposeurs=SerieDecomposeurs(),
+            options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS,
+            index=index,
+        )
+    assert joues == []
+    attendu = _episode(fichier)
+    attendu.decompose(
+        decomposeurs=SerieDecomposeurs(), options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS
+    )
+    assert ep == attendu
+
+
+def test_fichier_modifie_est_redecompose(fichier, joues):
+    with IndexDecomposition(":memory:") as index:
+        _episode(fichier).decompose(decomposeurs=SerieDecomposeurs(), index=index)
+        etat = os.stat(fichier)
+        os.utime(fichier, ns=(etat.st_atime_ns, etat.st_mtime_ns + 10**9))
+        joues.clear()
+        _episode(fichier).decompose(decomposeurs=SerieDecomposeurs(), index=index)
+        assert joues
+
+
+def test_patron_modifie_invalide_l_index(fichier, joues):
+    decs = SerieDecomposeurs()
+    with IndexDecomposition(":memory:") as index:
+        _episode(fichier).decompose(decomposeurs=decs, index=index)
+        avant = empreinte_jeu(decs)
+        decs.decomposeurs[0] = Decomposeur(r"(.+)\.S(\d{2})E(\d{2})", _remplit_serie)
+        assert empreinte_jeu(decs) != avant
+        joues.clear()
+        _episode(fichier).decompose(decomposeurs=decs, index=index)
+        assert joues == [r"(.+)\.S(\d{2})E(\d{2})"]
+
+
+def test_echec_est_rejoue(tmp_path, joues):
+    chemin = tmp_path / "rien.txt"
+    chemin.write_text("")
+    with IndexDecomposition(":memory:") as index:
+        for _ in range(2):
+            with pytest.raises(DecompositionEchecTousPatrons):
+                _episode(chemin).auto_decompose(
+                    decomposeurs=SerieDecomposeurs(), index=index
+                )
+        assert index.succes == 1
+
+
+def test_objet_sans_fichier_n_est_pas_indexe(joues):
+    with IndexDecomposition(":memory:") as index:
+        ep = Episode(source="/nulle/part/A.S01E02.avi", basename="A.S01E02.avi")
+        ep.decompose(decomposeurs=SerieDecomposeurs(), index=index)
+        assert ep.serie == "A"
+        assert (index.succes, index.echecs) == (0, 0)
+
+
+def test_decompose_lot_utilise_l_index(tmp_path, joues):
+    dossier = tmp_path / "A.S01E02"
+    dossier.mkdir()
+    (dossier / "video.avi").write_bytes(b"")
+    with IndexDecomposition(":memory:") as index:
+        for _ in range(2):
+            ep = _episode(dossier / "video.avi")
+            (resultat,) = decompose_lot(
+                [ep],
+                decomposeurs=SerieDecomposeurs(),
+                racine=str(tmp_path),
+                options_analyse=DECOMPOSE_ANALYSE_ARBO_COMPLETE,
+                index=index,
+            )
+            assert resultat.reussi and ep.serie == "A"
+        assert index.succes == 1
+
+
+def test_l_ordre_adaptatif_entre_dans_la_cle(fichier, joues):
+    """En premier non nul, le gagnant dépend de l'ordre : un résultat obtenu
+    dans un autre ordre n'est pas rejoué."""
+
+    def _remplit_titre(obj, resultats):
+        obj.serie = resultats
+
+    ordre = OrdreAdaptatif(periode=1)
+    decs = SerieDecomposeurs(ordre=ordre)
+    decs.decomposeurs = [
+        Decomposeur(r"^(\w+)\.", _remplit_titre),
+        Decomposeur(r"^\w+\.(\w+)\.", _remplit_titre),
+    ]
+    with IndexDecomposition(":memory:") as index:
+        ep = _episode(fichier)
+        ep.decompose(decomposeurs=decs, index=index)
+        assert ep.serie == "Ma"
+
+        # Le second patron réussit désormais plus souvent : il passe devant.
+        ordre._compteurs[(decs.decomposeurs[0].chaine, 0)] = [10, 1]
+        ordre._compteurs[(decs.decomposeurs[1].chaine, 0)] = [10, 9]
+        ep = _episode(fichier)
+        ep.decompose(decomposeurs=decs, index=index)
+        assert ep.serie == "Serie"
+        assert index.echecs == 2
+
+        # Même ordre : rejoué.
+        joues.clear()
+        ep = _episode(fichier)
+        ep.decompose(decomposeurs=decs, index=index)
+        assert ep.serie == "Serie"
+        assert joues == []
+
+
+def test_source_relative_et_absolue_partagent_l_entree(fichier, joues, monkeypatch):
+    monkeypatch.chdir(fichier.parent)
+    with IndexDecomposition(":memory:") as index:
+        Episode(source=fichier.name, basename=fichier.name).decompose(
+            decomposeurs=SerieDecomposeurs(), index=index
+        )
+        joues.clear()
+        ep = _episode(fichier)
+        ep.decompose(decomposeurs=SerieDecomposeurs(), index=index)
+        assert ep.serie == "Ma.Serie"
+        assert joues == []
+        assert (index.succes, index.echecs) == (1, 1)
+
+
+def test_appel_en_retour_asynchrone_refuse_au_rejeu(fichier):
+    """Rejoué, un appel en retour devenu asynchrone est refusé comme à la
+    décomposition, et non laissé sans attente."""
+    asynchrone = []
+
+    async def _remplit_plus_tard(obj, resultats):
+        _remplit_serie(obj, resultats)
+
+    def _remplit(obj, resultats):
+        if asynchrone:
+            return _remplit_plus_tard(obj, resultats)
+        _remplit_serie(obj, resultats)
+
+    decs = SerieDecomposeurs()
+    decs.decomposeurs = [Decomposeur(r"(.+)[. ]S(\d{2})E(\d{2})", _remplit)]
+    with IndexDecomposition(":memory:") as index:
+        _episode(fichier).decompose(decomposeurs=decs, index=index)
+        asynchrone.append(True)
+        ep = _episode(fichier)
+        with pytest.raises(TypeError, match="asynchrone"):
+            ep.decompose(decomposeurs=decs, index=index)
+        assert index.succes == 1
+        assert ep.serie is None
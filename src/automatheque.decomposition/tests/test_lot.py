@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Tests de la décomposition par lots."""
+
+import re
+
+import attr
+import pytest
+from automatheque.decomposition import (
+    DECOMPOSE_RESULTAT_MAX_INFOS,
+    CacheRepertoires,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    DecompositionEchecTousPatrons,
+    decompose_lot,
+    decompose_parallele,
+)
+from automatheque.exceptions import ArgumentManquant
+
+
+def _remplit_serie(obj, resultats):
+    obj.serie, obj.saison, obj.episode = resultats
+
+
+@attr.s
+class SerieDecomposeurs(Decomposeurs):
+    """Compte ses instanciations, pour vérifier qu'elle n'a lieu qu'une fois."""
+
+    instanciations = 0
+
+    def __attrs_post_init__(self):
+        type(self).instanciations += 1
+        self.decomposeurs = [
+            Decomposeur(r"(.+)[. ]S(\d{2})E(\d{2})", _remplit_serie, drapeaux=re.I),
+        ]
+
+
+@attr.s
+class Episode(Decomposable):
+    source = attr.ib(default="")
+    basename = attr.ib(default="")
+    serie = attr.ib(default=None)
+    saison = attr.ib(default=None)
+    episode = attr.ib(default=None)
+
+    @classmethod
+    def _decomposeurs_par_defaut(cls):
+        return "{}.SerieDecomposeurs".format(__name__)
+
+
+def _episode_depuis_chemin(chemin):
+    """Fabrique de niveau module : elle doit franchir la frontière des processus."""
+    return Episode(source=chemin, basename=chemin.rsplit("/", 1)[-1])
+
+
+def _episodes(*noms):
+    return (Episode(source="/media/series/" + nom, basename=nom) for nom in noms)
+
+
+def test_decompose_lot_produit_un_resultat_par_objet():
+    resultats = list(
+        decompose_lot(
+            _episodes("A.S01E02.avi", "rien.txt", "B.S03E04.mkv"),
+            decomposeurs=SerieDecomposeurs(),
+        )
+    )
+    assert [r.reussi for r in resultats] == [True, False, True]
+    assert resultats[0].valeur == ("A", "01", "02")
+    assert resultats[2].element.serie == "B"
+    assert isinstance(resultats[1].erreur, DecompositionEchecTousPatrons)
+
+
+def test_decompose_lot_resout_le_jeu_de_patrons_une_seule_fois():
+    Decomposeurs.oublie_partages()
+    SerieDecomposeurs.instanciations = 0
+    noms = ["S{}.S01E0{}.avi".format(i, i) for i in range(1, 6)]
+    for resultat in decompose_lot(_episodes(*noms)):
+        assert resultat.reussi
+    assert SerieDecomposeurs.instanciations == 1
+
+
+def test_decompose_lot_est_paresseux():
+    """Le lot n'est pas matérialisé : un générateur infini est accepté."""
+
+    def _sans_fin():
+        while True:
+            yield Episode(basename="A.S01E02.avi")
+
+    premier = next(decompose_lot(_sans_fin(), decomposeurs=SerieDecomposeurs()))
+    assert premier.element.serie == "A"
+
+
+def test_decompose_lot_en_mode_auto_remonte_l_arborescence():
+    ep = Episode(source="/media/series/A.S01E02/video.avi", basename="video.avi")
+    (resultat,) = decompose_lot([ep], racine="/media", auto=True)
+    assert resultat.reussi
+    assert ep.serie == "A"
+
+
+def test_decompose_lot_partage_le_cache_des_repertoires():
+    cache = CacheRepertoires()
+    eps = [
+        Episode(source="/media/A.S01E02/{}.avi".format(n), basename=n + ".avi")
+        for n in ("x", "y", "z")
+    ]
+    resultats = decompose_lot(eps, racine="/media", auto=True, cache=cache)
+    assert all(r.reussi for r in resultats)
+    assert [e.serie for e in eps] == ["A"] * 3
+    assert cache.echecs == 1 and cache.succes >= 2
+
+
+def test_decompose_lot_max_infos_prend_le_temoin_avant_remplissage():
+    eps = list(_episodes("A.S01E02.avi", "B.S03E04.avi"))
+    resultats = decompose_lot(
+        eps,
+        decomposeurs=SerieDecomposeurs(),
+        options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS,
+    )
+    assert all(r.reussi for r in resultats)
+    assert [e.serie for e in eps] == ["A", "B"]
+
+
+def test_decompose_lot_sans_patrons_reclame_l_argument():
+    @attr.s
+    class SansDefaut(Decomposable):
+        basename = attr.ib(default="x")
+
+    with pytest.raises(ArgumentManquant):
+        list(decompose_lot([SansDefaut()]))
+
+
+# --- Pool de processus -------------------------------------------------------
+
+
+def _chemins(n):
+    return ["/media/series/S{}.S01E{:02d}.avi".format(i, i % 100) for i in range(n)]
+
+
+def test_decompose_parallele_respecte_l_ordre_des_chemins():
+    chemins = _chemins(50) + ["/media/series/rien.txt"]
+    resultats = list(
+        decompose_parallele(
+            iter(chemins),
+            _episode_depuis_chemin,
+            decomposeurs=SerieDecomposeurs(),
+            workers=2,
+            taille_tranche=7,
+        )
+    )
+    assert [r.element.source for r in resultats] == chemins
+    assert [r.element.serie for r in resultats[:3]] == ["S0", "S1", "S2"]
+    assert not resultats[-1].reussi
+    assert isinstance(resultats[-1].erreur, DecompositionEchecTousPatrons)
+
+
+def test_decompose_parallele_au_fil_de_l_eau_rend_tous_les_resultats():
+    chemins = _chemins(40)
+    resultats = decompose_parallele(
+        chemins,
+        _episode_depuis_chemin,
+        decomposeurs="{}.SerieDecomposeurs".format(__name__),
+        workers=2,
+        taille_tranche=3,
+        ordonne=False,
+    )
+    assert sorted(r.element.source for r in resultats) == sorted(chemins)
+
+
+def test_decompose_parallele_parametres_invalides():
+    with pytest.raises(ValueError):
+        decompose_parallele([], _episode_depuis_chemin, workers=0)
+    with pytest.raises(ValueError):
+        decompose_parallele([], _episode_depuis_chemin, taille_tranche=0)
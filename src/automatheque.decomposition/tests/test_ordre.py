@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'ordre adaptatif des patrons."""
+
+import attr
+import pytest
+from automatheque.decomposition import (
+    DECOMPOSE_RESULTAT_CUMULE,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    OrdreAdaptatif,
+    decompose_lot,
+)
+
+
+def _remplit_titre(obj, resultats):
+    obj.titre = resultats
+
+
+@attr.s
+class MusiqueDecomposeurs(Decomposeurs):
+    def __attrs_post_init__(self):
+        self.decomposeurs = [
+            Decomposeur(r"^(.+)\.ogg$", _remplit_titre),
+            Decomposeur(r"^CD\d (.+)\.mp3$", _remplit_titre),
+            Decomposeur(r"^(.+)\.flac$", _remplit_titre),
+        ]
+
+
+@attr.s
+class Piste(Decomposable):
+    basename = attr.ib(default="")
+    titre = attr.ib(default=None)
+
+
+def _rangs(ordre, jeu):
+    return [rang for rang, _ in ordre.ordonne(jeu)]
+
+
+def test_sans_historique_l_ordre_declare_est_garde():
+    jeu = MusiqueDecomposeurs()
+    assert _rangs(OrdreAdaptatif(), jeu) == [0, 1, 2]
+
+
+def test_le_poids_departage_avant_l_ordre_declare():
+    jeu = MusiqueDecomposeurs()
+    jeu.decomposeurs[2].poids = 5
+    assert _rangs(OrdreAdaptatif(), jeu) == [2, 0, 1]
+
+
+def test_les_patrons_qui_reussissent_passent_devant(monkeypatch):
+    ordre = OrdreAdaptatif(periode=1)
+    jeu = MusiqueDecomposeurs(ordre=ordre)
+    pistes = [Piste(basename="piste {}.flac".format(i)) for i in range(10)]
+    assert all(r.reussi for r in decompose_lot(pistes, decomposeurs=jeu))
+    assert _rangs(ordre, jeu)[0] == 2
+    assert ordre.taux(jeu.decomposeurs[2]) == 1.0
+
+    joues = []
+    applique = Decomposeur._applique
+
+    def _espion(self, source, pos=None, endpos=None):
+        joues.append(self.chaine)
+        return applique(self, source, pos=pos, endpos=endpos)
+
+    monkeypatch.setattr(Decomposeur, "_applique", _espion)
+    Piste(basename="autre.flac").decompose(decomposeurs=jeu)
+    assert joues == [r"^(.+)\.flac$"]
+
+
+def test_l_ordre_n_est_pas_touche_hors_premier_non_nul():
+    ordre = OrdreAdaptatif(periode=1)
+    jeu = MusiqueDecomposeurs(ordre=ordre)
+    Piste(basename="a.flac").decompose(
+        decomposeurs=jeu, options_resultat=DECOMPOSE_RESULTAT_CUMULE
+    )
+    assert ordre.taux(jeu.decomposeurs[2]) == 0.0
+
+
+def test_l_ordre_appris_se_sauve_et_se_recharge(tmp_path):
+    ordre = OrdreAdaptatif(periode=1)
+    jeu = MusiqueDecomposeurs(ordre=ordre)
+    for i in range(3):
+        Piste(basename="CD1 piste {}.mp3".format(i)).decompose(decomposeurs=jeu)
+    chemin = tmp_path / "ordre.json"
+    ordre.sauve(chemin)
+
+    fige = OrdreAdaptatif.charge(chemin, apprend=False)
+    jeu = MusiqueDecomposeurs(ordre=fige)
+    assert _rangs(fige, jeu) == [1, 0, 2]
+    Piste(basename="a.flac").decompose(decomposeurs=jeu)
+    assert fige.taux(jeu.decomposeurs[2]) == 0.0
+
+
+def test_periode_invalide():
+    with pytest.raises(ValueError):
+        OrdreAdaptatif(periode=0)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Tests du préfiltre littéral des patrons."""
+
+import re
+
+import pytest
+from automatheque.decomposition import Decomposeur
+from automatheque.decomposition.prefiltre import prefiltre_de
+
+
+def _rien(obj, resultats):
+    pass
+
+
+@pytest.mark.parametrize(
+    "chaine, drapeaux, litteral, insensible",
+    [
+        (r"(.+)\.mkv$", 0, ".mkv", False),
+        (r"(.+)[. ]S(\d{2})E(\d{2})", 0, "S", False),
+        (r"CD ?(\d)", re.I, "cd", True),
+        (r"(?i:cd)-(\d) Face", 0, " Face", False),
+        (r"(?i:disque)-(\d) Face", 0, "disque", True),
+        (r"(?:\.part)+(\d+)", 0, ".part", False),
+        (r"(?:ab){2}x", 0, "ab", False),
+        (rb"\.avi$", 0, b".avi", False),
+    ],
+)
+def test_litteral_obligatoire_extrait(chaine, drapeaux, litteral, insensible):
+    prefiltre = prefiltre_de(re.compile(chaine, drapeaux))
+    assert (prefiltre.litteral, prefiltre.insensible) == (litteral, insensible)
+
+
+@pytest.mark.parametrize(
+    "chaine",
+    [r"(\d+)x(\d+)|(\d+)e(\d+)", r"(.+?)(?:\.mkv)?$", r"(?:ab)*(\d)", r"(?=abc)(.)"],
+)
+def test_sans_litteral_obligatoire_pas_de_prefiltre(chaine):
+    assert prefiltre_de(re.compile(chaine)) is None
+
+
+@pytest.mark.parametrize(
+    "chaine, drapeaux",
+    [
+        (r"(.+)[. ]S(\d{2})E(\d{2})", re.I),
+        (r"(.+)\.mkv$", 0),
+        (r"(?i)cd ?(\d)", 0),
+        (r"(\w+)sk", re.I),
+    ],
+)
+@pytest.mark.parametrize(
+    "source",
+    [
+        "Ma.Serie.S01E02.mkv",
+        "ma.serie.s01e02.MKV",
+        "album CD2",
+        "rien du tout",
+        "maſk",  # « ſ » équivaut à « s » sous re.IGNORECASE
+        "taK",  # le signe kelvin équivaut à « k »
+        "",
+    ],
+)
+def test_le_prefiltre_ne_change_aucun_resultat(chaine, drapeaux, source):
+    decomposeur = Decomposeur(chaine, _rien, drapeaux=drapeaux)
+    assert decomposeur._applique(source) == decomposeur.compile.findall(source)
+    for pos, endpos in ((3, None), (None, 8), (2, 12)):
+        kwargs = {k: v for k, v in (("pos", pos), ("endpos", endpos)) if v is not None}
+        assert decomposeur._applique(
+            source, pos=pos, endpos=endpos
+        ) == decomposeur.compile.findall(source, **kwargs)
+
+
+def test_le_prefiltre_compte_ses_rejets(monkeypatch):
+    decomposeur = Decomposeur(r"(.+)\.mkv$", _rien)
+    appels = []
+    monkeypatch.setattr(
+        decomposeur, "compile", _Espion(decomposeur.compile, appels), raising=True
+    )
+    for source in ("a.avi", "b.txt", "c.mkv", "d.jpg"):
+        decomposeur._applique(source)
+    assert appels == ["c.mkv"]
+    assert decomposeur.prefiltre.statistiques() == {
+        "litteral": ".mkv",
+        "essais": 4,
+        "rejets": 3,
+        "selectivite": 0.75,
+    }
+
+
+class _Espion(object):
+    def __init__(self, patron, appels):
+        self._patron = patron
+        self._appels = appels
+
+    def findall(self, source, **kwargs):
+        self._appels.append(source)
+        return self._patron.findall(source, **kwargs)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Tests du profil des décomposeurs."""
+
+import json
+import logging
+
+import attr
+from automatheque.decomposition import (
+    DECOMPOSE_RESULTAT_CUMULE,
+    DECOMPOSE_RESULTAT_MAX_INFOS,
+    Decomposable,
+    Decomposeur,
+    Decomposeurs,
+    Profil,
+    decompose_lot,
+)
+
+
+def _remplit_serie(obj, resultats):
+    obj.serie, obj.saison, obj.episode = resultats
+
+
+def _remplit_annee(obj, resultats):
+    obj.annee = resultats
+
+
+def _plante(obj, valeur):
+    raise RuntimeError("source indisponible")
+
+
+@attr.s
+class Jeu(Decomposeurs):
+    def __attrs_post_init__(self):
+        self.decomposeurs = [
+            Decomposeur(r"(.+)[. ]S(\d{2})E(\d{2})", _remplit_serie),
+            Decomposeur(r"\((\d{4})\)", _remplit_annee),
+            Decomposeur(r"(x)", _remplit_annee, appel_source=_plante),
+        ]
+
+
+@attr.s
+class Episode(Decomposable):
+    basename = attr.ib(default="")
+    serie = attr.ib(default=None)
+    saison = attr.ib(default=None)
+    episode = attr.ib(default=None)
+    annee = attr.ib(default=None)
+
+
+def test_profil_compte_appels_correspondances_et_erreurs():
+    profil = Profil()
+    eps = [Episode(basename=n) for n in ("A.S01E02 (2019).avi", "B.S01E03.avi")]
+    list(
+        decompose_lot(
+            eps,
+            decomposeurs=Jeu(),
+            options_resultat=DECOMPOSE_RESULTAT_CUMULE,
+            profil=profil,
+        )
+    )
+    serie, annee, plante = profil.rapport()
+    assert (serie["appels"], serie["correspondances"]) == (2, 2)
+    assert (annee["appels"], annee["correspondances"]) == (2, 1)
+    assert annee["taux_correspondance"] == 0.5
+    assert (plante["appels"], plante["erreurs"]) == (2, 2)
+    assert serie["temps_regex"] > 0 and serie["temps_appel_en_retour"] > 0
+    assert annee["selectivite_prefiltre"] == 0.5
+
+
+def test_profil_mesure_aussi_les_candidats_de_max_infos():
+    profil = Profil()
+    Episode(basename="A.S01E02.avi").decompose(
+        decomposeurs=Jeu(), options_resultat=DECOMPOSE_RESULTAT_MAX_INFOS, profil=profil
+    )
+    (serie, *_) = profil.rapport()
+    assert serie["temps_appel_en_retour"] > 0
+
+
+def test_profil_rapport_trie_et_json():
+    profil = Profil()
+    Episode(basename="A.S01E02 (2019).avi").decompose(
+        decomposeurs=Jeu(), options_resultat=DECOMPOSE_RESULTAT_CUMULE, profil=profil
+    )
+    lignes = profil.rapport(tri="erreurs")
+    assert lignes[0]["chaine"] == "(x)"
+    assert json.loads(profil.en_json()) == profil.rapport()
+    profil.vide()
+    assert len(profil) == 0
+
+
+def test_sans_debug_aucun_message_n_est_prepare(caplog):
+    """Les messages de DEBUG ne doivent pas formater l'objet si personne ne lit."""
+
+    @attr.s(repr=False)
+    class Espion(Episode):
+        def __repr__(self):
+            raise AssertionError("repr calculé pour rien")
+
+    caplog.set_level(logging.INFO, logger="automatheque.decomposition")
+    Espion(basename="A.S01E02.avi").decompose(decomposeurs=Jeu())
@@ -1,34 +1,58 @@
 # -*- coding: utf-8 -*-
 """Renommage et rangement de fichiers par gabarits."""
 
-from .condition import evalue_condition
+from .condition import Condition, compile_condition, evalue_condition
 from .exceptions import (
     AucunGabaritApplicable,
     CibleHorsRepertoire,
+    CollisionCible,
     ConditionInvalide,
     GabaritInapplicable,
     RenommageEchec,
     TransfertIncomplet,
 )
+from .lot import renomme_lot
+from .plan import (
+    LigneManifeste,
+    ecrit_manifeste,
+    execute_manifeste,
+    lit_manifeste,
+    planifie,
+    planifie_arbre,
+)
 from .renommeur import (
     SECTION_CONFIG_PAR_DEFAUT,
     Gabarit,
     Gabarits,
     Renommable,
     Renommeur,
+    construit_chemins,
 )
+from .surveillance import range_en_continu
 
 __all__ = [
     "SECTION_CONFIG_PAR_DEFAUT",
     "AucunGabaritApplicable",
     "CibleHorsRepertoire",
+    "CollisionCible",
+    "Condition",
     "ConditionInvalide",
     "Gabarit",
     "Gabarits",
     "GabaritInapplicable",
+    "LigneManifeste",
     "RenommageEchec",
     "Renommable",
     "Renommeur",
     "TransfertIncomplet",
+    "compile_condition",
+    "construit_chemins",
+    "ecrit_manifeste",
     "evalue_condition",
+    "execute_manifeste",
+    "lit_manifeste",
+    "planifie",
+    "planifie_arbre",
+    "range_en_continu",
+    "renomme_lot",
 ]
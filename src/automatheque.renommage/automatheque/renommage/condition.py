@@ -2,30 +2,43 @@
 """Évaluation des conditions de gabarit.
 
 Une condition est une expression booléenne écrite dans la configuration,
-formatée avec les champs de l'objet à renommer avant d'être évaluée :
+évaluée avec les champs de l'objet à renommer :
 
 ```ini
 r5 = ['{date.year}/{date:%%Y-%%m-%%d} @{ville} {pays}/{nom}',
       '"{date}" and "{ville}" and "{pays}" != "FR"', 3]
 ```
 
-Une fois formatée, la condition ci-dessus devient
-``'"2013-03-17" and "Osaka" and "JP" != "FR"'``.
+Le code d'origine formatait cette condition — elle devenait
+``'"2013-03-17" and "Osaka" and "JP" != "FR"'`` — puis passait la chaîne à
+`eval()`. Or les champs qui y sont injectés viennent des **métadonnées des
+fichiers traités** — un album, un nom de ville, une description. Un fichier
+soigneusement nommé suffisait donc à faire exécuter du code arbitraire par
+un simple rangement de photos.
 
-Le code d'origine passait cette chaîne à `eval()`. Or les champs qui y sont
-injectés viennent des **métadonnées des fichiers traités** — un album, un nom
-de ville, une description. Un fichier soigneusement nommé suffisait donc à
-faire exécuter du code arbitraire par un simple rangement de photos.
+La condition est ici analysée **une fois**, champs compris, avec une liste
+blanche de nœuds : des littéraux, `and` / `or` / `not`, et des comparaisons.
+Rien d'autre. L'arbre est ensuite traduit en fonctions imbriquées, évaluées
+directement sur les champs — ni `eval`, ni analyse par fichier. Les champs
+ne sont plus du texte recollé dans l'expression, mais des **valeurs** :
 
-L'évaluation est ici faite sur l'arbre syntaxique, avec une liste blanche de
-nœuds : des littéraux, `and` / `or` / `not`, et des comparaisons. Rien
-d'autre. La syntaxe des conditions existantes est inchangée ; au pire, une
-chaîne malveillante fait maintenant échouer la condition au lieu de sortir de
-son bac à sable.
+* un champ dans un littéral chaîne (`"{album}"`, `"{date:%Y}"`) vaut la
+  chaîne formatée, quoi qu'elle contienne — guillemets compris ;
+* un champ seul (`{annee} > 2010`) vaut la valeur du champ, avec son type ;
+  formaté (`{date:%Y}`) ou converti (`{nom!r}`), il vaut la chaîne obtenue.
+  Comparé à un nombre écrit dans la condition, un champ seul qui vaut une
+  chaîne numérique est lu comme un nombre : `{date:%Y} > 2010` reste vrai
+  en 2013, comme avec l'ancienne substitution textuelle.
+
+Une valeur ne peut donc plus changer la structure de la condition.
 """
 
 import ast
-from typing import Any
+import functools
+import operator
+import re
+import string
+from typing import Any, Callable
 
 from .exceptions import ConditionInvalide
 
@@ -53,6 +66,262 @@ _NOEUDS_AUTORISES = (
     ast.Load,
 )
 
+_COMPARAISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+# Marque d'un champ dans la condition analysée : un identifiant qu'aucune
+# condition écrite à la main ne contient.
+_MARQUE = "__champ_{}__"
+_RE_MARQUE = re.compile(r"(__champ_\d+__)")
+
+_FORMATEUR = string.Formatter()
+
+
+def _verifie(arbre, condition, permis=()):
+    """Refuse tout nœud hors de la liste blanche, et tout nom hors de `permis`."""
+    for noeud in ast.walk(arbre):
+        if isinstance(noeud, ast.Name) and noeud.id in permis:
+            continue
+        if not isinstance(noeud, _NOEUDS_AUTORISES):
+            raise ConditionInvalide(
+                condition,
+                "{} n'est pas autorisé dans une condition".format(type(noeud).__name__),
+            )
+
+
+def _analyse(condition, source):
+    try:
+        return ast.parse(source, mode="eval")
+    except SyntaxError as exc:
+        raise ConditionInvalide(condition, "expression mal formée") from exc
+
+
+def _champ(nom, conversion, spec):
+    """La fonction qui lit un champ seul : sa valeur, ou sa forme formatée."""
+
+    def _valeur(champs):
+        return _FORMATEUR.get_field(nom, (), champs)[0]
+
+    if not conversion and not spec:
+        if "." not in nom and "[" not in nom:
+            return operator.itemgetter(nom)
+        return _valeur
+
+    def _formate(champs):
+        valeur = _valeur(champs)
+        if conversion:
+            valeur = _FORMATEUR.convert_field(valeur, conversion)
+        return format(valeur, spec)
+
+    return _formate
+
+
+def _est_nombre(noeud):
+    """Vrai pour un littéral numérique, ou une séquence de littéraux numériques."""
+    if isinstance(noeud, (ast.Tuple, ast.List)):
+        return bool(noeud.elts) and all(_est_nombre(e) for e in noeud.elts)
+    return (
+        isinstance(noeud, ast.Constant)
+        and isinstance(noeud.value, (int, float))
+        and not isinstance(noeud.value, bool)
+    )
+
+
+def _face_a_un_nombre(ops, operandes, index):
+    """Vrai si l'opérande `index` d'une comparaison est comparé à un nombre :
+    `{annee} > 2010`, `1 < {annee} < 3000`, `{annee} in (2013, 2014)`."""
+    if index > 0 and not isinstance(ops[index - 1], (ast.In, ast.NotIn)):
+        if _est_nombre(operandes[index - 1]):
+            return True
+    if index < len(ops):
+        droite = operandes[index + 1]
+        if isinstance(ops[index], (ast.In, ast.NotIn)):
+            return isinstance(droite, (ast.Tuple, ast.List)) and _est_nombre(droite)
+        return _est_nombre(droite)
+    return False
+
+
+def _en_nombre(lire):
+    """Un champ comparé à un nombre : une chaîne numérique (`"2015"`, ou
+    `{date:%Y}`) est lue comme un nombre, comme l'ancienne substitution
+    textuelle la lisait. Une chaîne qui n'en est pas un lève `ValueError` —
+    la condition est alors fausse, comme avant."""
+
+    def _nombre(champs):
+        valeur = lire(champs)
+        if not isinstance(valeur, str):
+            return valeur
+        try:
+            return int(valeur)
+        except ValueError:
+            return float(valeur)
+
+    return _nombre
+
+
+def _traduit(noeud, lecteurs: dict, modeles: dict) -> Callable[[dict], Any]:
+    """Traduit un nœud (déjà vérifié) en fonction des champs.
+
+    :param lecteurs: marque -> fonction qui lit le champ, quand il est seul
+    :param modeles: marque -> modèle `str.format` du champ, quand il est dans
+                    un littéral
+    """
+
+    def _sous(noeud):
+        return _traduit(noeud, lecteurs, modeles)
+
+    if isinstance(noeud, ast.Expression):
+        return _sous(noeud.body)
+
+    if isinstance(noeud, ast.Name):
+        return lecteurs[noeud.id]
+
+    if isinstance(noeud, ast.Constant):
+        valeur = noeud.value
+        if isinstance(valeur, str) and _RE_MARQUE.search(valeur):
+            modele = "".join(
+                modeles[partie]
+                if partie in modeles
+                else partie.replace("{", "{{").replace("}", "}}")
+                for partie in _RE_MARQUE.split(valeur)
+            )
+            return lambda c: modele.format_map(c)
+        return lambda c: valeur
+
+    if isinstance(noeud, ast.BoolOp):
+        operandes = [_sous(v) for v in noeud.values]
+        if isinstance(noeud.op, ast.And):
+
+            def _et(c):
+                for operande in operandes:
+                    valeur = operande(c)
+                    if not valeur:
+                        return valeur
+                return valeur
+
+            return _et
+
+        def _ou(c):
+            for operande in operandes:
+                valeur = operande(c)
+                if valeur:
+                    return valeur
+            return valeur
+
+        return _ou
+
+    if isinstance(noeud, ast.UnaryOp):
+        operande = _sous(noeud.operand)
+        return lambda c: not operande(c)
+
+    if isinstance(noeud, ast.Compare):
+        operandes = [noeud.left] + noeud.comparators
+        lecteurs_compares = [_sous(o) for o in operandes]
+        for index, operande in enumerate(operandes):
+            if isinstance(operande, ast.Name) and _face_a_un_nombre(
+                noeud.ops, operandes, index
+            ):
+                lecteurs_compares[index] = _en_nombre(lecteurs_compares[index])
+        gauche = lecteurs_compares[0]
+        suite = [
+            (_COMPARAISONS[type(op)], droite)
+            for op, droite in zip(noeud.ops, lecteurs_compares[1:])
+        ]
+
+        def _compare(c):
+            # Comparaisons chaînées, comme en Python : `a < b < c`.
+            valeur = gauche(c)
+            for comparaison, droite in suite:
+                suivante = droite(c)
+                if not comparaison(valeur, suivante):
+                    return False
+                valeur = suivante
+            return True
+
+        return _compare
+
+    if isinstance(noeud, (ast.Tuple, ast.List)):
+        elements = [_sous(e) for e in noeud.elts]
+        sequence = tuple if isinstance(noeud, ast.Tuple) else list
+        return lambda c: sequence(e(c) for e in elements)
+
+    # Inatteignable : l'arbre est vérifié contre la liste blanche.
+    raise ConditionInvalide(ast.dump(noeud), "nœud non traduit")  # pragma: no cover
+
+
+class Condition:
+    """Une condition de gabarit, analysée une fois pour toutes.
+
+    L'arbre de la condition est vérifié contre la liste blanche puis traduit
+    en fonctions : `evalue(champs)` ne fait plus que les appeler. Ce que la
+    condition peut faire ne dépend pas des champs.
+
+    :raise ConditionInvalide: si la condition est mal formée, ou hors de la
+                              liste blanche
+    """
+
+    def __init__(self, condition: str):
+        self.texte = condition
+        try:
+            morceaux = list(_FORMATEUR.parse(condition))
+        except ValueError as exc:
+            raise ConditionInvalide(condition, str(exc)) from exc
+
+        lecteurs = {}
+        modeles = {}
+        source = []
+        for index, (litteral, nom, spec, conversion) in enumerate(morceaux):
+            source.append(litteral)
+            if nom is None:
+                continue
+            if not nom or nom.isdigit():
+                raise ConditionInvalide(
+                    condition, "champ positionnel {{{}}} : nommez-le".format(nom)
+                )
+            marque = _MARQUE.format(index)
+            lecteurs[marque] = _champ(nom, conversion, spec)
+            modeles[marque] = "{{{}{}{}}}".format(
+                nom,
+                "!" + conversion if conversion else "",
+                ":" + spec if spec else "",
+            )
+            source.append(marque)
+        arbre = _analyse(condition, "".join(source))
+        _verifie(arbre, condition, permis=lecteurs)
+        for noeud in ast.walk(arbre):
+            if isinstance(noeud, ast.Constant) and isinstance(noeud.value, bytes):
+                if _RE_MARQUE.search(noeud.value.decode("latin-1")):
+                    raise ConditionInvalide(
+                        condition, "pas de champ dans un littéral bytes"
+                    )
+        self._evalue = _traduit(arbre, lecteurs, modeles)
+
+    def __repr__(self):
+        return "Condition({!r})".format(self.texte)
+
+    def evalue(self, champs: dict) -> Any:
+        """Évalue la condition avec les champs donnés.
+
+        :raise KeyError, IndexError, AttributeError, ValueError, TypeError: si
+            un champ manque, ne se formate pas, ou ne se compare pas
+        """
+        return self._evalue(champs)
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_formatee(condition: str):
+    arbre = _analyse(condition, condition)
+    _verifie(arbre, condition)
+    return _traduit(arbre, {}, {})
+
 
 def evalue_condition(condition: str) -> Any:
     """Évalue une condition déjà formatée, sans jamais exécuter de code.
@@ -62,18 +331,11 @@ def evalue_condition(condition: str) -> Any:
                               contient autre chose que des littéraux, des
                               opérateurs booléens et des comparaisons
     """
-    try:
-        arbre = ast.parse(condition, mode="eval")
-    except SyntaxError as exc:
-        raise ConditionInvalide(condition, "expression mal formée") from exc
+    return _compile_formatee(condition)({})
 
-    for noeud in ast.walk(arbre):
-        if not isinstance(noeud, _NOEUDS_AUTORISES):
-            raise ConditionInvalide(
-                condition,
-                "{} n'est pas autorisé dans une condition".format(type(noeud).__name__),
-            )
 
-    # À ce stade l'arbre ne contient que des littéraux et des opérateurs :
-    # `eval` n'a plus rien à se mettre sous la dent.
-    return eval(compile(arbre, "<condition>", "eval"), {"__builtins__": {}}, {})
+@functools.lru_cache(maxsize=1024)
+def compile_condition(condition: str) -> Condition:
+    """La :class:`Condition` compilée d'un texte de condition ; mémorisée, les
+    gabarits d'une configuration étant partagés par tous les fichiers."""
+    return Condition(condition)
@@ -88,3 +88,17 @@ class TransfertIncomplet(RenommageEchec):
         super().__init__(
             "Les deux fichiers sont différents {} -> {}".format(source, cible)
         )
+
+
+class CollisionCible(RenommageEchec):
+    """Dans un lot, la cible d'un fichier est déjà prise.
+
+    Deux fichiers qui visent la même cible, une cible qui reste occupée par
+    un fichier du lot dont le déplacement a échoué, ou — sans `force` — par un
+    fichier hors du lot : aucun n'est déplacé plutôt que d'en écraser un.
+    """
+
+    def __init__(self, cible, raison=""):
+        """Initialisation."""
+        self.cible = cible
+        super().__init__("Collision sur la cible '{}'. {}".format(cible, raison))
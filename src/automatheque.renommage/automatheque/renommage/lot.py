@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""Renommage par lots.
+
+`Renommable.renomme` range un fichier à la fois : il calcule sa cible, crée
+son répertoire, vérifie qu'elle est libre, puis déplace. Sur un lot, chaque
+fichier ignore les autres — deux photos qui visent le même nom, et la seconde
+est écartée (ou écrase la première avec `force`) selon l'ordre d'arrivée.
+
+:func:`renomme_lot` **planifie** d'abord tout le lot :
+
+* toutes les cibles sont calculées avant le moindre déplacement ;
+* deux fichiers qui visent la même cible sont refusés tous les deux
+  (:class:`~automatheque.renommage.exceptions.CollisionCible`) ;
+* sans `force`, une cible déjà prise par un fichier hors du lot est refusée
+  de même, au lieu d'un succès qui n'aurait rien déplacé ;
+* un fichier dont la cible est la source d'un autre attend que celui-ci l'ait
+  libérée ; un cycle (`a → b`, `b → a`) est rompu par un nom temporaire ;
+* les répertoires cibles sont créés une fois chacun, d'avance ;
+
+puis **exécute** les déplacements sur un pool borné de fils, et rend un
+:class:`~automatheque.util.parallele.Resultat` par fichier, dans l'ordre du lot.
+
+Exemple ::
+
+    from automatheque.renommage import renomme_lot
+
+    for resultat in renomme_lot(photos, "/photos", workers=8):
+        if not resultat.reussi:
+            LOGGER.warning("%s : %s", resultat.element.source, resultat.erreur)
+"""
+
+import logging
+import os
+import uuid
+from collections import defaultdict
+from typing import List, Optional
+
+import attr
+
+from automatheque.exceptions import AutomathequeBaseException
+from automatheque.util.parallele import Resultat, parallelise
+
+from .exceptions import CollisionCible
+from .renommeur import Renommeur, _cible_contenue, _renommeurs
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _cle(chemin):
+    """Clé de comparaison de deux chemins."""
+    return os.path.normcase(os.path.abspath(chemin))
+
+
+@attr.s(slots=True, eq=False)
+class _Deplacement:
+    """Un fichier du lot, sa cible, et ce qu'il attend pour partir."""
+
+    index: int = attr.ib()
+    renommeur: Renommeur = attr.ib()
+    cible: str = attr.ib()
+    # Le déplacement qui doit libérer la cible avant celui-ci.
+    attend: Optional["_Deplacement"] = attr.ib(default=None)
+    # Source d'origine, quand le fichier a été mis de côté pour rompre un cycle.
+    origine: Optional[str] = attr.ib(default=None)
+    # La source au moment du plan : ce que ce déplacement libère.
+    depart: str = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        self.depart = self.renommeur.obj.source or ""
+
+    @property
+    def source(self):
+        return self.renommeur.obj.source
+
+
+def renomme_lot(
+    objets,
+    rep_cible,
+    gabarits=None,
+    force=False,
+    copier=False,
+    *,
+    workers: Optional[int] = None,
+) -> List[Resultat]:
+    """Range tout un lot d'objets `Renommable` dans `rep_cible`.
+
+    Un fichier qui ne peut être rangé — aucun gabarit, collision, échec du
+    transfert… — donne un résultat en échec sans arrêter les autres.
+
+    :param objets: les objets `Renommable` (l'itérable est consommé d'abord)
+    :param gabarits: passés à chaque :class:`Renommeur` ; à défaut, ceux de
+                     chaque objet
+    :param force: écrase un fichier cible existant **hors du lot** ; sans
+                  lui, un tel fichier donne un échec (`CollisionCible`). Une
+                  cible prise par un fichier du lot n'est jamais écrasée
+    :param copier: conserve les originaux — une cible qui est la source d'un
+                   autre fichier du lot est alors une collision
+    :param workers: nombre maximal de transferts simultanés
+    :returns: un :class:`Resultat` par objet, dans l'ordre : `element` est
+              l'objet, `valeur` son chemin cible
+    """
+    objets = list(objets)
+    rapport: List[Optional[Resultat]] = [None] * len(objets)
+
+    # 1. Toutes les cibles, avant le moindre déplacement.
+    racine = os.path.abspath(rep_cible)
+    deplacements = []
+    for index, renommeur in enumerate(_renommeurs(objets, gabarits)):
+        obj = renommeur.obj
+        try:
+            nom = renommeur._construire_nouveau_nom()
+            cible = _cible_contenue(rep_cible, nom, racine)
+        except AutomathequeBaseException as exc:
+            rapport[index] = Resultat(obj, erreur=exc)
+            # Sa source reste occupée : on la connaît pour la protéger.
+            deplacements.append(_Deplacement(index, renommeur, ""))
+            continue
+        deplacements.append(_Deplacement(index, renommeur, cible))
+
+    return _execute(objets, deplacements, rapport, force, copier, workers)
+
+
+def _execute(elements, deplacements, rapport, force, copier, workers):
+    """Exécute des déplacements aux cibles déjà calculées.
+
+    :param elements: ce que rapporte chaque `Resultat`, dans l'ordre du lot
+    :param deplacements: un `_Deplacement` par élément ; une cible vide pour
+                         ceux déjà en échec, dont la source reste protégée
+    :param rapport: le `Resultat` de chaque élément, None s'il reste à faire
+    """
+
+    def _echec(deplacement, erreur):
+        rapport[deplacement.index] = Resultat(
+            elements[deplacement.index], erreur=erreur
+        )
+
+    # 2. Deux fichiers pour une même cible : aucun n'y va.
+    par_cible = defaultdict(list)
+    for deplacement in deplacements:
+        if deplacement.cible:
+            par_cible[_cle(deplacement.cible)].append(deplacement)
+    for groupe in par_cible.values():
+        if len(groupe) > 1:
+            for deplacement in groupe:
+                _echec(
+                    deplacement,
+                    CollisionCible(
+                        deplacement.cible,
+                        "Visée aussi par {} autre(s) fichier(s) du lot.".format(
+                            len(groupe) - 1
+                        ),
+                    ),
+                )
+
+    # 3. Une cible qui est la source d'un autre fichier du lot : on attend
+    # qu'il l'ait libérée.
+    par_source = {_cle(d.depart): d for d in deplacements if d.depart}
+    a_faire = []
+    for deplacement in deplacements:
+        if rapport[deplacement.index] is not None:
+            continue
+        if deplacement.depart and _cle(deplacement.depart) == _cle(deplacement.cible):
+            # Déjà à sa place.
+            rapport[deplacement.index] = Resultat(
+                elements[deplacement.index], valeur=deplacement.cible
+            )
+            continue
+        occupant = par_source.get(_cle(deplacement.cible))
+        if occupant is not None:
+            if copier or rapport[occupant.index] is not None:
+                raison = (
+                    "Conservée (copier=True)"
+                    if copier
+                    else "Son fichier ne peut être rangé"
+                )
+                _echec(
+                    deplacement,
+                    CollisionCible(
+                        deplacement.cible,
+                        "{} : c'est la source d'un autre fichier du lot.".format(
+                            raison
+                        ),
+                    ),
+                )
+                continue
+            deplacement.attend = occupant
+        a_faire.append(deplacement)
+
+    # 4. Les répertoires cibles, une fois chacun.
+    for repertoire in sorted({os.path.dirname(d.cible) for d in a_faire}):
+        try:
+            os.makedirs(repertoire, exist_ok=True)
+        except OSError as exc:
+            LOGGER.warning("Impossible de créer %s : %s", repertoire, exc)
+            for deplacement in a_faire:
+                if os.path.dirname(deplacement.cible) == repertoire:
+                    _echec(deplacement, exc)
+    _rompt_cycles(a_faire, rapport, _echec)
+
+    # 5. Les déplacements, par vagues : celle d'après n'attend que des cibles
+    # libérées par la précédente.
+    def _deplace(deplacement):
+        # Les cibles prises par le lot sont libérées à ce stade : ce qui
+        # occupe encore la cible est hors du lot. `_renomme` le laisserait en
+        # place et rendrait la cible comme si le fichier y était arrivé.
+        if not force and os.path.lexists(deplacement.cible):
+            raise CollisionCible(
+                deplacement.cible, "Un fichier hors du lot l'occupe (force=False)."
+            )
+        # La cible est déjà vérifiée (contenue dans le répertoire cible) : on
+        # la repasse en `répertoire, nom`.
+        repertoire, nom = os.path.split(deplacement.cible)
+        return deplacement.renommeur._renomme(
+            repertoire, nom, force=force, copier=copier, repertoire_pret=True
+        )
+
+    restants = [d for d in a_faire if rapport[d.index] is None]
+    while restants:
+        vague = [d for d in restants if d.attend is None]
+        for resultat in parallelise(_deplace, vague, workers=workers):
+            deplacement = resultat.element
+            rapport[deplacement.index] = Resultat(
+                elements[deplacement.index],
+                valeur=resultat.valeur,
+                erreur=resultat.erreur,
+            )
+        for deplacement in vague:
+            _restaure(deplacement, rapport[deplacement.index])
+        restants = [d for d in restants if rapport[d.index] is None]
+        for deplacement in restants:
+            occupant = deplacement.attend
+            if occupant is None or rapport[occupant.index] is None:
+                continue
+            if os.path.lexists(occupant.depart):
+                _echec(
+                    deplacement,
+                    CollisionCible(
+                        deplacement.cible,
+                        "Toujours occupée : le fichier du lot qui s'y trouve n'a "
+                        "pas été déplacé.",
+                    ),
+                )
+                _restaure(deplacement, rapport[deplacement.index])
+            else:
+                deplacement.attend = None
+        restants = [d for d in restants if rapport[d.index] is None]
+
+    LOGGER.debug(
+        "Lot de %d fichier(s) : %d échec(s)",
+        len(elements),
+        sum(1 for r in rapport if not r.reussi),
+    )
+    return rapport
+
+
+def _rompt_cycles(a_faire, rapport, echec):
+    """Rompt chaque cycle d'attentes en mettant un de ses fichiers de côté.
+
+    Chaque fichier attend au plus un autre, et n'est attendu que par un seul
+    (les cibles sont uniques) : les attentes forment des chaînes, ou des
+    cycles. Dans un cycle, le premier fichier est renommé sous un nom
+    temporaire, à côté de sa source : sa source est libre, le cycle devient
+    une chaîne. Un cycle dont un fichier est déjà en échec ne bouge pas : ses
+    autres fichiers échoueront faute de cible libérée.
+    """
+    etats = {}
+    for depart in a_faire:
+        chemin = []
+        courant = depart
+        while courant is not None and courant not in etats:
+            etats[courant] = depart
+            chemin.append(courant)
+            courant = courant.attend
+        if courant is None or etats[courant] is not depart:
+            continue
+        cycle = chemin[chemin.index(courant) :]
+        if any(rapport[d.index] is not None for d in cycle):
+            continue
+        tete = cycle[0]
+        temporaire = os.path.join(
+            os.path.dirname(tete.source),
+            ".{}.{}.renommage".format(os.path.basename(tete.source), uuid.uuid4().hex),
+        )
+        try:
+            os.replace(tete.source, temporaire)
+        except OSError as exc:
+            for deplacement in cycle:
+                echec(deplacement, exc)
+            continue
+        LOGGER.debug("Cycle rompu : %s mis de côté en %s", tete.source, temporaire)
+        tete.origine = tete.source
+        tete.renommeur.obj.source = temporaire
+        # Celui qui attendait la source de `tete` peut partir.
+        for deplacement in cycle:
+            if deplacement.attend is tete:
+                deplacement.attend = None
+
+
+def _restaure(deplacement, resultat):
+    """Rend son nom à un fichier mis de côté, s'il n'a pas pu être rangé."""
+    if deplacement.origine is None or resultat.reussi:
+        return
+    if os.path.lexists(deplacement.origine):
+        LOGGER.error(
+            "%s reste sous le nom temporaire %s : son nom d'origine est pris",
+            deplacement.origine,
+            deplacement.source,
+        )
+        return
+    os.replace(deplacement.source, deplacement.origine)
+    deplacement.renommeur.obj.source = deplacement.origine
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""Plan de rangement : calculer d'abord, relire, appliquer ensuite.
+
+`Renommeur.renomme(debug=True)` calcule la cible d'un fichier sans le
+déplacer, mais n'en laisse qu'un avertissement dans le journal. Avant de
+réorganiser des centaines de milliers de fichiers, on veut **voir** ce qui va
+se passer, et l'appliquer ensuite sans tout recalculer :
+
+* :func:`planifie` (ou :func:`planifie_arbre`, sur toute une arborescence)
+  choisit le gabarit de chaque fichier au fil de l'eau et produit une
+  :class:`LigneManifeste` par fichier : source, cible, gabarit retenu,
+  résultat de chaque condition, collision éventuelle ;
+* :func:`ecrit_manifeste` l'écrit en JSON Lines ou en CSV — un fichier qu'on
+  relit, filtre ou corrige à la main ;
+* :func:`execute_manifeste` l'applique, comme :func:`~.lot.renomme_lot` :
+  collisions refusées, cycles rompus, transferts en parallèle. Un manifeste
+  se corrige à la main : chaque cible est donc revérifiée, elle doit rester
+  dans le répertoire cible.
+
+Exemple ::
+
+    from automatheque.renommage import (
+        ecrit_manifeste, execute_manifeste, planifie_arbre,
+    )
+
+    ecrit_manifeste(planifie_arbre("/depot", "/photos", photo), "plan.jsonl")
+    # … relecture de plan.jsonl …
+    for resultat in execute_manifeste("plan.jsonl", "/photos", workers=8):
+        if not resultat.reussi:
+            LOGGER.warning("%s : %s", resultat.element.source, resultat.erreur)
+"""
+
+import csv
+import json
+import logging
+import os
+from typing import Iterable, Iterator, List, Optional, Union
+
+import attr
+
+from automatheque.exceptions import AutomathequeBaseException
+from automatheque.util.parallele import Resultat
+from automatheque.util.repertoire import parcourt_fichiers
+
+from .exceptions import AucunGabaritApplicable, RenommageEchec
+from .lot import _cle, _Deplacement, _execute
+from .renommeur import (
+    Gabarits,
+    Renommable,
+    Renommeur,
+    _cible_contenue,
+    _renommeurs,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "csv")
+
+# Valeurs de `LigneManifeste.collision`.
+DOUBLON = "doublon"
+EXISTANTE = "existante"
+
+
+@attr.s(slots=True)
+class LigneManifeste:
+    """Le sort prévu pour un fichier.
+
+    :ivar source: chemin du fichier
+    :ivar cible: chemin cible absolu ; vide si le fichier ne peut être rangé
+    :ivar gabarit: squelette du gabarit retenu
+    :ivar conditions: condition de chaque gabarit à condition -> vérifiée ou non
+    :ivar collision: ``"doublon"`` si un fichier **précédent** du plan vise
+                     déjà la même cible, ``"existante"`` si la cible existe
+                     déjà sur le disque ; vide sinon
+    :ivar erreur: la raison pour laquelle le fichier ne peut être rangé
+    """
+
+    source: str = attr.ib()
+    cible: str = attr.ib(default="")
+    gabarit: str = attr.ib(default="")
+    conditions: dict = attr.ib(factory=dict)
+    collision: str = attr.ib(default="")
+    erreur: str = attr.ib(default="")
+
+    @classmethod
+    def depuis_dict(cls, donnees: dict) -> "LigneManifeste":
+        """Relit une ligne écrite par :func:`ecrit_manifeste`."""
+        conditions = donnees.get("conditions") or {}
+        if isinstance(conditions, str):
+            # En CSV, les conditions sont un objet JSON dans une colonne.
+            conditions = json.loads(conditions)
+        return cls(
+            source=donnees["source"],
+            cible=donnees.get("cible") or "",
+            gabarit=donnees.get("gabarit") or "",
+            conditions=conditions,
+            collision=donnees.get("collision") or "",
+            erreur=donnees.get("erreur") or "",
+        )
+
+
+_COLONNES = [a.name for a in attr.fields(LigneManifeste)]
+
+
+def planifie(objets, rep_cible, gabarits=None) -> Iterator[LigneManifeste]:
+    """Planifie le rangement de chaque objet dans `rep_cible`, sans rien
+    déplacer.
+
+    Toutes les conditions sont évaluées — pas seulement jusqu'au gabarit
+    retenu — pour que le manifeste dise pourquoi un gabarit a été écarté. Les
+    lignes sont produites au fil de l'eau : seul l'ensemble des cibles déjà
+    vues est gardé en mémoire, pour signaler les doublons.
+
+    Un doublon n'est signalé que sur les fichiers **suivants** : le premier
+    qui vise une cible ne sait pas encore qu'un autre la visera.
+    :func:`execute_manifeste` refuse quoi qu'il en soit tous les fichiers d'un
+    même doublon.
+
+    :param objets: les objets `Renommable` ; consommés au fil de l'eau
+    :param gabarits: à défaut, ceux de chaque classe d'objet
+    """
+    racine = os.path.abspath(rep_cible)
+    vues = set()
+    for renommeur in _renommeurs(objets, gabarits):
+        ligne = _planifie_un(renommeur, rep_cible, racine)
+        if ligne.cible:
+            cle = os.path.normcase(ligne.cible)
+            if cle in vues:
+                ligne.collision = DOUBLON
+            else:
+                vues.add(cle)
+                if os.path.lexists(ligne.cible) and cle != _cle(ligne.source):
+                    ligne.collision = EXISTANTE
+        yield ligne
+
+
+def _planifie_un(renommeur, rep_cible, racine):
+    """La ligne d'un objet : le gabarit que `choisit_gabarit` retiendrait, et
+    toutes les conditions évaluées."""
+    obj = renommeur.obj
+    ligne = LigneManifeste(source=obj.source or "")
+    try:
+        champs = renommeur.champs()
+        avec_condition, sans_condition = renommeur.gabarits._compile()
+        choisi = None
+        for gabarit, condition in avec_condition:
+            verifiee = condition is not None and Gabarits.teste_condition(
+                obj, condition, champs=champs
+            )
+            ligne.conditions[gabarit.condition] = verifiee
+            if verifiee and choisi is None:
+                choisi = gabarit
+        if choisi is None:
+            if not sans_condition:
+                raise AucunGabaritApplicable()
+            choisi = sans_condition[0]
+        ligne.gabarit = choisi.squelette
+        ligne.cible = _cible_contenue(rep_cible, renommeur._applique(choisi), racine)
+    except RenommageEchec as exc:
+        ligne.erreur = str(exc)
+    return ligne
+
+
+def planifie_arbre(
+    rep_entree, rep_cible, fabrique, gabarits=None, **options
+) -> Iterator[LigneManifeste]:
+    """Planifie le rangement de tous les fichiers de `rep_entree`.
+
+    L'arborescence est parcourue au fil de l'eau
+    (:func:`~automatheque.util.repertoire.parcourt_fichiers`) : le premier
+    fichier est planifié avant la fin du parcours. Un fichier que la
+    `fabrique` ne sait pas lire donne une ligne en erreur.
+
+    :param fabrique: appelée en `fabrique(chemin)`, renvoie l'objet
+                     `Renommable` (cf. :func:`~.surveillance.range_en_continu`)
+    :param options: passées à `parcourt_fichiers` (`inclus`, `exclus`,
+                    `profondeur_max`, `threads`)
+    """
+    echecs = []
+
+    def _objets():
+        for chemin in parcourt_fichiers(rep_entree, chaines=True, **options):
+            try:
+                yield fabrique(chemin)
+            except (AutomathequeBaseException, OSError) as exc:
+                LOGGER.debug("%s non planifié : %s", chemin, exc)
+                echecs.append(LigneManifeste(source=chemin, erreur=str(exc)))
+
+    for ligne in planifie(_objets(), rep_cible, gabarits):
+        # Un échec de la fabrique précède, dans le parcours, l'objet suivant.
+        yield from echecs
+        echecs.clear()
+        yield ligne
+    yield from echecs
+
+
+def _format(chemin, format):
+    if format is None:
+        format = "csv" if os.fspath(chemin).lower().endswith(".csv") else "jsonl"
+    if format not in FORMATS:
+        raise ValueError("format doit être l'un de {}".format(", ".join(FORMATS)))
+    return format
+
+
+def ecrit_manifeste(
+    lignes: Iterable[LigneManifeste], chemin, format: Optional[str] = None
+) -> int:
+    """Écrit les lignes d'un plan dans `chemin`, au fil de l'eau.
+
+    :param format: ``"jsonl"`` ou ``"csv"`` ; à défaut, ``"csv"`` pour un
+                   fichier en `.csv`, ``"jsonl"`` sinon
+    :raise ValueError: format inconnu
+    :returns: le nombre de lignes écrites
+    """
+    format = _format(chemin, format)
+    nombre = 0
+    with open(chemin, "w", encoding="utf-8", newline="") as fichier:
+        if format == "csv":
+            ecrivain = csv.DictWriter(fichier, fieldnames=_COLONNES)
+            ecrivain.writeheader()
+        for ligne in lignes:
+            donnees = attr.asdict(ligne)
+            if format == "csv":
+                donnees["conditions"] = json.dumps(
+                    donnees["conditions"], ensure_ascii=False
+                )
+                ecrivain.writerow(donnees)
+            else:
+                fichier.write(json.dumps(donnees, ensure_ascii=False) + "\n")
+            nombre += 1
+    LOGGER.debug("Manifeste de %d ligne(s) écrit dans %s", nombre, chemin)
+    return nombre
+
+
+def lit_manifeste(chemin, format: Optional[str] = None) -> Iterator[LigneManifeste]:
+    """Relit un manifeste écrit par :func:`ecrit_manifeste`, au fil de l'eau.
+
+    :param format: cf. :func:`ecrit_manifeste`
+    :raise ValueError: format inconnu, ou ligne illisible
+    """
+    format = _format(chemin, format)
+    with open(chemin, encoding="utf-8", newline="") as fichier:
+        if format == "csv":
+            for donnees in csv.DictReader(fichier):
+                yield LigneManifeste.depuis_dict(donnees)
+            return
+        for numero, texte in enumerate(fichier, 1):
+            if not texte.strip():
+                continue
+            try:
+                yield LigneManifeste.depuis_dict(json.loads(texte))
+            except (ValueError, KeyError, TypeError) as exc:
+                raise ValueError(
+                    "{}:{} : ligne de manifeste illisible".format(chemin, numero)
+                ) from exc
+
+
+@attr.s
+class _Fichier(Renommable):
+    """Un fichier du manifeste : sa cible est déjà calculée."""
+
+    source: str = attr.ib()
+
+    def _liste_champs_dispo(self) -> dict:
+        return {}
+
+
+def execute_manifeste(
+    manifeste: Union[str, "os.PathLike", Iterable[LigneManifeste]],
+    rep_cible,
+    force=False,
+    copier=False,
+    *,
+    workers: Optional[int] = None,
+) -> List[Resultat]:
+    """Applique un plan : chaque fichier va à la cible du manifeste, sans
+    que rien ne soit recalculé.
+
+    Les garanties sont celles de :func:`~.lot.renomme_lot` : deux lignes qui
+    visent la même cible sont refusées toutes les deux, une cible qui est la
+    source d'une autre ligne attend qu'elle soit libérée, un cycle est rompu
+    par un nom temporaire. Une ligne en erreur dans le plan donne un résultat
+    en échec (`RenommageEchec`) ; son fichier reste en place.
+
+    Le manifeste a pu être modifié depuis :func:`planifie` : une ligne dont la
+    cible sort de `rep_cible` est refusée (`CibleHorsRepertoire`), comme
+    :func:`~.lot.renomme_lot` refuse un nom construit qui s'en échappe.
+
+    :param manifeste: chemin d'un manifeste, ou les lignes elles-mêmes
+    :param rep_cible: le répertoire dans lequel toutes les cibles doivent
+                      rester — celui donné à :func:`planifie`
+    :param force: écrase un fichier cible existant **hors du manifeste** ;
+                  sans lui, un tel fichier donne un échec (`CollisionCible`)
+    :param copier: conserve les originaux
+    :param workers: nombre maximal de transferts simultanés
+    :returns: un :class:`Resultat` par ligne, dans l'ordre : `element` est la
+              ligne, `valeur` le chemin cible
+    """
+    if isinstance(manifeste, (str, os.PathLike)):
+        manifeste = lit_manifeste(manifeste)
+    lignes = list(manifeste)
+    rapport: List[Optional[Resultat]] = [None] * len(lignes)
+    racine = os.path.abspath(rep_cible)
+    sans_gabarits = Gabarits()
+    deplacements = []
+    for index, ligne in enumerate(lignes):
+        renommeur = Renommeur(_Fichier(ligne.source), gabarits=sans_gabarits)
+        try:
+            if ligne.erreur or not ligne.cible:
+                raise RenommageEchec(ligne.erreur or "Pas de cible.")
+            # Une cible relative l'est au répertoire cible.
+            cible = _cible_contenue(rep_cible, ligne.cible, racine)
+        except RenommageEchec as exc:
+            rapport[index] = Resultat(ligne, erreur=exc)
+            # Sa source reste occupée : on la connaît pour la protéger.
+            deplacements.append(_Deplacement(index, renommeur, ""))
+            continue
+        deplacements.append(_Deplacement(index, renommeur, cible))
+    return _execute(lignes, deplacements, rapport, force, copier, workers)
@@ -13,26 +13,30 @@ métadonnées.
 
 import ast
 import errno
+import functools
 import logging
 import os
-import re
 import shutil
+import string
 from operator import attrgetter
 from pathlib import Path
-from typing import Iterator, List, Optional
+from typing import Iterator, List, Optional, Union
 
 import attr
 
 from automatheque.util.fichier import enleve_caracteres_invalides
+from automatheque.util.parallele import Resultat
 
-from .condition import evalue_condition
+from .condition import Condition, compile_condition
 from .exceptions import (
     AucunGabaritApplicable,
     CibleHorsRepertoire,
     ConditionInvalide,
     GabaritInapplicable,
+    RenommageEchec,
     TransfertIncomplet,
 )
+from .transfert import copie, deplace
 
 LOGGER = logging.getLogger(__name__)
 
@@ -68,16 +72,33 @@ def _assainit_champ(valeur):
     return valeur
 
 
-def _cible_contenue(rep_cible, nom_fichier):
+def _nom_propre(nom_fichier):
+    """Vrai si le nom, joint à un répertoire, y reste sans normalisation."""
+    return (
+        nom_fichier
+        and not os.path.isabs(nom_fichier)
+        and "." + os.sep not in nom_fichier + os.sep
+        and os.sep * 2 not in nom_fichier
+        and (os.altsep is None or os.altsep not in nom_fichier)
+    )
+
+
+def _cible_contenue(rep_cible, nom_fichier, racine=None):
     """Renvoie le chemin cible, après avoir vérifié qu'il reste dans le répertoire.
 
     Deuxième ligne de défense, après l'assainissement des champs : un squelette
     absolu, ou une combinaison qu'on n'avait pas prévue, ne doit pas pouvoir
     écrire ailleurs que sous `rep_cible`.
 
+    :param racine: `os.path.abspath(rep_cible)`, quand l'appelant l'a déjà
     :raise CibleHorsRepertoire: si le chemin construit s'en échappe
     """
-    racine = os.path.abspath(rep_cible)
+    if racine is None:
+        racine = os.path.abspath(rep_cible)
+    if _nom_propre(nom_fichier):
+        # Relatif, sans `.`, `..` ni séparateur doublé : il ne peut pas
+        # sortir, et `abspath` n'aurait rien à normaliser.
+        return racine.rstrip(os.sep) + os.sep + nom_fichier
     cible = os.path.abspath(os.path.join(racine, nom_fichier))
     if cible != racine and not cible.startswith(racine + os.sep):
         raise CibleHorsRepertoire(cible, racine)
@@ -94,29 +115,117 @@ def _efface(chemin):
         LOGGER.warning("Impossible de supprimer la cible incomplète %s", chemin)
 
 
-def _nom_relatif(nom_fichier: str, squelette_absolu: bool) -> str:
-    """Réduit le nom formaté à un chemin propre, sans segment vide.
+class _Squelette:
+    """Un squelette compilé : le plan de ses segments de chemin.
+
+    Formater le squelette puis découper le résultat en segments, c'est
+    refaire à chaque fichier un travail qui ne dépend que du squelette. Il
+    est ici découpé une fois : chaque segment est une suite de morceaux
+    littéraux et de champs (avec leur conversion et leur format). Seuls les
+    champs sont rendus à chaque fichier, et assainis au passage — seulement
+    ceux que le squelette utilise.
 
-    Un champ de **tête** vide — `{annee}/{album}/{nom}` avec `annee=""` — laisse
-    un séparateur en tête (`"/Japon/x.jpg"`) qui rend le chemin **absolu** :
-    `os.path.join(rep_cible, …)` jette alors `rep_cible`, et le fichier
-    quitterait le répertoire cible (rattrapé plus loin par `CibleHorsRepertoire`,
-    mais pour rien — un champ manquant est bénin). On retire donc les segments
-    vides (tête, queue, séparateurs doublés) : le champ manquant devient un
-    segment sauté.
+    Les segments vides sont sautés. Un champ de **tête** vide — `{annee}/{album}/{nom}`
+    avec `annee=""` — laisserait sinon un séparateur en tête (`"/Japon/x.jpg"`)
+    qui rendrait le chemin **absolu** : `os.path.join(rep_cible, …)` jetterait
+    alors `rep_cible`, et le fichier quitterait le répertoire cible (rattrapé
+    plus loin par `CibleHorsRepertoire`, mais pour rien — un champ manquant
+    est bénin). Le champ manquant devient donc un segment sauté.
 
     En revanche, un squelette **écrit** absolu (`"/etc/{nom}"`) est une erreur
-    d'auteur : on le laisse absolu pour que `_cible_contenue` le refuse. D'où le
-    drapeau `squelette_absolu`, décidé sur le squelette et non sur son rendu —
-    les deux sont indiscernables une fois formatés.
+    d'auteur : il reste absolu pour que `_cible_contenue` le refuse. D'où
+    `absolu`, décidé sur le squelette et non sur son rendu — les deux sont
+    indiscernables une fois formatés.
+
+    :raise ValueError: si le squelette n'est pas un modèle `str.format` valide
     """
-    segments = [s for s in re.split(r"[/\\]+", nom_fichier) if s]
-    if not segments:
-        return nom_fichier
-    chemin = os.path.join(*segments)
-    if squelette_absolu:
-        chemin = os.sep + chemin
-    return chemin
+
+    def __init__(self, squelette: str):
+        self.texte = squelette
+        self.absolu = squelette.startswith(("/", os.sep))
+        segments: List[list] = [[]]
+        for litteral, nom, spec, conversion in _FORMATEUR.parse(squelette):
+            if litteral:
+                premier, *suivants = litteral.replace("\\", "/").split("/")
+                segments[-1].append(premier)
+                for morceau in suivants:
+                    segments.append([morceau])
+            if nom is not None:
+                segments[-1].append(_lecteur(nom, conversion, spec))
+        self._segments = []
+        for segment in segments:
+            # Les littéraux voisins sont recollés d'avance.
+            morceaux: list = []
+            for morceau in segment:
+                if (
+                    isinstance(morceau, str)
+                    and morceaux
+                    and isinstance(morceaux[-1], str)
+                ):
+                    morceaux[-1] += morceau
+                elif morceau != "":
+                    morceaux.append(morceau)
+            if morceaux:
+                self._segments.append(tuple(morceaux))
+
+    def rend(self, champs: dict) -> str:
+        """Le nom formaté avec les champs (bruts : ils sont assainis ici).
+
+        :raise KeyError, IndexError, ValueError, AttributeError, TypeError: si
+            un champ manque ou ne se formate pas
+        """
+        segments: List[str] = []
+        for segment in self._segments:
+            texte = "".join(
+                morceau if isinstance(morceau, str) else morceau(champs)
+                for morceau in segment
+            )
+            if not texte:
+                continue
+            # Un champ non-chaîne n'est pas assaini : `{date:%Y/%m}` peut
+            # légitimement décrire deux niveaux.
+            if "/" in texte or "\\" in texte:
+                segments.extend(s for s in texte.replace("\\", "/").split("/") if s)
+            else:
+                segments.append(texte)
+        if not segments:
+            return self.texte.format(
+                **{cle: _assainit_champ(valeur) for cle, valeur in champs.items()}
+            )
+        chemin = os.path.join(*segments)
+        return os.sep + chemin if self.absolu else chemin
+
+
+_FORMATEUR = string.Formatter()
+
+
+def _lecteur(nom, conversion, spec):
+    """La fonction qui rend un champ du squelette, comme `str.format` le ferait
+    avec des champs assainis."""
+    # Comme `str.format` : le nom du champ va jusqu'au premier `.` ou `[`, la
+    # suite est un chemin d'attributs ou d'index.
+    fin = min((i for i in (nom.find("."), nom.find("[")) if i >= 0), default=len(nom))
+    premier = nom[:fin]
+
+    def _valeur(champs):
+        if not premier or premier.isdigit():
+            raise IndexError("champ positionnel {{{}}}".format(nom))
+        valeur = _assainit_champ(champs[premier])
+        if fin == len(nom):
+            return valeur
+        return _FORMATEUR.get_field(nom, (), {premier: valeur})[0]
+
+    def _rend(champs):
+        valeur = _valeur(champs)
+        if conversion:
+            valeur = _FORMATEUR.convert_field(valeur, conversion)
+        # Un format à champs imbriqués (`{x:{largeur}}`) est formaté lui aussi.
+        return format(valeur, spec.format(**champs) if "{" in spec else spec)
+
+    return _rend
+
+
+_compile_squelette = functools.lru_cache(maxsize=1024)(_Squelette)
 
 
 @attr.s
@@ -145,6 +254,8 @@ class Gabarits:
         """Initialisation."""
         self._gabarits: List[Gabarit] = list(gabarits or [])
         self.gabarit_choisi: Optional[Gabarit] = None
+        # Forme compilée (cf. `_compile`), refaite après chaque ajout.
+        self._compiles: Optional[tuple] = None
 
     def __iter__(self) -> Iterator[Gabarit]:
         """Itère sur les gabarits, dans l'ordre où ils ont été ajoutés."""
@@ -161,6 +272,7 @@ class Gabarits:
     def append(self, gabarit: Gabarit) -> None:
         """Ajoute un gabarit à la liste."""
         self._gabarits.append(gabarit)
+        self._compiles = None
 
     @classmethod
     def depuis_configuration(
@@ -224,39 +336,73 @@ class Gabarits:
             )
         return gabarits
 
-    def gabarits_valides(self, obj) -> Iterator[Gabarit]:
+    def _compile(self):
+        """Les gabarits triés, et leurs conditions analysées, une fois pour toutes.
+
+        Renvoie `(avec_condition, sans_condition)` : le premier est une liste
+        de `(gabarit, condition)`, la condition valant None si elle est
+        invalide — toujours fausse, donc. Un gabarit modifié après coup (son
+        `ordre`, sa `condition`) n'est pas vu : on les ajoute tout faits.
+        """
+        if self._compiles is None:
+            avec_condition = []
+            for gabarit in sorted(
+                (g for g in self._gabarits if g.condition), key=attrgetter("ordre")
+            ):
+                try:
+                    condition = compile_condition(gabarit.condition)
+                except ConditionInvalide as exc:
+                    LOGGER.warning("Gabarit %s écarté : %s", gabarit.squelette, exc)
+                    condition = None
+                avec_condition.append((gabarit, condition))
+            sans_condition = sorted(
+                (g for g in self._gabarits if not g.condition), key=attrgetter("ordre")
+            )
+            self._compiles = (avec_condition, sans_condition)
+        return self._compiles
+
+    def gabarits_valides(self, obj, champs=None) -> Iterator[Gabarit]:
         """Génère les gabarits applicables à l'objet, dans l'ordre.
 
         D'abord ceux dont la condition est vérifiée, puis ceux qui n'ont pas de
         condition — les uns comme les autres classés par `ordre`. Un gabarit
         sans condition est donc un filet de sécurité, pas un concurrent.
+
+        :param champs: les champs de l'objet, s'ils sont déjà projetés ; à
+                       défaut, `_liste_champs_dispo()` est appelée une fois
+                       pour toutes les conditions
         """
-        avec_condition = [g for g in self._gabarits if g.condition]
-        for gabarit in sorted(avec_condition, key=attrgetter("ordre")):
-            if self.teste_condition(obj, gabarit.condition):
+        avec_condition, sans_condition = self._compile()
+        if avec_condition and champs is None:
+            champs = obj._liste_champs_dispo()
+        for gabarit, condition in avec_condition:
+            if condition is not None and self.teste_condition(
+                obj, condition, champs=champs
+            ):
                 yield gabarit
+        yield from sans_condition
 
-        sans_condition = [g for g in self._gabarits if not g.condition]
-        for gabarit in sorted(sans_condition, key=attrgetter("ordre")):
-            yield gabarit
-
-    def choisit_gabarit(self, obj) -> Gabarit:
+    def choisit_gabarit(self, obj, champs=None) -> Gabarit:
         """Retient le premier gabarit applicable, et le renvoie.
 
+        :param champs: cf. `gabarits_valides`
         :raise AucunGabaritApplicable: si aucun ne convient
         """
         try:
-            self.gabarit_choisi = next(self.gabarits_valides(obj))
+            self.gabarit_choisi = next(self.gabarits_valides(obj, champs=champs))
         except StopIteration:
             raise AucunGabaritApplicable()
         return self.gabarit_choisi
 
     @classmethod
-    def teste_condition(cls, obj, condition: str) -> bool:
+    def teste_condition(
+        cls, obj, condition: Union[str, Condition], champs=None
+    ) -> bool:
         """Teste la condition d'un gabarit sur l'objet donné.
 
-        La condition est formatée avec les champs de l'objet, puis évaluée —
-        `'"{album}" == "Meteora"'` avec les mêmes champs que le squelette.
+        La condition est évaluée avec les champs de l'objet —
+        `'"{album}" == "Meteora"'` avec les mêmes champs que le squelette. Elle
+        peut être donnée déjà compilée (:func:`compile_condition`).
 
         Une condition qui ne s'évalue pas — champ absent, expression mal
         formée — est **fausse**, pas fatale : le gabarit suivant est essayé.
@@ -265,11 +411,15 @@ class Gabarits:
         de la condition. Un bug réel du `_liste_champs_dispo()` du consommateur
         (typo, `NotImplementedError`) doit remonter, pas se déguiser en
         « condition fausse » ; on l'appelle donc **hors** du `try`.
+
+        :param champs: les champs de l'objet, s'ils sont déjà projetés
         """
-        champs = obj._liste_champs_dispo()
+        if champs is None:
+            champs = obj._liste_champs_dispo()
         try:
-            formatee = condition.format(**champs)
-            return bool(evalue_condition(formatee))
+            if not isinstance(condition, Condition):
+                condition = compile_condition(condition)
+            return bool(condition.evalue(champs))
         except (
             KeyError,
             IndexError,
@@ -345,6 +495,26 @@ class Renommeur:
             raise ValueError("obj doit etre une instance de Renommable")
         self.obj = obj
         self.gabarits = gabarits if gabarits is not None else obj._gabarits_par_defaut()
+        self._champs: Optional[dict] = None
+
+    def champs(self) -> dict:
+        """Les champs de l'objet (`_liste_champs_dispo()`), projetés une fois.
+
+        Conditions et squelette partagent la même projection : une projection
+        coûteuse (lecture d'étiquettes…) n'est faite qu'une fois par passe, et
+        non une fois par gabarit à condition, plus une pour le squelette.
+        """
+        if self._champs is None:
+            self._champs = self.obj._liste_champs_dispo()
+        return self._champs
+
+    def oublie_champs(self) -> None:
+        """Oublie les champs projetés : à appeler si l'objet a changé depuis.
+
+        Le renommeur le fait lui-même après un déplacement, `source` ayant
+        changé.
+        """
+        self._champs = None
 
     def _construire_nouveau_nom(self) -> str:
         """Construit le nouveau nom de l'objet à renommer.
@@ -352,31 +522,42 @@ class Renommeur:
         :raise AucunGabaritApplicable: si aucun gabarit ne convient
         :raise GabaritInapplicable: si le squelette retenu ne peut être formaté
         """
-        champs = {
-            cle: _assainit_champ(valeur)
-            for cle, valeur in self.obj._liste_champs_dispo().items()
-        }
-        gabarit = self.gabarits.choisit_gabarit(self.obj)
+        gabarit = self.gabarits.choisit_gabarit(self.obj, champs=self.champs())
         LOGGER.debug("Gabarit choisi : %s", gabarit)
+        return self._applique(gabarit)
+
+    def _applique(self, gabarit: Gabarit) -> str:
+        """Le nom que donne le squelette de `gabarit` à l'objet.
+
+        :raise GabaritInapplicable: si le squelette ne peut être formaté
+        """
         try:
-            nom = gabarit.squelette.format(**champs)
+            # Segments vides rabotés, squelette écrit absolu laissé absolu :
+            # cf. `_Squelette`.
+            return _compile_squelette(gabarit.squelette).rend(self.champs())
         except (KeyError, IndexError, ValueError, AttributeError, TypeError) as exc:
             raise GabaritInapplicable(gabarit.squelette, str(exc)) from exc
-        # `squelette_absolu` est décidé sur le squelette, pas sur son rendu : un
-        # champ de tête vide (`{annee}/…` avec `annee=""`) rend `nom` absolu par
-        # accident et le ferait quitter rep_cible — on rabote alors les segments
-        # vides ; un squelette **écrit** absolu (`/etc/{nom}`) reste absolu pour
-        # que `_cible_contenue` le refuse.
-        squelette_absolu = gabarit.squelette.startswith(("/", os.sep))
-        return _nom_relatif(nom, squelette_absolu)
-
-    def _renomme(self, rep_cible, nom_fichier, debug=False, force=False, copier=False):
+
+    def _renomme(
+        self,
+        rep_cible,
+        nom_fichier,
+        debug=False,
+        force=False,
+        copier=False,
+        repertoire_pret=False,
+    ):
         """Déplace le fichier vers `rep_cible/nom_fichier`.
 
-        Le transfert est une copie suivie d'une vérification de taille, puis de
-        la suppression de l'original — `shutil.move` ne dirait pas si la copie
-        s'est mal passée entre deux systèmes de fichiers.
+        Sur un même système de fichiers, le fichier est simplement renommé
+        (sauf si `copier`). Sinon, le transfert est une copie (`transfert.copie`
+        : clonage ou copie dans le noyau quand c'est possible) suivie d'une
+        vérification de taille, puis de la suppression de l'original —
+        `shutil.move` ne dirait pas si la copie s'est mal passée entre deux
+        systèmes de fichiers.
 
+        :param repertoire_pret: le répertoire parent de la cible existe déjà
+                                (créé d'avance par `renomme_lot`)
         :raise CibleHorsRepertoire: si le chemin construit sort de `rep_cible`
         :returns: le chemin cible, qu'il ait été atteint ou non
         """
@@ -384,7 +565,7 @@ class Renommeur:
         fichier_orig = self.obj.source
         if not fichier_orig:
             # Refus explicite : sans `source`, il n'y a rien à déplacer. Mieux
-            # vaut le dire ici qu'un `shutil.copy(None, …)` obscur au fond de la
+            # vaut le dire ici qu'une copie de `None` obscure au fond de la
             # pile (l'ancien défaut `filename=""` donnait le même genre d'échec
             # tardif). Cf. #117.
             raise ValueError(
@@ -399,14 +580,28 @@ class Renommeur:
             return fichier_cible
 
         # Creation du répertoire parent si besoin :
-        Path(os.path.dirname(fichier_cible)).mkdir(parents=True, exist_ok=True)
+        if not repertoire_pret:
+            Path(os.path.dirname(fichier_cible)).mkdir(parents=True, exist_ok=True)
 
         LOGGER.debug("Déplacement vers cible : %s", fichier_cible)
+        if not copier and deplace(fichier_orig, fichier_cible):
+            # Même système de fichiers : un renommage, atomique — la cible est
+            # complète ou absente, il n'y a rien à vérifier.
+            self.obj.source = fichier_cible
+            self.oublie_champs()
+            return fichier_cible
         try:
             # Attention, si le fichier cible existe il est écrasé.
             # Pour changer ce fonctionnement voir ici :
             # https://gist.github.com/alexwlchan/c2adbb8ee782f460e5ec
-            shutil.copy(fichier_orig, fichier_cible)
+            copie(fichier_orig, fichier_cible)
+        except shutil.SameFileError:
+            # Un lien symbolique vers la cible elle-même : la « cible » est
+            # l'unique contenu, il ne faut surtout pas l'effacer.
+            LOGGER.error(
+                "[E] %s désigne déjà %s : rien à copier", fichier_orig, fichier_cible
+            )
+            raise
         except OSError as exc:
             if exc.errno != errno.ENOTSUP:
                 # La copie a pu écrire une cible **partielle** avant d'échouer
@@ -416,7 +611,7 @@ class Renommeur:
                 # comme un succès. L'original, lui, n'a jamais été touché.
                 _efface(fichier_cible)
                 LOGGER.error(
-                    "[E] Echec shutil.copy(%s, %s) : %s",
+                    "[E] Echec de la copie (%s, %s) : %s",
                     fichier_orig,
                     fichier_cible,
                     exc,
@@ -441,6 +636,7 @@ class Renommeur:
         # On écrit dans `source` — le seul porteur de vérité du chemin : nom de
         # base, extension, étiquettes rechargées… tout en dérive et suit.
         self.obj.source = fichier_cible
+        self.oublie_champs()
         if not copier:
             os.remove(fichier_orig)
         return fichier_cible
@@ -458,3 +654,45 @@ class Renommeur:
         return self._renomme(
             rep_cible, nom_fichier, debug=debug, force=force, copier=copier
         )
+
+
+def _renommeurs(objets, gabarits=None) -> Iterator[Renommeur]:
+    """Un `Renommeur` par objet. À défaut de `gabarits`, ceux par défaut sont
+    demandés une fois par classe d'objet, et non une fois par objet : leur
+    forme compilée sert ainsi à tout le lot."""
+    par_classe: dict = {}
+    for obj in objets:
+        renommeur = Renommeur(
+            obj,
+            gabarits=gabarits if gabarits is not None else par_classe.get(type(obj)),
+        )
+        if gabarits is None:
+            par_classe.setdefault(type(obj), renommeur.gabarits)
+        yield renommeur
+
+
+def construit_chemins(objets, rep_cible=None, gabarits=None) -> Iterator[Resultat]:
+    """Calcule le chemin cible de chaque objet, sans rien déplacer.
+
+    Pour planifier le rangement de millions de fichiers : les gabarits (et
+    leurs squelettes et conditions compilés) servent à tout le lot, et le
+    répertoire cible n'est résolu qu'une fois.
+
+    :param objets: les objets `Renommable` ; consommés au fil de l'eau
+    :param rep_cible: si donné, les chemins sont les cibles absolues sous ce
+                      répertoire (vérifiées comme `Renommeur.renomme` le fait) ;
+                      sinon, les noms relatifs
+    :param gabarits: à défaut, ceux de chaque classe d'objet
+    :returns: un :class:`~automatheque.util.parallele.Resultat` par objet,
+              dans l'ordre : le chemin, ou l'échec (`RenommageEchec`)
+    """
+    racine = os.path.abspath(rep_cible) if rep_cible is not None else None
+    for renommeur in _renommeurs(objets, gabarits):
+        try:
+            chemin = renommeur._construire_nouveau_nom()
+            if racine is not None:
+                chemin = _cible_contenue(rep_cible, chemin, racine)
+        except RenommageEchec as exc:
+            yield Resultat(renommeur.obj, erreur=exc)
+        else:
+            yield Resultat(renommeur.obj, valeur=chemin)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Rangement en continu d'un répertoire de dépôt.
+
+Plutôt que de passer `Renommeur.renomme` toutes les cinq minutes sur un
+répertoire de dépôt, :func:`range_en_continu` le surveille
+(:func:`automatheque.util.surveillance.surveille`) et range chaque fichier dès
+qu'il est fini d'écrire : une photo déposée est rangée dans la seconde.
+
+Ce qu'on sait d'un fichier — décomposition de son nom, lecture de ses
+étiquettes… — est l'affaire de la `fabrique`, qui construit l'objet
+`Renommable` à partir du chemin ::
+
+    def photo(chemin):
+        photo = Photo(source=chemin, basename=os.path.basename(chemin))
+        photo.auto_decompose()
+        return photo
+
+    for resultat in range_en_continu("/depot", "/photos", photo):
+        if not resultat.reussi:
+            LOGGER.warning("%s non rangé : %s", resultat.element, resultat.erreur)
+"""
+
+import logging
+import os
+
+from automatheque.exceptions import AutomathequeBaseException
+from automatheque.util.parallele import Resultat
+from automatheque.util.surveillance import surveille
+
+from .renommeur import Renommeur
+
+LOGGER = logging.getLogger(__name__)
+
+
+def range_en_continu(
+    rep_entree, rep_cible, fabrique, gabarits=None, force=False, copier=False, **options
+):
+    """Range chaque fichier qui arrive dans `rep_entree`, et produit un résultat
+    par fichier.
+
+    Chaque résultat est un :class:`~automatheque.util.parallele.Resultat` dont
+    `element` est le chemin arrivé et `valeur` le chemin cible. Un fichier qui
+    ne peut être rangé — aucun gabarit, décomposition impossible, fichier
+    disparu… — donne un résultat en échec sans arrêter la surveillance ;
+    toute autre exception (un bug de la fabrique, typiquement) remonte.
+
+    Si `rep_cible` est sous `rep_entree`, les fichiers qui y arrivent — ceux
+    qu'on vient de ranger — sont ignorés.
+
+    :param fabrique: appelée en `fabrique(chemin)`, renvoie l'objet
+                     `Renommable` à ranger
+    :param gabarits: passés au :class:`Renommeur` ; à défaut, ceux de l'objet
+    :param force: écrase un fichier cible existant
+    :param copier: conserve l'original au lieu de le supprimer — il est alors
+                   ignoré ensuite, tant qu'il n'est pas réécrit
+    :param options: passées à :func:`~automatheque.util.surveillance.surveille`
+                    (`delai`, `recursif`, `existants`, `arret`, `mode`…)
+    """
+    cible = os.path.abspath(rep_cible) + os.sep
+    for chemin in surveille(rep_entree, **options):
+        if os.path.abspath(chemin).startswith(cible):
+            continue
+        try:
+            obj = fabrique(chemin)
+            valeur = Renommeur(obj, gabarits=gabarits).renomme(
+                rep_cible, force=force, copier=copier
+            )
+        except (AutomathequeBaseException, OSError) as exc:
+            LOGGER.debug("%s non rangé : %s", chemin, exc)
+            yield Resultat(chemin, erreur=exc)
+        else:
+            LOGGER.debug("%s rangé dans %s", chemin, valeur)
+            yield Resultat(chemin, valeur=valeur)
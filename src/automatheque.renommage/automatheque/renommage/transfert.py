@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Transfert d'un fichier vers sa cible, au moindre coût.
+
+Ranger une photo dans la même bibliothèque, c'est le plus souvent la déplacer
+**sur le même système de fichiers** : un `rename` suffit, instantané quelle que
+soit la taille, et atomique. :func:`deplace` le tente d'abord — sauf pour un
+lien symbolique, dont c'est le contenu pointé que l'on range (cf. plus bas).
+
+Reste la copie — entre deux systèmes de fichiers, ou quand l'original doit
+être conservé. :func:`copie` y essaie, du moins coûteux au plus sûr :
+
+* le **clonage** (`FICLONE` : reflink sur btrfs, XFS…) — aucun octet copié,
+  les blocs sont partagés jusqu'à la première écriture ;
+* `os.copy_file_range`, puis `os.sendfile` — la copie reste dans le noyau,
+  sans aller-retour par l'espace utilisateur ;
+* une copie par tampon, qui marche partout.
+
+Une méthode refusée d'emblée (non supportée, autre système de fichiers…)
+passe la main à la suivante ; une erreur **en cours de copie** remonte : la
+cible est alors partielle, et c'est à l'appelant de l'effacer.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import stat
+from typing import Any
+
+fcntl: Any
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+# `fcntl.FICLONE` n'existe qu'à partir de Python 3.12 ; la valeur est celle de
+# <linux/fs.h>, _IOW(0x94, 9, int).
+_FICLONE = getattr(fcntl, "FICLONE", 0x40049409) if fcntl is not None else None
+
+# Erreurs par lesquelles le noyau dit « pas cette méthode ici » : on passe à la
+# suivante. Toute autre erreur est un vrai échec (droits, descripteur, disque
+# plein, E/S…) et remonte, plutôt que d'être masquée par la méthode suivante.
+_NON_SUPPORTE = frozenset(
+    {
+        errno.EXDEV,
+        errno.EINVAL,
+        errno.ENOSYS,
+        errno.ENOTTY,  # ioctl inconnu du noyau : pas de FICLONE
+        errno.EOPNOTSUPP,
+        errno.ENOTSUP,
+        errno.ETXTBSY,
+    }
+)
+
+_TAILLE_TAMPON = 1024 * 1024
+# Morceau demandé au noyau par appel : borné, pour rester sous les limites de
+# `copy_file_range` / `sendfile` (un peu moins de 2 Gio) sur tous les noyaux.
+_TAILLE_MORCEAU = 1024 * 1024 * 1024
+
+
+def deplace(source, cible):
+    """Déplace `source` vers `cible` par un simple renommage, si c'est possible.
+
+    Une cible existante est remplacée. Rien n'est tenté si les deux ne sont
+    pas sur le même périphérique, ni si `source` est un lien symbolique :
+    renommé, c'est le lien qui serait rangé — cassé s'il est relatif — et non
+    le fichier pointé, que la copie range comme elle l'a toujours fait (le
+    lien seul est ensuite supprimé, le fichier pointé reste en place).
+
+    Une cible qui est un autre lien physique de `source` : `rename` ne fait
+    alors rien et réussit, laissant `source` en place ; c'est donc `source`
+    qui est retiré, la cible portant déjà le contenu.
+
+    :returns: True si le fichier est déplacé, False s'il faut copier
+    """
+    try:
+        etat = os.lstat(source)
+        if stat.S_ISLNK(etat.st_mode):
+            return False
+        if etat.st_dev != os.stat(os.path.dirname(cible) or ".").st_dev:
+            return False
+        if _autre_lien(source, etat, cible):
+            os.remove(source)
+            return True
+        os.replace(source, cible)
+    except OSError as exc:
+        # EXDEV (deux points de montage d'un même disque), droits… : la copie,
+        # qui sait signaler ses échecs, prend le relais.
+        LOGGER.debug("Renommage impossible de %s vers %s : %s", source, cible, exc)
+        return False
+    return True
+
+
+def _autre_lien(source, etat, cible):
+    """Vrai si `cible` est un autre lien physique vers le fichier de `source`
+    (d'état `etat`), et non la même entrée de répertoire écrite autrement."""
+    try:
+        etat_cible = os.lstat(cible)
+    except FileNotFoundError:
+        return False
+    if not os.path.samestat(etat, etat_cible):
+        return False
+    return not (
+        os.path.basename(source) == os.path.basename(cible)
+        and os.path.samefile(
+            os.path.dirname(source) or ".", os.path.dirname(cible) or "."
+        )
+    )
+
+
+def copie(source, cible):
+    """Copie le contenu et les droits de `source` vers `cible`, comme
+    `shutil.copy`, par la méthode la moins coûteuse disponible.
+
+    :raise shutil.SameFileError: si `source` et `cible` sont le même fichier
+    :returns: `cible`
+    """
+    if os.path.exists(cible) and os.path.samefile(source, cible):
+        raise shutil.SameFileError(
+            "{!r} et {!r} sont le même fichier".format(source, cible)
+        )
+    with open(source, "rb") as fsrc, open(cible, "wb") as fdst:
+        taille = os.fstat(fsrc.fileno()).st_size
+        methode = _copie_contenu(fsrc, fdst, taille)
+    LOGGER.debug("Copie de %s vers %s par %s", source, cible, methode)
+    shutil.copymode(source, cible)
+    return cible
+
+
+def _copie_contenu(fsrc, fdst, taille):
+    """Copie `taille` octets de `fsrc` dans `fdst`, et renvoie la méthode qui
+    l'a fait."""
+    entree, sortie = fsrc.fileno(), fdst.fileno()
+    if taille and _FICLONE is not None:
+        try:
+            fcntl.ioctl(sortie, _FICLONE, entree)
+            return "clonage"
+        except OSError as exc:
+            if exc.errno not in _NON_SUPPORTE:
+                raise
+    for methode, copie_noyau in (
+        ("copy_file_range", getattr(os, "copy_file_range", None)),
+        ("sendfile", _sendfile if hasattr(os, "sendfile") else None),
+    ):
+        if (
+            taille
+            and copie_noyau is not None
+            and _copie_noyau(copie_noyau, entree, sortie, taille)
+        ):
+            return methode
+    shutil.copyfileobj(fsrc, fdst, _TAILLE_TAMPON)
+    return "tampon"
+
+
+def _sendfile(entree, sortie, nombre):
+    return os.sendfile(sortie, entree, None, nombre)
+
+
+def _copie_noyau(copie_noyau, entree, sortie, taille):
+    """Copie par `copie_noyau(entree, sortie, nombre)`, qui avance les
+    positions des deux fichiers.
+
+    :returns: False si la méthode est refusée avant d'avoir rien copié
+    """
+    copies = 0
+    while copies < taille:
+        try:
+            nombre = copie_noyau(entree, sortie, min(taille - copies, _TAILLE_MORCEAU))
+        except OSError as exc:
+            if copies == 0 and exc.errno in _NON_SUPPORTE:
+                return False
+            raise
+        if nombre == 0:
+            # Fin de fichier avant la taille annoncée : le fichier a raccourci
+            # depuis, la vérification de taille le dira. Mais certains systèmes
+            # de fichiers renvoient 0 d'emblée au lieu d'une erreur.
+            return copies > 0
+        copies += nombre
+    return True
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Tests des conditions compilées : même résultat que formater puis évaluer,
+sauf là où la substitution textuelle se trompait."""
+
+import ast
+import datetime
+
+import pytest
+from automatheque.renommage import (
+    Condition,
+    ConditionInvalide,
+    Gabarit,
+    Gabarits,
+    compile_condition,
+    evalue_condition,
+)
+
+CHAMPS = {
+    "album": "Japon",
+    "vide": "",
+    "pays": "JP",
+    "annee": 2013,
+    "annee_texte": "2015",
+    "date": datetime.date(2013, 3, 17),
+    "guillemets": 'dit "bonjour"',
+    "injection": '" and __import__("os").getcwd() and "',
+}
+
+CONDITIONS = [
+    '"{album}"',
+    '"{vide}"',
+    '"{album}" and "{pays}" != "FR"',
+    '"{date:%Y}" == "2013"',
+    '"{date.year}-{pays}" in ("2013-JP", "x")',
+    "{annee} > 2010",
+    '"{album}" "{pays}" == "JaponJP"',
+    '"{{x}} {album}" == "{{x}} Japon"',
+    'not "{vide}" or "{album}"',
+    "'{album}' < 'Z'",
+    '"{annee}" in ["2013", "2014"]',
+    "1 < {annee} < 3000",
+    "{date:%Y} > 2010",
+    "{annee_texte} > 2010",
+    "{annee_texte} == 2015",
+    "1 < {annee_texte} < 3000",
+    "{annee_texte} in (2014, 2015)",
+    "{album} > 2010",
+]
+
+
+def _textuelle(condition, champs):
+    try:
+        return bool(evalue_condition(condition.format(**champs)))
+    except (KeyError, ValueError, TypeError, AttributeError, IndexError):
+        return False
+
+
+def _compilee(condition, champs):
+    try:
+        return bool(Condition(condition).evalue(champs))
+    except (KeyError, ValueError, TypeError, AttributeError, IndexError):
+        return False
+
+
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_meme_resultat_que_la_substitution_textuelle(condition):
+    assert _compilee(condition, CHAMPS) == _textuelle(condition, CHAMPS)
+
+
+def test_rien_n_est_reanalyse_ni_compile_a_l_evaluation(monkeypatch):
+    condition = Condition('"{album}" and "{pays}" != "FR" and {annee} > 2010')
+    monkeypatch.setattr(ast, "parse", lambda *a, **k: pytest.fail("réanalyse"))
+    monkeypatch.setattr("builtins.compile", lambda *a, **k: pytest.fail("compile"))
+    assert condition.evalue(CHAMPS)
+    assert not condition.evalue(dict(CHAMPS, pays="FR"))
+
+
+def test_une_valeur_a_guillemets_reste_une_valeur():
+    """La substitution textuelle cassait le littéral (condition fausse), ou
+    pire, en changeait la structure."""
+    assert Condition('"{guillemets}" == \'dit "bonjour"\'').evalue(CHAMPS)
+    assert Condition('"{injection}"').evalue(CHAMPS)
+    assert not Condition('"{injection}" == ""').evalue(CHAMPS)
+
+
+def test_champ_seul_garde_son_type():
+    assert Condition("{annee} == 2013").evalue(CHAMPS)
+    assert not Condition('{annee} == "2013"').evalue(CHAMPS)
+    assert Condition('{date:%Y} == "2013"').evalue(CHAMPS)
+    assert Condition("{date.year} in (2012, 2013)").evalue(CHAMPS)
+    assert Condition("{pays!r} == \"'JP'\"").evalue(CHAMPS)
+
+
+def test_champ_compare_a_un_nombre_lu_comme_un_nombre():
+    """`{date:%Y} > 2010` était vrai une fois la condition formatée : il le
+    reste, au lieu de comparer une chaîne à un entier."""
+    assert Condition("{date:%Y} > 2010").evalue(CHAMPS)
+    assert Condition("{annee_texte} >= 2015.0").evalue(CHAMPS)
+    assert not Condition("{annee_texte} != 2015").evalue(CHAMPS)
+    assert not Condition('"{annee_texte}" == 2015').evalue(CHAMPS)
+    with pytest.raises(ValueError):
+        Condition("{album} > 2010").evalue(CHAMPS)
+
+
+def test_champ_positionnel_refuse():
+    with pytest.raises(ConditionInvalide):
+        Condition('"{}"')
+
+
+def test_semantique_de_and_et_or():
+    assert Condition('"{vide}" or "{album}"').evalue(CHAMPS) == "Japon"
+    assert Condition('"{album}" and "{vide}"').evalue(CHAMPS) == ""
+
+
+def test_la_liste_blanche_est_verifiee_a_la_compilation():
+    with pytest.raises(ConditionInvalide):
+        Condition('"{album}".__class__')
+    with pytest.raises(ConditionInvalide):
+        Condition('open("{album}")')
+    with pytest.raises(ConditionInvalide):
+        Condition('"{album}" and and')
+    with pytest.raises(ConditionInvalide):
+        Condition('{album}.upper() == "X"')
+
+
+def test_champ_absent():
+    with pytest.raises(KeyError):
+        Condition('"{inconnu}"').evalue(CHAMPS)
+
+
+def test_compile_condition_est_memorisee():
+    assert compile_condition('"{album}"') is compile_condition('"{album}"')
+
+
+def test_gabarits_tries_et_compiles_une_fois(monkeypatch):
+    gabarits = Gabarits(
+        [
+            Gabarit(squelette="tard", condition='"{album}"', ordre=5),
+            Gabarit(squelette="tot", condition='"{vide}"', ordre=1),
+            Gabarit(squelette="filet", ordre=9),
+        ]
+    )
+
+    class Objet:
+        def _liste_champs_dispo(self):
+            return CHAMPS
+
+    assert [g.squelette for g in gabarits.gabarits_valides(Objet())] == [
+        "tard",
+        "filet",
+    ]
+    monkeypatch.setattr("builtins.sorted", lambda *a, **k: pytest.fail("retri"))
+    assert gabarits.choisit_gabarit(Objet()).squelette == "tard"
+
+    monkeypatch.undo()
+    gabarits.append(Gabarit(squelette="premier", condition='"{pays}"', ordre=0))
+    assert gabarits.choisit_gabarit(Objet()).squelette == "premier"
+
+
+def test_condition_invalide_ecarte_son_gabarit():
+    gabarits = Gabarits(
+        [
+            Gabarit(squelette="jamais", condition="open()"),
+            Gabarit(squelette="filet", ordre=9),
+        ]
+    )
+
+    class Objet:
+        def _liste_champs_dispo(self):
+            return CHAMPS
+
+    assert gabarits.choisit_gabarit(Objet()).squelette == "filet"
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""Tests du plan de rangement : manifeste, relecture et exécution."""
+
+import json
+import os
+
+import attr
+import pytest
+from automatheque.renommage import (
+    CibleHorsRepertoire,
+    CollisionCible,
+    Gabarit,
+    Gabarits,
+    LigneManifeste,
+    Renommable,
+    RenommageEchec,
+    ecrit_manifeste,
+    execute_manifeste,
+    lit_manifeste,
+    planifie,
+    planifie_arbre,
+)
+
+GABARITS = Gabarits(
+    [
+        Gabarit(squelette="{album}/{nom}", condition='"{album}"', ordre=1),
+        Gabarit(squelette="grand/{nom}", condition="{taille} > 3", ordre=2),
+        Gabarit(squelette="a-trier/{nom}", ordre=9),
+    ]
+)
+
+
+@attr.s
+class Fichier(Renommable):
+    source = attr.ib(default="")
+    album = attr.ib(default="", kw_only=True)
+
+    @classmethod
+    def _gabarits_par_defaut(cls):
+        return GABARITS
+
+    def _liste_champs_dispo(self):
+        return {
+            "album": self.album,
+            "nom": os.path.basename(self.source),
+            "taille": os.path.getsize(self.source),
+        }
+
+
+def _fichier(rep, nom, contenu="abc", album=""):
+    chemin = rep / nom
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    chemin.write_text(contenu)
+    return Fichier(source=str(chemin), album=album)
+
+
+def test_planifie_ne_deplace_rien_et_detaille_le_choix(tmp_path):
+    lot = [
+        _fichier(tmp_path, "entree/1.jpg", album="Japon"),
+        _fichier(tmp_path, "entree/2.jpg", contenu="abcdef"),
+        _fichier(tmp_path, "entree/3.jpg"),
+    ]
+    cible = tmp_path / "range"
+    lignes = list(planifie(iter(lot), str(cible)))
+
+    assert lignes == [
+        LigneManifeste(
+            source=lot[0].source,
+            cible=str(cible / "Japon" / "1.jpg"),
+            gabarit="{album}/{nom}",
+            conditions={'"{album}"': True, "{taille} > 3": False},
+        ),
+        LigneManifeste(
+            source=lot[1].source,
+            cible=str(cible / "grand" / "2.jpg"),
+            gabarit="grand/{nom}",
+            conditions={'"{album}"': False, "{taille} > 3": True},
+        ),
+        LigneManifeste(
+            source=lot[2].source,
+            cible=str(cible / "a-trier" / "3.jpg"),
+            gabarit="a-trier/{nom}",
+            conditions={'"{album}"': False, "{taille} > 3": False},
+        ),
+    ]
+    assert not cible.exists()
+    assert all(os.path.exists(f.source) for f in lot)
+
+
+def test_planifie_signale_doublons_existantes_et_erreurs(tmp_path):
+    (tmp_path / "range" / "a-trier").mkdir(parents=True)
+    (tmp_path / "range" / "a-trier" / "3.jpg").write_text("déjà là")
+    lot = [
+        _fichier(tmp_path, "a/1.jpg", album="X"),
+        _fichier(tmp_path, "b/1.jpg", album="X"),
+        _fichier(tmp_path, "c/3.jpg"),
+    ]
+    gabarits = Gabarits(list(GABARITS) + [Gabarit(squelette="/etc/{nom}", ordre=0)])
+    lignes = list(planifie(lot, str(tmp_path / "range")))
+    assert [ligne.collision for ligne in lignes] == ["", "doublon", "existante"]
+
+    (ligne,) = planifie(lot[2:], str(tmp_path / "range"), gabarits)
+    assert ligne.cible == ""
+    assert "sort du répertoire" in ligne.erreur
+
+
+@pytest.mark.parametrize("nom", ["plan.jsonl", "plan.csv"])
+def test_manifeste_relu_a_l_identique(tmp_path, nom):
+    lignes = [
+        LigneManifeste(
+            source="/a/é,1.jpg",
+            cible='/b/"x".jpg',
+            gabarit="{album}/{nom}",
+            conditions={'"{album}" != "FR"': True},
+            collision="doublon",
+        ),
+        LigneManifeste(source="/a/2.jpg", erreur="Aucun gabarit applicable."),
+    ]
+    assert ecrit_manifeste(iter(lignes), tmp_path / nom) == 2
+    assert list(lit_manifeste(tmp_path / nom)) == lignes
+
+
+def test_manifeste_jsonl_lisible_ligne_a_ligne(tmp_path):
+    ecrit_manifeste([LigneManifeste(source="/a", cible="/b")], tmp_path / "p.jsonl")
+    (texte,) = (tmp_path / "p.jsonl").read_text().splitlines()
+    assert json.loads(texte)["cible"] == "/b"
+
+    (tmp_path / "p.jsonl").write_text(texte + "\n\n{pas du json\n")
+    with pytest.raises(ValueError, match="p.jsonl:3"):
+        list(lit_manifeste(tmp_path / "p.jsonl"))
+    with pytest.raises(ValueError):
+        ecrit_manifeste([], tmp_path / "p.txt", format="xml")
+
+
+def test_execute_manifeste_sans_recalculer(tmp_path):
+    lot = [
+        _fichier(tmp_path, "entree/1.jpg", album="Japon"),
+        _fichier(tmp_path, "entree/2.jpg"),
+    ]
+    manifeste = tmp_path / "plan.csv"
+    ecrit_manifeste(planifie(lot, str(tmp_path / "range")), manifeste)
+    # Relu et corrigé à la main : les gabarits ne sont plus consultés.
+    texte = manifeste.read_text().replace("a-trier", "revu")
+    manifeste.write_text(texte)
+
+    rapport = execute_manifeste(manifeste, tmp_path / "range", workers=2)
+
+    assert all(r.reussi for r in rapport)
+    assert [r.element.source for r in rapport] == [f.source for f in lot]
+    assert (tmp_path / "range" / "Japon" / "1.jpg").exists()
+    assert (tmp_path / "range" / "revu" / "2.jpg").exists()
+    assert not os.path.exists(lot[0].source)
+
+
+def test_execute_manifeste_refuse_collisions_et_erreurs(tmp_path):
+    a = _fichier(tmp_path, "a.jpg")
+    b = _fichier(tmp_path, "b.jpg")
+    c = _fichier(tmp_path, "c.jpg")
+    cible = str(tmp_path / "range" / "x.jpg")
+    rapport = execute_manifeste(
+        [
+            LigneManifeste(source=a.source, cible=cible),
+            LigneManifeste(source=b.source, cible=cible, collision="doublon"),
+            LigneManifeste(source=c.source, erreur="Aucun gabarit applicable."),
+        ],
+        tmp_path / "range",
+    )
+    assert [type(r.erreur) for r in rapport] == [
+        CollisionCible,
+        CollisionCible,
+        RenommageEchec,
+    ]
+    assert all(os.path.exists(f.source) for f in (a, b, c))
+
+
+def test_execute_manifeste_echange(tmp_path):
+    a = _fichier(tmp_path, "a.jpg", contenu="A")
+    b = _fichier(tmp_path, "b.jpg", contenu="B")
+    rapport = execute_manifeste(
+        [
+            LigneManifeste(source=a.source, cible=b.source),
+            LigneManifeste(source=b.source, cible=a.source),
+        ],
+        tmp_path,
+    )
+    assert all(r.reussi for r in rapport)
+    assert (tmp_path / "a.jpg").read_text() == "B"
+    assert (tmp_path / "b.jpg").read_text() == "A"
+
+
+def test_execute_manifeste_refuse_une_cible_hors_du_repertoire(tmp_path):
+    lot = [_fichier(tmp_path, "entree/1.jpg"), _fichier(tmp_path, "entree/2.jpg")]
+    manifeste = tmp_path / "plan.jsonl"
+    ecrit_manifeste(planifie(lot, str(tmp_path / "range")), manifeste)
+    # Une ligne corrigée à la main qui sort du répertoire cible.
+    lignes = manifeste.read_text().splitlines()
+    ligne = json.loads(lignes[1])
+    ligne["cible"] = str(tmp_path / "ailleurs" / "2.jpg")
+    lignes[1] = json.dumps(ligne)
+    manifeste.write_text("\n".join(lignes) + "\n")
+
+    rapport = execute_manifeste(manifeste, tmp_path / "range")
+
+    assert rapport[0].reussi
+    assert isinstance(rapport[1].erreur, CibleHorsRepertoire)
+    assert os.path.exists(lot[1].source)
+    assert not (tmp_path / "ailleurs").exists()
+
+
+def test_planifie_arbre(tmp_path):
+    _fichier(tmp_path, "depot/x/1.jpg", contenu="abcdef")
+    _fichier(tmp_path, "depot/2.jpg")
+    (tmp_path / "depot" / "illisible.txt").write_text("")
+
+    def fabrique(chemin):
+        if chemin.endswith(".txt"):
+            raise RenommageEchec("illisible")
+        return Fichier(source=chemin)
+
+    lignes = sorted(
+        planifie_arbre(tmp_path / "depot", str(tmp_path / "range"), fabrique),
+        key=lambda ligne: ligne.source,
+    )
+    assert [(os.path.basename(ligne.source), ligne.erreur) for ligne in lignes] == [
+        ("2.jpg", ""),
+        ("illisible.txt", "illisible"),
+        ("1.jpg", ""),
+    ]
+    assert lignes[2].cible == str(tmp_path / "range" / "grand" / "1.jpg")
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Tests du rangement en continu."""
+
+import os
+import threading
+import time
+
+import attr
+from automatheque.renommage import (
+    AucunGabaritApplicable,
+    Gabarit,
+    Gabarits,
+    Renommable,
+    range_en_continu,
+)
+
+
+@attr.s
+class Photo(Renommable):
+    source = attr.ib(default="")
+    album = attr.ib(default="", kw_only=True)
+
+    def _liste_champs_dispo(self):
+        return {"album": self.album, "nom": os.path.basename(self.source)}
+
+
+GABARITS = Gabarits([Gabarit(squelette="{album}/{nom}", condition='"{album}"')])
+
+
+def _photo(chemin):
+    """Fabrique : l'album est tiré du nom, comme le ferait une décomposition."""
+    nom = os.path.basename(chemin)
+    return Photo(source=chemin, album=nom.split("_")[0] if "_" in nom else "")
+
+
+def test_range_les_fichiers_a_leur_arrivee(tmp_path):
+    depot, cible = tmp_path / "depot", tmp_path / "depot" / "range"
+    depot.mkdir()
+
+    def _depose():
+        time.sleep(0.1)
+        (depot / "Japon_1.jpg").write_text("x")
+        (depot / "sans-album.jpg").write_text("x")
+
+    fil = threading.Thread(target=_depose)
+    fil.start()
+    resultats = range_en_continu(
+        depot, cible, _photo, gabarits=GABARITS, delai=0.05, intervalle=0.05
+    )
+    recus = {}
+    for resultat in resultats:
+        recus[os.path.basename(resultat.element)] = resultat
+        if len(recus) == 2:
+            resultats.close()
+    fil.join()
+
+    assert recus["Japon_1.jpg"].valeur == str(cible / "Japon" / "Japon_1.jpg")
+    assert (cible / "Japon" / "Japon_1.jpg").exists()
+    assert not (depot / "Japon_1.jpg").exists()
+    assert isinstance(recus["sans-album.jpg"].erreur, AucunGabaritApplicable)
+    assert (depot / "sans-album.jpg").exists()
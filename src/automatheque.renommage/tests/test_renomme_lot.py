@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Tests du renommage par lots : plan, collisions, chaînes et cycles."""
+
+import errno
+import os
+
+import attr
+import pytest
+from automatheque.renommage import (
+    AucunGabaritApplicable,
+    CollisionCible,
+    Gabarit,
+    Gabarits,
+    Renommable,
+    renomme_lot,
+)
+
+
+@attr.s
+class Fichier(Renommable):
+    """Un renommable dont le nouveau nom est donné tel quel."""
+
+    source = attr.ib(default="")
+    nouveau = attr.ib(default="", kw_only=True)
+    album = attr.ib(default="", kw_only=True)
+
+    @classmethod
+    def _gabarits_par_defaut(cls):
+        return Gabarits(
+            [Gabarit(squelette="{album}/{nouveau}", condition='"{nouveau}"')]
+        )
+
+    def _liste_champs_dispo(self):
+        return {"nouveau": self.nouveau, "album": self.album}
+
+
+@pytest.fixture
+def rep(tmp_path):
+    return tmp_path
+
+
+def _fichier(rep, nom, nouveau, album=""):
+    chemin = rep / nom
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    chemin.write_text(nom)
+    return Fichier(source=str(chemin), nouveau=nouveau, album=album)
+
+
+def _contenus(rep):
+    return {
+        os.path.relpath(os.path.join(racine, nom), rep): open(
+            os.path.join(racine, nom)
+        ).read()
+        for racine, _, noms in os.walk(rep)
+        for nom in noms
+    }
+
+
+def test_range_tout_le_lot_dans_l_ordre(rep):
+    lot = [
+        _fichier(rep, "entree/1.jpg", "1.jpg", "Japon"),
+        _fichier(rep, "entree/2.jpg", "2.jpg", "Japon"),
+        _fichier(rep, "entree/3.jpg", "3.jpg", "Perou"),
+    ]
+    rapport = renomme_lot(lot, str(rep / "range"), workers=2)
+
+    assert [r.element for r in rapport] == lot
+    assert all(r.reussi for r in rapport)
+    assert rapport[2].valeur == str(rep / "range" / "Perou" / "3.jpg")
+    assert _contenus(rep / "range") == {
+        os.path.join("Japon", "1.jpg"): "entree/1.jpg",
+        os.path.join("Japon", "2.jpg"): "entree/2.jpg",
+        os.path.join("Perou", "3.jpg"): "entree/3.jpg",
+    }
+    assert lot[0].source == rapport[0].valeur
+
+
+def test_deux_fichiers_pour_une_cible_ne_bougent_ni_l_un_ni_l_autre(rep):
+    lot = [
+        _fichier(rep, "a/x.jpg", "x.jpg"),
+        _fichier(rep, "b/x.jpg", "x.jpg"),
+        _fichier(rep, "c/y.jpg", "y.jpg"),
+    ]
+    rapport = renomme_lot(lot, str(rep / "range"))
+
+    assert [type(r.erreur) for r in rapport[:2]] == [CollisionCible] * 2
+    assert rapport[2].reussi
+    assert (rep / "a" / "x.jpg").exists() and (rep / "b" / "x.jpg").exists()
+    assert not (rep / "range" / "x.jpg").exists()
+
+
+def test_chaine_la_cible_est_liberee_d_abord(rep):
+    """`a → b` passe après `b → c`, quel que soit l'ordre du lot."""
+    lot = [_fichier(rep, "a", "b"), _fichier(rep, "b", "c")]
+    rapport = renomme_lot(lot, str(rep))
+
+    assert all(r.reussi for r in rapport)
+    assert _contenus(rep) == {"b": "a", "c": "b"}
+
+
+@pytest.mark.parametrize("noms", [["a", "b"], ["a", "b", "c"]])
+def test_cycle_rompu_par_un_nom_temporaire(rep, noms):
+    lot = [_fichier(rep, nom, noms[(i + 1) % len(noms)]) for i, nom in enumerate(noms)]
+    rapport = renomme_lot(lot, str(rep))
+
+    assert all(r.reussi for r in rapport)
+    attendu = {noms[(i + 1) % len(noms)]: nom for i, nom in enumerate(noms)}
+    assert _contenus(rep) == attendu  # ni perte, ni fichier temporaire
+
+
+def test_fichier_sans_gabarit_est_signale_et_protege(rep):
+    """Son fichier ne bouge pas : le prendre pour cible l'écraserait."""
+    lot = [_fichier(rep, "a", "b"), _fichier(rep, "b", "")]
+    rapport = renomme_lot(lot, str(rep), force=True)
+
+    assert isinstance(rapport[0].erreur, CollisionCible)
+    assert isinstance(rapport[1].erreur, AucunGabaritApplicable)
+    assert _contenus(rep) == {"a": "a", "b": "b"}
+
+
+def test_copier_refuse_une_cible_source_du_lot(rep):
+    lot = [_fichier(rep, "a", "b"), _fichier(rep, "b", "c")]
+    rapport = renomme_lot(lot, str(rep), copier=True)
+
+    assert isinstance(rapport[0].erreur, CollisionCible)
+    assert rapport[1].reussi
+    assert _contenus(rep) == {"a": "a", "b": "b", "c": "b"}
+
+
+def test_deja_a_sa_place(rep):
+    lot = [_fichier(rep, "a", "a")]
+    rapport = renomme_lot(lot, str(rep))
+    assert rapport[0].reussi and rapport[0].valeur == str(rep / "a")
+
+
+def test_echec_dans_un_cycle_rend_son_nom_au_fichier_mis_de_cote(rep, monkeypatch):
+    def _copie(source, cible):
+        if os.path.basename(source) == "b":
+            raise OSError(errno.EIO, "erreur d'E/S")
+        with open(source) as f, open(cible, "w") as g:
+            g.write(f.read())
+
+    monkeypatch.setattr(
+        "automatheque.renommage.renommeur.deplace", lambda source, cible: False
+    )
+    monkeypatch.setattr("automatheque.renommage.renommeur.copie", _copie)
+    lot = [_fichier(rep, "a", "b"), _fichier(rep, "b", "a")]
+    rapport = renomme_lot(lot, str(rep))
+
+    assert isinstance(rapport[0].erreur, CollisionCible)
+    assert isinstance(rapport[1].erreur, OSError)
+    assert _contenus(rep) == {"a": "a", "b": "b"}
+    assert lot[0].source == str(rep / "a")
+
+
+def test_cible_prise_hors_du_lot_est_un_echec_sans_force(rep):
+    (rep / "b").write_text("hors du lot")
+    rapport = renomme_lot([_fichier(rep, "a", "b")], str(rep))
+
+    assert isinstance(rapport[0].erreur, CollisionCible)
+    assert _contenus(rep) == {"a": "a", "b": "hors du lot"}
+
+    rapport = renomme_lot(
+        [Fichier(source=str(rep / "a"), nouveau="b")], str(rep), force=True
+    )
+    assert rapport[0].reussi
+    assert _contenus(rep) == {"b": "a"}
@@ -21,6 +21,7 @@ from automatheque.renommage import (
     Renommable,
     Renommeur,
     TransfertIncomplet,
+    construit_chemins,
     evalue_condition,
 )
 
@@ -57,6 +58,18 @@ class Photo(Renommable):
         }
 
 
+# La copie du renommeur, que les tests de transfert remplacent.
+COPIE = "automatheque.renommage.renommeur.copie"
+
+
+def _entre_supports(monkeypatch):
+    """Simule une cible sur un autre système de fichiers : pas de renommage,
+    le transfert passe par la copie."""
+    monkeypatch.setattr(
+        "automatheque.renommage.renommeur.deplace", lambda source, cible: False
+    )
+
+
 @pytest.fixture
 def photo(tmp_path):
     """Une photo posée sur le disque, prête à être rangée."""
@@ -124,6 +137,53 @@ def test_condition_referencant_un_champ_absent_est_fausse():
     assert gabarits.choisit_gabarit(Photo()).squelette == "filet"
 
 
+@attr.s
+class PhotoComptee(Photo):
+    """Compte ses projections de champs, comme une lecture d'étiquettes."""
+
+    projections = attr.ib(default=0, kw_only=True)
+
+    def _liste_champs_dispo(self):
+        self.projections += 1
+        return super()._liste_champs_dispo()
+
+
+GABARITS_CONDITIONNELS = Gabarits(
+    [
+        Gabarit(squelette="jamais", condition='"{pays}"', ordre=1),
+        Gabarit(squelette="non plus", condition='"{pays}" == "FR"', ordre=2),
+        Gabarit(squelette="{annee}/{nom}", condition='"{annee}"', ordre=3),
+    ]
+)
+
+
+def test_champs_projetes_une_fois_par_passe(tmp_path):
+    """Conditions et squelette partagent une seule projection."""
+    photo = PhotoComptee(source="/a/b.jpg", annee="2013")
+    renommeur = Renommeur(photo, gabarits=GABARITS_CONDITIONNELS)
+    assert renommeur._construire_nouveau_nom() == os.path.join("2013", "b.jpg")
+    assert photo.projections == 1
+    renommeur._construire_nouveau_nom()
+    assert photo.projections == 1
+
+
+def test_oublie_champs_refait_la_projection():
+    photo = PhotoComptee(source="/a/b.jpg", annee="2013")
+    renommeur = Renommeur(photo, gabarits=GABARITS_CONDITIONNELS)
+    renommeur._construire_nouveau_nom()
+    photo.annee = "2014"
+    renommeur.oublie_champs()
+    assert renommeur._construire_nouveau_nom() == os.path.join("2014", "b.jpg")
+    assert photo.projections == 2
+
+
+def test_les_champs_sont_oublies_apres_le_deplacement(photo, tmp_path):
+    """`source` a changé : `nom` et ce qui en dérive aussi."""
+    renommeur = Renommeur(photo)
+    renommeur.renomme(str(tmp_path / "cible"))
+    assert renommeur._champs is None
+
+
 def test_gabarits_est_iterable_et_mesurable():
     gabarits = Gabarits()
     gabarits.append(Gabarit(squelette="a"))
@@ -176,16 +236,19 @@ def test_evalue_condition_refuse_une_expression_mal_formee():
         evalue_condition('"Osaka" and and')
 
 
-def test_injection_par_les_metadonnees_ne_s_execute_pas():
-    """Bout en bout : un album malveillant ne fait qu'invalider la condition."""
+def test_injection_par_les_metadonnees_ne_s_execute_pas(monkeypatch):
+    """Bout en bout : un album malveillant n'est qu'une valeur, comparée comme
+    telle — il ne change pas la structure de la condition."""
+    monkeypatch.setattr(os, "getcwd", lambda: pytest.fail("code exécuté"))
     photo = Photo(source="/a/b.jpg", album='" and __import__("os").getcwd() and "')
     gabarits = Gabarits(
         [
-            Gabarit(squelette="dangereux", condition='"{album}"'),
+            Gabarit(squelette="meteora", condition='"{album}" == "Meteora"'),
+            Gabarit(squelette="album", condition='"{album}"', ordre=1),
             Gabarit(squelette="filet", ordre=9),
         ]
     )
-    assert gabarits.choisit_gabarit(photo).squelette == "filet"
+    assert gabarits.choisit_gabarit(photo).squelette == "album"
 
 
 #
@@ -331,6 +394,62 @@ def test_force_ecrase_la_cible_existante(photo, tmp_path):
     assert existant.read_bytes() == b"des octets de photo"
 
 
+def test_meme_systeme_de_fichiers_renomme_sans_copier(photo, tmp_path, monkeypatch):
+    """Sur le même système de fichiers, un renommage : le fichier garde son
+    inode, et la copie n'est pas appelée."""
+    monkeypatch.setattr(COPIE, lambda s, d: pytest.fail("copie inutile"))
+    inode = os.stat(photo.source).st_ino
+    cible = photo.renomme(str(tmp_path / "cible"))
+    assert os.stat(cible).st_ino == inode
+    assert photo.source == cible
+
+
+def test_lien_symbolique_range_le_fichier_pointe(photo, tmp_path):
+    """Le contenu pointé est rangé, comme par la copie d'origine ; le lien
+    est retiré, le fichier pointé reste en place."""
+    pointe = photo.source
+    lien = tmp_path / "source" / "lien.jpg"
+    lien.symlink_to("DSC_0001.jpg")
+    photo.source = str(lien)
+    cible = photo.renomme(str(tmp_path / "cible"))
+    assert not os.path.islink(cible)
+    assert open(cible, "rb").read() == b"des octets de photo"
+    assert not os.path.lexists(lien)
+    assert os.path.exists(pointe)
+
+
+def test_lien_symbolique_vers_la_cible_ne_l_efface_pas(photo, tmp_path):
+    existant = tmp_path / "cible" / "2013" / "Japon" / "lien.jpg"
+    existant.parent.mkdir(parents=True)
+    existant.write_bytes(b"seul contenu")
+    lien = tmp_path / "source" / "lien.jpg"
+    lien.symlink_to(existant)
+    photo.source = str(lien)
+    with pytest.raises(OSError):
+        photo.renomme(str(tmp_path / "cible"), force=True)
+    assert existant.read_bytes() == b"seul contenu"
+
+
+def test_lien_physique_vers_la_cible_retire_la_source(photo, tmp_path):
+    """`rename` entre deux liens d'un même fichier ne fait rien : la source
+    est retirée, la cible porte le contenu."""
+    existant = tmp_path / "cible" / "2013" / "Japon" / "DSC_0001.jpg"
+    existant.parent.mkdir(parents=True)
+    os.link(photo.source, existant)
+    origine = photo.source
+    cible = photo.renomme(str(tmp_path / "cible"), force=True)
+    assert cible == str(existant)
+    assert not os.path.exists(origine)
+    assert existant.read_bytes() == b"des octets de photo"
+
+
+def test_copier_conserve_l_original_sur_le_meme_systeme(photo, tmp_path):
+    origine = photo.source
+    cible = photo.renomme(str(tmp_path / "cible"), copier=True)
+    assert os.path.exists(origine)
+    assert open(cible, "rb").read() == b"des octets de photo"
+
+
 def test_transfert_incomplet_conserve_l_original(photo, tmp_path, monkeypatch):
     """Si la copie tronque, on ne supprime surtout pas la source."""
 
@@ -338,7 +457,8 @@ def test_transfert_incomplet_conserve_l_original(photo, tmp_path, monkeypatch):
         with open(cible, "wb") as f:
             f.write(b"tronque")
 
-    monkeypatch.setattr("shutil.copy", copie_tronquee)
+    _entre_supports(monkeypatch)
+    monkeypatch.setattr(COPIE, copie_tronquee)
 
     origine = photo.source
     with pytest.raises(TransfertIncomplet):
@@ -449,7 +569,8 @@ def test_squelette_absolu_est_refuse(photo, tmp_path):
 
 
 def test_transfert_incomplet_efface_la_cible(photo, tmp_path, monkeypatch):
-    monkeypatch.setattr("shutil.copy", lambda s, d: open(d, "wb").write(b"TRONQ"))
+    _entre_supports(monkeypatch)
+    monkeypatch.setattr(COPIE, lambda s, d: open(d, "wb").write(b"TRONQ"))
 
     with pytest.raises(TransfertIncomplet):
         photo.renomme(str(tmp_path / "cible"))
@@ -463,7 +584,8 @@ def test_apres_transfert_incomplet_le_second_essai_reussit(
     photo, tmp_path, monkeypatch
 ):
     """Régression : la cible tronquée faisait passer le 2e essai pour un succès."""
-    monkeypatch.setattr("shutil.copy", lambda s, d: open(d, "wb").write(b"TRONQ"))
+    _entre_supports(monkeypatch)
+    monkeypatch.setattr(COPIE, lambda s, d: open(d, "wb").write(b"TRONQ"))
     with pytest.raises(TransfertIncomplet):
         photo.renomme(str(tmp_path / "cible"))
 
@@ -474,7 +596,8 @@ def test_apres_transfert_incomplet_le_second_essai_reussit(
 
 def test_copie_disparue_leve_transfert_incomplet(photo, tmp_path, monkeypatch):
     """Une copie qui n'a rien écrit ne doit pas donner un FileNotFoundError."""
-    monkeypatch.setattr("shutil.copy", lambda s, d: None)
+    _entre_supports(monkeypatch)
+    monkeypatch.setattr(COPIE, lambda s, d: None)
     with pytest.raises(TransfertIncomplet):
         photo.renomme(str(tmp_path / "cible"))
     assert os.path.exists(photo.source)
@@ -493,7 +616,8 @@ def test_echec_de_copie_efface_la_cible_partielle(photo, tmp_path, monkeypatch):
     """Une copie qui échoue (hors ENOTSUP) après avoir écrit un reliquat ne doit
     pas le laisser sur le disque : sinon la garde « fichier existe » du prochain
     essai le prendrait pour un succès. L'original n'est jamais touché."""
-    monkeypatch.setattr("shutil.copy", _copie_partielle_puis_echoue)
+    _entre_supports(monkeypatch)
+    monkeypatch.setattr(COPIE, _copie_partielle_puis_echoue)
     with pytest.raises(OSError):
         photo.renomme(str(tmp_path / "cible"))
 
@@ -504,7 +628,8 @@ def test_echec_de_copie_efface_la_cible_partielle(photo, tmp_path, monkeypatch):
 
 def test_apres_echec_de_copie_le_second_essai_reussit(photo, tmp_path, monkeypatch):
     """Régression : le reliquat tronqué faisait passer le 2e essai pour un succès."""
-    monkeypatch.setattr("shutil.copy", _copie_partielle_puis_echoue)
+    _entre_supports(monkeypatch)
+    monkeypatch.setattr(COPIE, _copie_partielle_puis_echoue)
     with pytest.raises(OSError):
         photo.renomme(str(tmp_path / "cible"))
 
@@ -545,3 +670,63 @@ def test_gabarits_depuis_configuration_refuse_un_ordre_non_entier():
     `sorted(key=ordre)`, loin de la config. Refusé à la source."""
     with pytest.raises(ValueError):
         Gabarits.depuis_configuration(_config("[renommage]\nr1 = ['{nom}', '', '9']\n"))
+
+
+#
+# Squelettes compilés et chemins par lots
+#
+
+
+@pytest.mark.parametrize(
+    "squelette, attendu",
+    [
+        ("{annee}/{album}/{nom}", os.path.join("2013", "Japon", "b.jpg")),
+        ("{pays}/{album}//{nom}", os.path.join("Japon", "b.jpg")),
+        ("{album} - {annee:.2}/{nom!s:>6}", os.path.join("Japon - 20", " b.jpg")),
+        ("{prise:%Y/%m}/{nom}", os.path.join("2013", "03", "b.jpg")),
+        ("a\\{album}", os.path.join("a", "Japon")),
+        ("{pays}{pays}/", "/"),
+    ],
+)
+def test_squelette_compile(squelette, attendu):
+    from datetime import date
+
+    @attr.s
+    class PhotoDatee(Photo):
+        def _liste_champs_dispo(self):
+            return dict(super()._liste_champs_dispo(), prise=date(2013, 3, 17))
+
+    photo = PhotoDatee(source="/a/b.jpg", album="Japon", annee="2013")
+    gabarits = Gabarits([Gabarit(squelette=squelette)])
+    assert Renommeur(photo, gabarits)._construire_nouveau_nom() == attendu
+
+
+def test_squelette_assainit_les_champs_utilises():
+    photo = Photo(source="/a/b.jpg", album="../x/y")
+    gabarits = Gabarits([Gabarit(squelette="{album}")])
+    assert os.sep not in Renommeur(photo, gabarits)._construire_nouveau_nom()
+
+
+def test_construit_chemins_par_lot(tmp_path):
+    photos = [
+        Photo(source="/a/1.jpg", album="Japon", annee="2013"),
+        Photo(source="/a/2.jpg"),
+        Photo(source="/a/3.jpg", album="..", annee="2014"),
+    ]
+    resultats = list(construit_chemins(iter(photos), rep_cible=str(tmp_path)))
+
+    assert [r.element for r in resultats] == photos
+    assert [r.valeur for r in resultats] == [
+        str(tmp_path / "2013" / "Japon" / "1.jpg"),
+        str(tmp_path / "a-trier" / "2.jpg"),
+        str(tmp_path / "2014" / "__" / "3.jpg"),
+    ]
+    assert [r.valeur for r in construit_chemins(photos[:1])] == [
+        os.path.join("2013", "Japon", "1.jpg")
+    ]
+
+
+def test_construit_chemins_signale_les_echecs():
+    gabarits = Gabarits([Gabarit(squelette="/etc/{nom}")])
+    (resultat,) = construit_chemins([Photo(source="/a/b.jpg")], "/cible", gabarits)
+    assert isinstance(resultat.erreur, CibleHorsRepertoire)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Tests du transfert : renommage sur place, copies noyau et par tampon."""
+
+import errno
+import os
+import shutil
+
+import pytest
+from automatheque.renommage import transfert
+
+CONTENU = os.urandom(3 * 1024 * 1024 + 17)
+
+
+@pytest.fixture
+def source(tmp_path):
+    fichier = tmp_path / "source.bin"
+    fichier.write_bytes(CONTENU)
+    fichier.chmod(0o640)
+    return str(fichier)
+
+
+def _refuse(numero):
+    def _copie(*args):
+        raise OSError(numero, os.strerror(numero))
+
+    return _copie
+
+
+def test_deplace_renomme_sur_le_meme_systeme(source, tmp_path):
+    inode = os.stat(source).st_ino
+    cible = str(tmp_path / "cible.bin")
+    assert transfert.deplace(source, cible)
+    assert os.stat(cible).st_ino == inode
+    assert not os.path.exists(source)
+
+
+def test_deplace_renonce_pour_un_lien_symbolique(source, tmp_path):
+    """Renommé, le lien serait rangé à la place du fichier pointé."""
+    lien = tmp_path / "lien.bin"
+    lien.symlink_to("source.bin")
+    assert not transfert.deplace(str(lien), str(tmp_path / "cible.bin"))
+    assert os.path.islink(lien)
+
+
+def test_deplace_entre_deux_liens_physiques_retire_la_source(source, tmp_path):
+    cible = str(tmp_path / "cible.bin")
+    os.link(source, cible)
+    assert transfert.deplace(source, cible)
+    assert not os.path.exists(source)
+    assert os.stat(cible).st_nlink == 1
+
+
+def test_deplace_sur_lui_meme_ne_retire_rien(source, tmp_path):
+    autre_chemin = os.path.join(str(tmp_path), ".", "source.bin")
+    assert transfert.deplace(source, autre_chemin)
+    assert os.path.exists(source)
+
+
+def test_deplace_renonce_sur_un_autre_systeme(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "replace", _refuse(errno.EXDEV))
+    assert not transfert.deplace(source, str(tmp_path / "cible.bin"))
+    assert os.path.exists(source)
+
+
+@pytest.mark.parametrize("methode", ["copy_file_range", "sendfile", "tampon"])
+def test_copie_par_chaque_methode(source, tmp_path, monkeypatch, methode):
+    """Chaque méthode refusée passe la main à la suivante, sans rien abîmer."""
+    monkeypatch.setattr(transfert, "_FICLONE", None)
+    if methode != "copy_file_range":
+        monkeypatch.setattr(os, "copy_file_range", _refuse(errno.EXDEV), raising=False)
+    if methode == "tampon":
+        monkeypatch.setattr(os, "sendfile", _refuse(errno.EINVAL), raising=False)
+    cible = str(tmp_path / "cible.bin")
+    with open(source, "rb") as fsrc, open(cible, "wb") as fdst:
+        assert transfert._copie_contenu(fsrc, fdst, len(CONTENU)) == methode
+    with open(cible, "rb") as f:
+        assert f.read() == CONTENU
+
+
+def test_copie_conserve_contenu_et_droits(source, tmp_path):
+    cible = str(tmp_path / "cible.bin")
+    assert transfert.copie(source, cible) == cible
+    with open(cible, "rb") as f:
+        assert f.read() == CONTENU
+    assert os.stat(cible).st_mode == os.stat(source).st_mode
+    assert os.path.exists(source)
+
+
+def test_copie_d_un_fichier_vide(tmp_path):
+    (tmp_path / "vide").write_bytes(b"")
+    transfert.copie(str(tmp_path / "vide"), str(tmp_path / "copie"))
+    assert (tmp_path / "copie").read_bytes() == b""
+
+
+def test_copie_refuse_le_meme_fichier(source):
+    with pytest.raises(shutil.SameFileError):
+        transfert.copie(source, source)
+    with open(source, "rb") as f:
+        assert f.read() == CONTENU
+
+
+@pytest.mark.parametrize("numero", [errno.ENOSPC, errno.EPERM, errno.EBADF])
+def test_echec_en_cours_de_copie_remonte(source, tmp_path, monkeypatch, numero):
+    """Un disque plein, un refus de droits, un mauvais descripteur ne sont pas
+    des « non supporté » : pas de repli silencieux."""
+    monkeypatch.setattr(transfert, "_FICLONE", None)
+    monkeypatch.setattr(os, "copy_file_range", _refuse(numero), raising=False)
+    with pytest.raises(OSError) as exc:
+        transfert.copie(source, str(tmp_path / "cible.bin"))
+    assert exc.value.errno == numero
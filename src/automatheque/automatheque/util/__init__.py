@@ -3,6 +3,9 @@
 # Imports depuis fichier
 from .fichier import enleve_caracteres_invalides
 
+# Imports depuis inventaire
+from .inventaire import Inventaire
+
 # Imports depuis langues
 from .langues import (
     EN,
@@ -20,11 +23,14 @@ from .parallele import Resultat, parallelise
 from .reessaye import reessaye
 
 # Imports depuis repertoire
-from .repertoire import mkdir_p
+from .repertoire import mkdir_p, parcourt_fichiers
 
 # Imports depuis structures_python
 from .structures_python import dict_merge
 
+# Imports depuis surveillance
+from .surveillance import surveille
+
 # Imports depuis temps
 from .temps import (
     humanise_duree,
@@ -36,6 +42,8 @@ from .temps import (
 __all__ = [
     # .fichier
     "enleve_caracteres_invalides",
+    # .inventaire
+    "Inventaire",
     # .parallele
     "parallelise",
     "Resultat",
@@ -43,8 +51,11 @@ __all__ = [
     "reessaye",
     # .repertoire
     "mkdir_p",
+    "parcourt_fichiers",
     # .structures_python
     "dict_merge",
+    # .surveillance
+    "surveille",
     # .temps
     "parse_duree",
     "humanise_duree",
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Inventaire d'arborescences : ne traiter que ce qui a changé.
+
+Un script qui range une bibliothèque chaque nuit la reparcourt en entier pour
+n'y trouver, la plupart du temps, que quelques fichiers nouveaux.
+:class:`Inventaire` garde dans une base SQLite l'état de chaque fichier d'une
+racine — inode, taille, date de modification — et, au parcours suivant, ne
+produit que les différences : fichiers ajoutés, modifiés, supprimés.
+
+L'état n'est enregistré qu'une fois **tous** les changements consommés : un
+traitement interrompu en route retrouvera les mêmes changements la fois
+suivante.
+
+Exemple ::
+
+    with Inventaire() as inventaire:
+        for changement in inventaire.changements("/media/photos", inclus="*.jpg"):
+            if changement.nature != SUPPRIME:
+                range(changement.chemin)
+"""
+
+import logging
+import os
+import sqlite3
+from typing import Optional
+
+import attr
+
+from automatheque import constantes
+from automatheque.util.repertoire import parcourt_fichiers
+
+LOGGER = logging.getLogger(__name__)
+
+AJOUTE = "ajoute"
+MODIFIE = "modifie"
+SUPPRIME = "supprime"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fichiers (
+    racine TEXT NOT NULL,
+    chemin TEXT NOT NULL,
+    inode INTEGER NOT NULL,
+    taille INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (racine, chemin)
+)
+"""
+
+
+def chemin_inventaire_par_defaut():
+    """``<config>/automatheque/inventaire.sqlite``."""
+    return os.path.join(constantes.repertoire_config(), "inventaire.sqlite")
+
+
+@attr.s(frozen=True, slots=True)
+class EtatFichier:
+    """Ce qui, d'un parcours à l'autre, signale qu'un fichier a changé.
+
+    Un inode différent sous le même chemin, c'est un fichier remplacé.
+    """
+
+    inode: int = attr.ib()
+    taille: int = attr.ib()
+    mtime_ns: int = attr.ib()
+
+    @classmethod
+    def depuis_stat(cls, etat):
+        return cls(etat.st_ino, etat.st_size, etat.st_mtime_ns)
+
+
+@attr.s(frozen=True, slots=True)
+class Changement:
+    """Un fichier ajouté, modifié ou supprimé depuis le parcours précédent.
+
+    `etat` est l'état relevé par ce parcours, `ancien` celui du précédent :
+    le premier vaut None pour un fichier supprimé, le second pour un ajouté.
+    """
+
+    nature: str = attr.ib()
+    chemin: str = attr.ib()
+    etat: Optional[EtatFichier] = attr.ib(default=None)
+    ancien: Optional[EtatFichier] = attr.ib(default=None)
+
+
+class Inventaire(object):
+    """État des fichiers de chaque racine parcourue, gardé dans SQLite.
+
+    :param chemin: fichier de la base ; par défaut
+                   :func:`chemin_inventaire_par_defaut`. ``":memory:"`` donne
+                   un inventaire éphémère.
+    :param lot_ecritures: nombre d'états écrits d'un coup dans la base
+    """
+
+    def __init__(self, chemin=None, lot_ecritures=1000):
+        self.chemin = chemin or chemin_inventaire_par_defaut()
+        if self.chemin != ":memory:":
+            os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+        self._connexion = sqlite3.connect(self.chemin)
+        self._connexion.execute(_SCHEMA)
+        self._connexion.commit()
+        self._lot_ecritures = lot_ecritures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.ferme()
+
+    def ferme(self):
+        """Ferme la base."""
+        if self._connexion is not None:
+            self._connexion.close()
+            self._connexion = None
+
+    def oublie(self, racine):
+        """Oublie l'état d'une racine : le prochain parcours la verra neuve."""
+        with self._connexion:
+            self._connexion.execute(
+                "DELETE FROM fichiers WHERE racine = ?", (os.path.abspath(racine),)
+            )
+
+    def changements(self, racine, **options):
+        """Parcourt `racine` et produit les :class:`Changement` depuis le
+        parcours précédent.
+
+        Les ajouts et modifications arrivent au fil du parcours, les
+        suppressions à la fin. Le nouvel état n'est enregistré que si tous
+        les changements ont été consommés.
+
+        Le premier parcours d'une racine voit tous ses fichiers ajoutés. Les
+        filtres du parcours font partie de ce qu'on inventorie : changer
+        `inclus` ou `exclus` d'une fois à l'autre fait apparaître en ajouts ou
+        en suppressions les fichiers qui entrent ou sortent du filtre.
+
+        :param options: passées à
+                        :func:`~automatheque.util.repertoire.parcourt_fichiers`
+                        (`inclus`, `exclus`, `profondeur_max`, `threads`)
+        """
+        racine = os.path.abspath(racine)
+        connexion = self._connexion
+        curseur = connexion.cursor()
+        # Les chemins vus par ce parcours, pour trouver à la fin ceux qui ont
+        # disparu ; table temporaire, propre à la connexion.
+        curseur.execute("CREATE TEMP TABLE IF NOT EXISTS vus (chemin TEXT PRIMARY KEY)")
+        curseur.execute("DELETE FROM vus")
+        ecritures, vus = [], []
+        try:
+            for chemin in parcourt_fichiers(racine, chaines=True, **options):
+                try:
+                    etat = EtatFichier.depuis_stat(os.stat(chemin))
+                except OSError:
+                    continue  # disparu depuis la lecture du répertoire
+                vus.append((chemin,))
+                ligne = curseur.execute(
+                    "SELECT inode, taille, mtime_ns FROM fichiers"
+                    " WHERE racine = ? AND chemin = ?",
+                    (racine, chemin),
+                ).fetchone()
+                ancien = EtatFichier(*ligne) if ligne is not None else None
+                if ancien != etat:
+                    ecritures.append(
+                        (racine, chemin, etat.inode, etat.taille, etat.mtime_ns)
+                    )
+                    yield Changement(
+                        AJOUTE if ancien is None else MODIFIE, chemin, etat, ancien
+                    )
+                if len(vus) >= self._lot_ecritures:
+                    self._ecrit(curseur, ecritures, vus)
+            self._ecrit(curseur, ecritures, vus)
+
+            supprimes = curseur.execute(
+                "SELECT chemin, inode, taille, mtime_ns FROM fichiers"
+                " WHERE racine = ? AND chemin NOT IN (SELECT chemin FROM vus)",
+                (racine,),
+            ).fetchall()
+            for chemin, *ancien in supprimes:
+                yield Changement(SUPPRIME, chemin, None, EtatFichier(*ancien))
+            curseur.executemany(
+                "DELETE FROM fichiers WHERE racine = ? AND chemin = ?",
+                ((racine, chemin) for chemin, *_ in supprimes),
+            )
+            connexion.commit()
+            LOGGER.debug("Inventaire de %s : %d suppression(s)", racine, len(supprimes))
+        finally:
+            # Interrompu (ou en erreur) : rien de ce parcours n'est gardé, pas
+            # même les chemins vus, la table temporaire étant transactionnelle.
+            if connexion.in_transaction:
+                connexion.rollback()
+            curseur.close()
+
+    @staticmethod
+    def _ecrit(curseur, ecritures, vus):
+        """Écrit — sans valider — un lot d'états et de chemins vus, et les vide."""
+        curseur.executemany(
+            "INSERT OR REPLACE INTO fichiers VALUES (?, ?, ?, ?, ?)", ecritures
+        )
+        curseur.executemany("INSERT OR IGNORE INTO vus VALUES (?)", vus)
+        ecritures.clear()
+        vus.clear()
@@ -6,9 +6,12 @@ Divers utilitaires.
 """
 
 import errno
+import fnmatch
 import logging
 import os
+import re
 import warnings
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 LOGGER = logging.getLogger(__name__)
@@ -49,13 +52,127 @@ def supprime(repertoire, force=False):
             LOGGER.warning("Repertoire {} non supprime car non vide".format(repertoire))
 
 
+def _decoupe(chemin):
+    """`(ancre, parties)` d'un chemin POSIX, découpé comme le fait `pathlib`.
+
+    Les séparateurs répétés et les `.` disparaissent ; `..` reste une partie.
+    Exactement deux barres en tête forment une ancre à part (POSIX laisse
+    leur sens à l'implémentation), trois ou plus valent une seule.
+    """
+    if chemin[:1] == "/":
+        ancre = "//" if chemin[:2] == "//" and chemin[2:3] != "/" else "/"
+    else:
+        ancre = ""
+    return ancre, [p for p in chemin.split("/") if p and p != "."]
+
+
+class Arborescence(object):
+    """Remontées d'arborescence sous une même racine, sur de simples chaînes.
+
+    Même résultat que :func:`remonte_arborescence`, sans construire un seul
+    objet `Path` : la racine est découpée une fois, chaque fichier l'est d'un
+    `split`, et les parents sont recomposés par simple jointure. Pour remonter
+    des millions de fichiers sous une même racine, on garde l'instance.
+
+    Sous Windows, où `pathlib` connaît lecteurs et casse, les calculs lui sont
+    laissés.
+
+    :param racine: racine où s'arrêter ; à défaut, la racine du système de
+                   fichiers de chaque fichier (ou le répertoire courant pour
+                   un chemin relatif)
+    """
+
+    def __init__(self, racine=None):
+        # `not racine` et non `is None`, comme `remonte_arborescence` l'a
+        # toujours fait : une racine vide vaut l'absence de racine.
+        self.racine = racine if racine else None
+        self._posix = os.name != "nt"
+        if self.racine is not None and self._posix:
+            self._ancre, self._parties = _decoupe(os.fspath(self.racine))
+
+    def _niveaux(self, fichier):
+        """`(ancre, parties du fichier, nombre de parties de la racine)`.
+
+        :raise ValueError: si le fichier n'est pas sous la racine
+        """
+        ancre, parties = _decoupe(os.fspath(fichier))
+        if self.racine is None:
+            return ancre, parties, 0
+        prefixe = self._parties
+        if (
+            ancre != self._ancre
+            or len(parties) < len(prefixe)
+            or parties[: len(prefixe)] != prefixe
+        ):
+            raise ValueError(
+                "{!r} n'est pas sous la racine {!r}".format(
+                    os.fspath(fichier), os.fspath(self.racine)
+                )
+            )
+        return ancre, parties, len(prefixe)
+
+    def parents(self, fichier):
+        """Chemins des répertoires qui séparent `fichier` de la racine, du plus
+        proche au plus lointain, racine exclue.
+
+        :rtype: list[str]
+        :raise ValueError: si le fichier n'est pas sous la racine
+        """
+        if not self._posix:
+            return [str(p) for p in _remonte_pathlib(fichier, self.racine)]
+        ancre, parties, profondeur = self._niveaux(fichier)
+        return [
+            ancre + "/".join(parties[:fin])
+            for fin in range(len(parties) - 1, profondeur, -1)
+        ]
+
+    def noms(self, fichier):
+        """Noms de ces mêmes répertoires, du plus proche au plus lointain.
+
+        :rtype: list[str]
+        :raise ValueError: si le fichier n'est pas sous la racine
+        """
+        if not self._posix:
+            return [p.name for p in _remonte_pathlib(fichier, self.racine)]
+        _, parties, profondeur = self._niveaux(fichier)
+        return parties[profondeur : len(parties) - 1][::-1]
+
+    def noms_lot(self, fichiers):
+        """:meth:`noms` de chaque fichier, paresseusement.
+
+        :raise ValueError: au premier fichier qui n'est pas sous la racine
+        """
+        for fichier in fichiers:
+            yield self.noms(fichier)
+
+
+def noms_parents(fichier, racine=None):
+    """Noms des répertoires entre `fichier` et `racine`, du plus proche au
+    plus lointain : les `name` de :func:`remonte_arborescence`, sans `Path`.
+
+    :raise ValueError: si fichier n'est pas rattaché à la racine donnée
+    """
+    return Arborescence(racine).noms(fichier)
+
+
 def remonte_arborescence(fichier, racine=None):
     """Générateur qui renvoie le niveau précédent de l'arborescence.
 
-    Il s'arrête une fois que la racine est trouvée.
+    Il s'arrête une fois que la racine est trouvée. Les calculs se font sur
+    des chaînes (cf. :class:`Arborescence`) : seuls les parents renvoyés sont
+    des `Path`.
 
     :raise: ValueError si fichier n'est pas rattaché à la racine donnée
     """
+    classe = type(fichier) if isinstance(fichier, Path) else Path
+    # Liste calculée avant le premier `yield` : comme auparavant, le
+    # `ValueError` est levé dès le premier `next`, avant tout parent.
+    for parent in Arborescence(racine).parents(fichier):
+        yield classe(parent)
+
+
+def _remonte_pathlib(fichier, racine=None):
+    """La remontée d'origine, sur des `Path` ; utilisée hors POSIX."""
     if not isinstance(fichier, Path):
         fichier = Path(fichier)
     racine = fichier.root if not racine else racine
@@ -72,14 +189,167 @@ def iter_fichiers(source):
     """Itérateur de la liste des fichiers d'une source Path.
 
     On crée un itérateur que l'on ait reçu un fichier ou un rep en entrée !
+    La liste est entièrement construite avant d'être rendue : pour une grosse
+    arborescence, préférer :func:`parcourt_fichiers`, qui produit les fichiers
+    au fil du parcours.
 
     :param source: Source des fichiers : 1 rep ou 1 fichier
     :type source: Path
     """
     if source.is_dir():
         # On récupère tous les fichiers récursivement :
-        fichiers = source.rglob("*")
-    else:
-        # On ne récupère que le fichier d'entrée :
-        fichiers = source.parent.glob(source.name)
+        return list(parcourt_fichiers(source))
+    # On ne récupère que le fichier d'entrée :
+    fichiers = source.parent.glob(source.name)
     return [f for f in fichiers if not f.is_dir()]
+
+
+def _motifs(motifs):
+    """Une expression unique pour des motifs glob, ou None s'il n'y en a pas.
+
+    :return: `(expression, avec_chemin)` où `avec_chemin` est vrai si un motif
+             contient un `/` : il faut alors confronter aussi le chemin relatif
+    """
+    if not motifs:
+        return None
+    if isinstance(motifs, str):
+        motifs = (motifs,)
+    expression = re.compile("|".join(fnmatch.translate(m) for m in motifs))
+    return expression, any("/" in m for m in motifs)
+
+
+def _correspond(motifs, nom, relatif):
+    expression, avec_chemin = motifs
+    return expression.match(nom) is not None or (
+        avec_chemin and expression.match(relatif) is not None
+    )
+
+
+class _Parcours(object):
+    """Ce qu'il faut pour lire un répertoire du parcours ; sans état propre,
+    il peut servir à plusieurs fils à la fois."""
+
+    def __init__(self, inclus, exclus, profondeur_max):
+        self.inclus = _motifs(inclus)
+        self.exclus = _motifs(exclus)
+        self.profondeur_max = profondeur_max
+
+    def lit(self, repertoire, relatif, profondeur):
+        """Lit un répertoire : ses fichiers retenus, et les sous-répertoires à
+        parcourir en `(chemin, relatif, profondeur)`."""
+        fichiers, sous_repertoires = [], []
+        descend = self.profondeur_max is None or profondeur < self.profondeur_max
+        try:
+            with os.scandir(repertoire) as entrees:
+                for entree in entrees:
+                    nom = entree.name
+                    rel = relatif + nom
+                    if self.exclus is not None and _correspond(self.exclus, nom, rel):
+                        continue
+                    try:
+                        # Le type vient de la lecture du répertoire (`d_type`) :
+                        # pas de `stat` par entrée, sauf pour les liens.
+                        if entree.is_dir():
+                            # Comme `rglob`, on ne descend pas dans un lien
+                            # symbolique vers un répertoire, et on ne le rend
+                            # pas comme fichier.
+                            if descend and not entree.is_symlink():
+                                sous_repertoires.append(
+                                    (entree.path, rel + "/", profondeur + 1)
+                                )
+                            continue
+                    except OSError:
+                        pass  # disparu entre-temps, ou illisible : un fichier
+                    if self.inclus is None or _correspond(self.inclus, nom, rel):
+                        fichiers.append(entree.path)
+        except OSError as exc:
+            # Comme `rglob`, un répertoire illisible n'interrompt pas le
+            # parcours ; mais on le dit.
+            LOGGER.warning("Repertoire %s ignore : %s", repertoire, exc)
+        return fichiers, sous_repertoires
+
+
+def parcourt_fichiers(
+    source,
+    inclus=None,
+    exclus=None,
+    profondeur_max=None,
+    threads=None,
+    chaines=False,
+):
+    """Produit les fichiers d'une arborescence au fil de son parcours.
+
+    Contrairement à :func:`iter_fichiers`, rien n'est matérialisé : le premier
+    fichier arrive dès la lecture du premier répertoire. Le parcours repose
+    sur `os.scandir`, dont les entrées portent leur type : pas de `stat` par
+    fichier. Comme `rglob`, il ne descend pas dans les liens symboliques vers
+    des répertoires, et passe les répertoires illisibles.
+
+    Les motifs sont des glob (`fnmatch`) : sans `/`, ils portent sur le nom de
+    l'entrée ; avec, aussi sur son chemin relatif à `source` (séparé par
+    des `/`).
+
+    :param source: répertoire à parcourir
+    :param inclus: motif ou motifs que le nom d'un fichier doit vérifier
+                   (``"*.mkv"``, ``("*.jpg", "*.jpeg")``…) ; tous par défaut
+    :param exclus: motif ou motifs des fichiers **et répertoires** à écarter —
+                   un répertoire écarté n'est pas parcouru (``".*"`` pour les
+                   entrées cachées)
+    :param profondeur_max: nombre de niveaux de sous-répertoires à parcourir ;
+                           0 ne rend que les fichiers de `source`, None (défaut)
+                           ne borne pas
+    :param threads: si supérieur à 1, les répertoires sont lus par autant de
+                    fils — utile sur un partage réseau, où chaque lecture
+                    attend le serveur ; les fichiers sont alors produits dans
+                    l'ordre où leurs répertoires sont lus
+    :param chaines: si vrai, produit des `str` plutôt que des `Path`
+    :raise ValueError: si `profondeur_max` est négative — dès l'appel, pas
+                       au premier fichier
+    """
+    if profondeur_max is not None and profondeur_max < 0:
+        raise ValueError("profondeur_max doit être >= 0")
+    classe = str if chaines else (type(source) if isinstance(source, Path) else Path)
+    parcours = _Parcours(inclus, exclus, profondeur_max)
+    depart = (os.fspath(source), "", 0)
+    if threads is not None and threads > 1:
+        lectures = _lit_en_parallele(parcours, depart, threads)
+    else:
+        lectures = _lit_en_profondeur(parcours, depart)
+    return _produit(lectures, classe)
+
+
+def _produit(lectures, classe):
+    """Les fichiers de chaque lecture, un à un, dans la `classe` voulue."""
+    for fichiers in lectures:
+        for fichier in fichiers:
+            yield classe(fichier)
+
+
+def _lit_en_profondeur(parcours, depart):
+    """Les fichiers de chaque répertoire, en profondeur d'abord, dans un fil."""
+    pile = [depart]
+    while pile:
+        fichiers, sous_repertoires = parcours.lit(*pile.pop())
+        yield fichiers
+        # Inversés, pour parcourir les sous-répertoires dans l'ordre de lecture.
+        pile.extend(reversed(sous_repertoires))
+
+
+def _lit_en_parallele(parcours, depart, threads):
+    """Les fichiers de chaque répertoire, lus par un pool de fils."""
+    executeur = ThreadPoolExecutor(max_workers=threads)
+    try:
+        en_vol = {executeur.submit(parcours.lit, *depart)}
+        while en_vol:
+            finis, en_vol = wait(en_vol, return_when=FIRST_COMPLETED)
+            for futur in finis:
+                fichiers, sous_repertoires = futur.result()
+                en_vol.update(
+                    executeur.submit(parcours.lit, *s) for s in sous_repertoires
+                )
+                yield fichiers
+    finally:
+        # Un consommateur qui s'arrête en route n'attend pas la fin du
+        # parcours : les lectures encore en file sont annulées, seules celles
+        # déjà commencées (au plus une par fil) vont à leur terme.
+        executeur.shutdown(wait=True, cancel_futures=True)
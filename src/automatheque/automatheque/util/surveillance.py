@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""Surveillance d'un répertoire : les fichiers au fur et à mesure qu'ils arrivent.
+
+Passer un script toutes les cinq minutes sur un répertoire de dépôt coûte un
+parcours complet à chaque fois, pour rien la plupart du temps — et fait
+attendre jusqu'à cinq minutes le fichier qui vient d'arriver.
+:func:`surveille` produit au contraire chaque fichier dès qu'il est **fini
+d'écrire** :
+
+* sous Linux, par `inotify` (appelé par `ctypes`, sans dépendance) : le noyau
+  signale chaque fichier refermé après écriture, ou déplacé dans le
+  répertoire ;
+* ailleurs, ou si `inotify` n'est pas disponible, par scrutation : le
+  répertoire est relu toutes les `intervalle` secondes.
+
+Un fichier n'est produit qu'après `delai` secondes sans nouvelle écriture : un
+programme qui écrit un fichier en plusieurs fois, en le rouvrant, ne le voit
+pas traité à moitié. Avec `inotify`, une écriture seule n'arme pas ce délai :
+seul un fichier refermé (ou déplacé dans le répertoire) est mis en attente,
+et une écriture ne fait que repousser l'échéance d'un fichier déjà en
+attente — un fichier encore ouvert par un programme lent n'est pas produit.
+
+Exemple ::
+
+    for chemin in surveille("/depot/photos", delai=0.5):
+        range(chemin)
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+
+from automatheque.util.repertoire import parcourt_fichiers
+
+LOGGER = logging.getLogger(__name__)
+
+MODES = ("auto", "inotify", "scrutation")
+
+# Constantes d'inotify (cf. <sys/inotify.h>).
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_MASQUE = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF
+_ENTETE = struct.Struct("iIII")
+
+
+class _Attente(object):
+    """Les fichiers en attente de calme : chacun n'est prêt qu'après `delai`
+    secondes sans nouvelle écriture."""
+
+    def __init__(self, delai):
+        self.delai = delai
+        self._echeances = {}
+
+    def __len__(self):
+        return len(self._echeances)
+
+    def note(self, chemin, maintenant):
+        """Le fichier vient d'être écrit : son échéance est repoussée."""
+        self._echeances[chemin] = maintenant + self.delai
+
+    def repousse(self, chemin, maintenant):
+        """Repousse l'échéance du fichier s'il est déjà en attente, sans l'y
+        mettre sinon."""
+        if chemin in self._echeances:
+            self._echeances[chemin] = maintenant + self.delai
+
+    def oublie(self, chemin):
+        self._echeances.pop(chemin, None)
+
+    def oublie_sous(self, repertoire):
+        """Oublie les fichiers en attente sous `repertoire`."""
+        prefixe = os.path.join(repertoire, "")
+        for chemin in [c for c in self._echeances if c.startswith(prefixe)]:
+            del self._echeances[chemin]
+
+    def prochaine(self):
+        """L'échéance la plus proche, ou None si rien n'attend."""
+        return min(self._echeances.values(), default=None)
+
+    def prets(self, maintenant):
+        """Retire et renvoie les fichiers dont l'échéance est passée."""
+        prets = [c for c, e in self._echeances.items() if e <= maintenant]
+        for chemin in prets:
+            del self._echeances[chemin]
+        return sorted(prets)
+
+
+class _Inotify(object):
+    """Une instance inotify, et les répertoires qu'elle surveille."""
+
+    def __init__(self):
+        nom = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(nom, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify indisponible")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            numero = ctypes.get_errno()
+            raise OSError(numero, os.strerror(numero))
+        self._repertoires = {}
+
+    @classmethod
+    def ouvre(cls):
+        """Une instance inotify, ou None si le système n'en a pas."""
+        try:
+            return cls()
+        except (OSError, AttributeError, TypeError) as exc:
+            LOGGER.debug("inotify indisponible : %s", exc)
+            return None
+
+    def ajoute(self, repertoire):
+        """Surveille un répertoire (lui seul : pas ses sous-répertoires)."""
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(repertoire), ctypes.c_uint32(_MASQUE)
+        )
+        if wd < 0:
+            numero = ctypes.get_errno()
+            raise OSError(numero, os.strerror(numero), repertoire)
+        self._repertoires[wd] = repertoire
+
+    def lit(self):
+        """Les événements en attente, en `(chemin, masque)`."""
+        evenements = []
+        while True:
+            try:
+                donnees = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return evenements
+            position = 0
+            while position < len(donnees):
+                wd, masque, _, longueur = _ENTETE.unpack_from(donnees, position)
+                position += _ENTETE.size
+                nom = donnees[position : position + longueur].rstrip(b"\0")
+                position += longueur
+                if masque & _IN_Q_OVERFLOW:
+                    evenements.append((None, masque))
+                    continue
+                repertoire = self._repertoires.get(wd)
+                if masque & _IN_IGNORED:
+                    self._repertoires.pop(wd, None)
+                    continue
+                if repertoire is None:
+                    continue
+                chemin = (
+                    os.path.join(repertoire, os.fsdecode(nom)) if nom else repertoire
+                )
+                evenements.append((chemin, masque))
+
+    def ferme(self):
+        os.close(self.fd)
+
+
+def surveille(
+    repertoire,
+    delai=0.5,
+    recursif=True,
+    existants=False,
+    intervalle=1.0,
+    arret=None,
+    mode="auto",
+):
+    """Produit les fichiers de `repertoire` à mesure qu'ils finissent d'arriver.
+
+    Un fichier réécrit plus tard est produit de nouveau. Le générateur ne
+    s'arrête que si `arret` est levé, ou si on le ferme.
+
+    :param delai: secondes sans écriture au bout desquelles un fichier est
+                  considéré comme fini
+    :param recursif: surveille aussi les sous-répertoires, y compris ceux
+                     créés en cours de route
+    :param existants: produit aussi les fichiers déjà présents au départ
+    :param intervalle: en scrutation, secondes entre deux lectures du
+                       répertoire ; sinon, délai maximal avant de remarquer
+                       que `arret` est levé
+    :param arret: `threading.Event` (ou tout objet à `is_set()`) qui, levé,
+                  arrête la surveillance
+    :param mode: ``"inotify"``, ``"scrutation"``, ou ``"auto"`` (défaut) pour
+                 inotify s'il est disponible
+    :raise ValueError: mode inconnu, dès l'appel
+    :raise OSError: en mode ``"inotify"``, si inotify n'est pas disponible ;
+                    au premier tour du générateur, qui ouvre inotify
+    """
+    if mode not in MODES:
+        raise ValueError("mode doit être l'un de {}".format(", ".join(MODES)))
+    return _surveille(
+        os.fspath(repertoire), delai, recursif, existants, intervalle, arret, mode
+    )
+
+
+def _surveille(repertoire, delai, recursif, existants, intervalle, arret, mode):
+    """Le générateur de :func:`surveille` : inotify n'est ouvert qu'au premier
+    tour, et refermé quoi qu'il arrive — un générateur jamais parcouru ne
+    laisse pas de descripteur ouvert."""
+    inotify = None
+    if mode != "scrutation":
+        inotify = _Inotify.ouvre()
+        if inotify is None and mode == "inotify":
+            raise OSError("inotify n'est pas disponible sur ce système")
+    if inotify is None:
+        yield from _par_scrutation(
+            repertoire, delai, recursif, existants, intervalle, arret
+        )
+        return
+    try:
+        yield from _par_inotify(
+            inotify, repertoire, delai, recursif, existants, intervalle, arret
+        )
+    finally:
+        inotify.ferme()
+
+
+def _arrete(arret):
+    return arret is not None and arret.is_set()
+
+
+def _fichiers(repertoire, recursif):
+    return parcourt_fichiers(
+        repertoire, profondeur_max=None if recursif else 0, chaines=True
+    )
+
+
+def _par_inotify(inotify, repertoire, delai, recursif, existants, intervalle, arret):
+    attente = _Attente(delai)
+
+    def _surveille_arbre(racine, note):
+        """Surveille `racine` (et ses sous-répertoires) ; `note` reçoit les
+        fichiers qui s'y trouvent déjà."""
+        a_voir = [racine]
+        while a_voir:
+            courant = a_voir.pop()
+            try:
+                inotify.ajoute(courant)
+                with os.scandir(courant) as entrees:
+                    for entree in entrees:
+                        if entree.is_dir(follow_symlinks=False):
+                            if recursif:
+                                a_voir.append(entree.path)
+                        elif note is not None:
+                            note(entree.path)
+            except OSError as exc:
+                LOGGER.warning("Repertoire %s non surveille : %s", courant, exc)
+
+    maintenant = time.monotonic()
+    _surveille_arbre(
+        repertoire,
+        (lambda c: attente.note(c, maintenant)) if existants else None,
+    )
+    while not _arrete(arret):
+        prochaine = attente.prochaine()
+        delai_select = intervalle
+        if prochaine is not None:
+            delai_select = max(0.0, min(intervalle, prochaine - time.monotonic()))
+        lisibles, _, _ = select.select([inotify.fd], [], [], delai_select)
+        maintenant = time.monotonic()
+        if lisibles:
+            for chemin, masque in inotify.lit():
+                if chemin is None:
+                    # File d'événements débordée : des fichiers ont pu
+                    # nous échapper, on relit tout.
+                    LOGGER.warning("inotify : evenements perdus, relecture")
+                    for fichier in _fichiers(repertoire, recursif):
+                        attente.note(fichier, maintenant)
+                elif masque & _IN_DELETE_SELF:
+                    # Le répertoire surveillé a disparu : le noyau retire la
+                    # surveillance (`IN_IGNORED` suit), ses fichiers en
+                    # attente ne viendront plus.
+                    attente.oublie_sous(chemin)
+                elif masque & _IN_ISDIR:
+                    if recursif and masque & (_IN_CREATE | _IN_MOVED_TO):
+                        # Un sous-répertoire apparu : il peut déjà contenir
+                        # des fichiers, arrivés avant qu'on le surveille.
+                        _surveille_arbre(chemin, lambda c: attente.note(c, maintenant))
+                elif masque & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                    attente.note(chemin, maintenant)
+                elif masque & _IN_MODIFY:
+                    # Encore ouvert en écriture : seul un fichier déjà refermé
+                    # une fois voit son échéance repoussée.
+                    attente.repousse(chemin, maintenant)
+        for chemin in attente.prets(maintenant):
+            if os.path.isfile(chemin):
+                yield chemin
+
+
+def _par_scrutation(repertoire, delai, recursif, existants, intervalle, arret):
+    # chemin -> (taille, mtime_ns) relevés, et instant du dernier changement.
+    vus = {}
+    # chemin -> état déjà produit, pour ne le produire qu'une fois.
+    produits = {}
+    premiere = True
+    while not _arrete(arret):
+        maintenant = time.monotonic()
+        presents = set()
+        for chemin in _fichiers(repertoire, recursif):
+            try:
+                etat = os.stat(chemin)
+            except OSError:
+                continue
+            etat = (etat.st_size, etat.st_mtime_ns)
+            presents.add(chemin)
+            if premiere and not existants:
+                produits[chemin] = etat
+                continue
+            if produits.get(chemin) == etat:
+                continue
+            ancien = vus.get(chemin)
+            if ancien is None or ancien[0] != etat:
+                vus[chemin] = (etat, maintenant)
+            elif maintenant - ancien[1] >= delai:
+                produits[chemin] = etat
+                del vus[chemin]
+                yield chemin
+        premiere = False
+        for disparu in (set(vus) | set(produits)) - presents:
+            vus.pop(disparu, None)
+            produits.pop(disparu, None)
+        # Un fichier en attente de calme est relu dès son échéance.
+        attente = intervalle
+        if vus:
+            echeance = min(instant for _, instant in vus.values()) + delai
+            attente = max(0.0, min(intervalle, echeance - time.monotonic()))
+        if arret is not None:
+            arret.wait(attente)
+        else:
+            time.sleep(attente)
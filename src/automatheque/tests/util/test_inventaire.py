@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'inventaire d'arborescences (util/inventaire.py)."""
+
+import os
+
+import pytest
+from automatheque.util.inventaire import AJOUTE, MODIFIE, SUPPRIME, Inventaire
+
+
+@pytest.fixture
+def inventaire():
+    with Inventaire(":memory:") as inventaire:
+        yield inventaire
+
+
+def _ecrit(chemin, texte="x"):
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    chemin.write_text(texte)
+
+
+def _resume(changements, racine):
+    return sorted((c.nature, os.path.relpath(c.chemin, racine)) for c in changements)
+
+
+def test_premier_parcours_tout_est_ajoute(inventaire, tmp_path):
+    _ecrit(tmp_path / "a.txt")
+    _ecrit(tmp_path / "sous" / "b.txt")
+    assert _resume(inventaire.changements(tmp_path), tmp_path) == [
+        (AJOUTE, "a.txt"),
+        (AJOUTE, os.path.join("sous", "b.txt")),
+    ]
+    assert list(inventaire.changements(tmp_path)) == []
+
+
+def test_parcours_suivant_ne_donne_que_les_differences(inventaire, tmp_path):
+    _ecrit(tmp_path / "garde.txt")
+    _ecrit(tmp_path / "modifie.txt")
+    _ecrit(tmp_path / "supprime.txt")
+    list(inventaire.changements(tmp_path))
+
+    _ecrit(tmp_path / "modifie.txt", "plus long")
+    (tmp_path / "supprime.txt").unlink()
+    _ecrit(tmp_path / "nouveau.txt")
+    changements = list(inventaire.changements(tmp_path))
+    assert _resume(changements, tmp_path) == [
+        (AJOUTE, "nouveau.txt"),
+        (MODIFIE, "modifie.txt"),
+        (SUPPRIME, "supprime.txt"),
+    ]
+    modifie = next(c for c in changements if c.nature == MODIFIE)
+    assert (modifie.ancien.taille, modifie.etat.taille) == (1, 9)
+    supprime = next(c for c in changements if c.nature == SUPPRIME)
+    assert supprime.etat is None and supprime.ancien is not None
+
+
+def test_parcours_interrompu_n_enregistre_rien(inventaire, tmp_path):
+    for i in range(5):
+        _ecrit(tmp_path / "{}.txt".format(i))
+    changements = inventaire.changements(tmp_path)
+    next(changements)
+    changements.close()
+    assert len(list(inventaire.changements(tmp_path))) == 5
+
+
+def test_racines_independantes(inventaire, tmp_path):
+    _ecrit(tmp_path / "a" / "f.txt")
+    _ecrit(tmp_path / "b" / "g.txt")
+    list(inventaire.changements(tmp_path / "a"))
+    assert _resume(inventaire.changements(tmp_path / "b"), tmp_path) == [
+        (AJOUTE, os.path.join("b", "g.txt"))
+    ]
+    assert list(inventaire.changements(tmp_path / "a")) == []
+    inventaire.oublie(tmp_path / "a")
+    assert len(list(inventaire.changements(tmp_path / "a"))) == 1
+
+
+def test_options_de_parcours_et_persistance(tmp_path):
+    base = tmp_path / "inventaire.sqlite"
+    racine = tmp_path / "photos"
+    _ecrit(racine / "a.jpg")
+    _ecrit(racine / "b.txt")
+    with Inventaire(str(base), lot_ecritures=1) as inventaire:
+        assert _resume(inventaire.changements(racine, inclus="*.jpg"), racine) == [
+            (AJOUTE, "a.jpg")
+        ]
+    with Inventaire(str(base)) as inventaire:
+        assert list(inventaire.changements(racine, inclus="*.jpg")) == []
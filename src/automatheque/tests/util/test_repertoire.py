@@ -5,8 +5,12 @@ from pathlib import Path
 
 import pytest
 from automatheque.util.repertoire import (
+    Arborescence,
+    _remonte_pathlib,
     iter_fichiers,
     mkdir_p,
+    noms_parents,
+    parcourt_fichiers,
     remonte_arborescence,
     supprime,
 )
@@ -91,3 +95,114 @@ def test_iter_fichiers_sur_fichier_unique(tmp_path):
     f = tmp_path / "seul.txt"
     f.write_text("x")
     assert iter_fichiers(f) == [f]
+
+
+@pytest.mark.parametrize(
+    "fichier, racine",
+    [
+        ("/r/a/b/c.txt", "/r"),
+        ("/r/a/b/c.txt", "/r/"),
+        ("/r//a/./b/c.txt", "/r"),
+        ("/r/a/b/c.txt", None),
+        ("/r/a/b/c.txt", ""),
+        ("/r/a/../b/c.txt", "/r"),
+        ("//r/a/c.txt", None),
+        ("a/b/c.txt", None),
+        ("a/b/c.txt", "a"),
+        ("/r", "/r"),
+        ("/", None),
+    ],
+)
+def test_remonte_arborescence_identique_a_pathlib(fichier, racine):
+    """La remontée sur chaînes donne exactement les parents que donnait pathlib."""
+    attendus = list(_remonte_pathlib(Path(fichier), racine))
+    assert list(remonte_arborescence(Path(fichier), racine)) == attendus
+    assert noms_parents(fichier, racine) == [p.name for p in attendus]
+
+
+@pytest.mark.parametrize(
+    "fichier, racine",
+    [("/autre/x.txt", "/r"), ("a/x.txt", "/a"), ("/a/x.txt", "a"), ("/ra/x", "/r")],
+)
+def test_noms_parents_hors_racine_leve(fichier, racine):
+    with pytest.raises(ValueError):
+        noms_parents(fichier, racine)
+
+
+def test_arborescence_sert_tout_un_lot():
+    arborescence = Arborescence("/media")
+    assert list(
+        arborescence.noms_lot(["/media/s/Saison 1/e.mkv", Path("/media/f.mkv")])
+    ) == [["Saison 1", "s"], []]
+    assert arborescence.parents("/media/s/Saison 1/e.mkv") == [
+        "/media/s/Saison 1",
+        "/media/s",
+    ]
+
+
+@pytest.fixture
+def arbre(tmp_path):
+    """a.txt, b.jpg, .cache/c.txt, sous/d.txt, sous/profond/e.jpg"""
+    for relatif in (
+        "a.txt",
+        "b.jpg",
+        ".cache/c.txt",
+        "sous/d.txt",
+        "sous/profond/e.jpg",
+    ):
+        chemin = tmp_path / relatif
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        chemin.write_text("x")
+    return tmp_path
+
+
+def _relatifs(racine, fichiers):
+    return {Path(f).relative_to(racine).as_posix() for f in fichiers}
+
+
+@pytest.mark.parametrize("threads", [None, 4])
+def test_parcourt_fichiers_equivaut_a_rglob(arbre, threads):
+    attendus = {p for p in arbre.rglob("*") if not p.is_dir()}
+    assert set(parcourt_fichiers(arbre, threads=threads)) == attendus
+
+
+def test_parcourt_fichiers_est_paresseux(arbre):
+    fichiers = parcourt_fichiers(arbre)
+    assert not isinstance(fichiers, list)
+    assert next(fichiers).parent == arbre
+
+
+def test_parcourt_fichiers_filtres_et_profondeur(arbre):
+    assert _relatifs(arbre, parcourt_fichiers(arbre, inclus="*.jpg")) == {
+        "b.jpg",
+        "sous/profond/e.jpg",
+    }
+    assert _relatifs(arbre, parcourt_fichiers(arbre, exclus=(".*", "profond"))) == {
+        "a.txt",
+        "b.jpg",
+        "sous/d.txt",
+    }
+    assert _relatifs(arbre, parcourt_fichiers(arbre, exclus="sous/*")) == {
+        "a.txt",
+        "b.jpg",
+        ".cache/c.txt",
+    }
+    assert _relatifs(arbre, parcourt_fichiers(arbre, profondeur_max=0)) == {
+        "a.txt",
+        "b.jpg",
+    }
+    assert _relatifs(
+        arbre, parcourt_fichiers(arbre, profondeur_max=1, exclus=".*", threads=2)
+    ) == {"a.txt", "b.jpg", "sous/d.txt"}
+
+
+def test_parcourt_fichiers_en_chaines_sans_descendre_dans_les_liens(arbre):
+    (arbre / "lien").symlink_to(arbre / "sous", target_is_directory=True)
+    fichiers = list(parcourt_fichiers(arbre, chaines=True))
+    assert all(isinstance(f, str) for f in fichiers)
+    assert not any("lien" in f for f in fichiers)
+
+
+def test_parcourt_fichiers_profondeur_negative_refusee(arbre):
+    with pytest.raises(ValueError):
+        parcourt_fichiers(arbre, profondeur_max=-1)
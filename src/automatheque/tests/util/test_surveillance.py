@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Tests de la surveillance de répertoire (util/surveillance.py)."""
+
+import sys
+import threading
+import time
+
+import pytest
+from automatheque.util.surveillance import _Attente, _Inotify, surveille
+
+MODES = [
+    "scrutation",
+    pytest.param(
+        "inotify",
+        marks=pytest.mark.skipif(
+            not sys.platform.startswith("linux") or _Inotify.ouvre() is None,
+            reason="inotify indisponible",
+        ),
+    ),
+]
+
+
+def _ecrit_plus_tard(chemins, pause=0.1):
+    def _ecrit():
+        for chemin in chemins:
+            time.sleep(pause)
+            chemin.parent.mkdir(parents=True, exist_ok=True)
+            chemin.write_text("x")
+
+    fil = threading.Thread(target=_ecrit)
+    fil.start()
+    return fil
+
+
+def _premiers(fichiers, nombre):
+    recus = []
+    for chemin in fichiers:
+        recus.append(chemin)
+        if len(recus) == nombre:
+            fichiers.close()
+            return recus
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_produit_les_fichiers_qui_arrivent(tmp_path, mode):
+    (tmp_path / "deja.txt").write_text("x")
+    fichiers = surveille(tmp_path, delai=0.05, intervalle=0.05, mode=mode)
+    fil = _ecrit_plus_tard([tmp_path / "a.jpg", tmp_path / "sous" / "b.jpg"])
+    recus = _premiers(fichiers, 2)
+    fil.join()
+    assert sorted(recus) == [str(tmp_path / "a.jpg"), str(tmp_path / "sous" / "b.jpg")]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_existants_et_arret(tmp_path, mode):
+    (tmp_path / "deja.txt").write_text("x")
+    arret = threading.Event()
+    recus = []
+    for chemin in surveille(
+        tmp_path, delai=0.05, intervalle=0.05, existants=True, arret=arret, mode=mode
+    ):
+        recus.append(chemin)
+        arret.set()
+    assert recus == [str(tmp_path / "deja.txt")]
+
+
+def test_attente_repousse_l_echeance():
+    attente = _Attente(1.0)
+    attente.note("a", 0.0)
+    attente.note("b", 0.5)
+    attente.note("a", 0.8)
+    assert attente.prets(1.6) == ["b"]
+    assert attente.prochaine() == 1.8
+    assert attente.prets(1.8) == ["a"]
+    assert len(attente) == 0
+
+
+def test_attente_ecriture_seule_ne_met_pas_en_attente():
+    attente = _Attente(1.0)
+    attente.repousse("ouvert", 0.0)
+    assert len(attente) == 0
+    attente.note("ferme", 0.0)
+    attente.repousse("ferme", 0.5)
+    assert attente.prochaine() == 1.5
+
+
+def test_attente_oublie_sous_un_repertoire():
+    attente = _Attente(1.0)
+    for chemin in ("/depot/a/1", "/depot/a/b/2", "/depot/ab/3"):
+        attente.note(chemin, 0.0)
+    attente.oublie_sous("/depot/a")
+    assert attente.prets(2.0) == ["/depot/ab/3"]
+
+
+@pytest.mark.parametrize("mode", MODES[1:])
+def test_fichier_encore_ouvert_n_est_pas_produit(tmp_path, mode):
+    """Un programme lent qui garde le fichier ouvert au-delà du délai : le
+    fichier n'est produit qu'une fois refermé, complet."""
+    chemin = tmp_path / "lent.bin"
+    referme = threading.Event()
+
+    def _ecrit():
+        time.sleep(0.1)
+        with open(chemin, "wb") as fichier:
+            fichier.write(b"debut")
+            fichier.flush()
+            time.sleep(0.4)
+            fichier.write(b"fin")
+        referme.set()
+
+    fichiers = surveille(tmp_path, delai=0.05, intervalle=0.05, mode=mode)
+    fil = threading.Thread(target=_ecrit)
+    fil.start()
+    recus = _premiers(fichiers, 1)
+    assert referme.is_set()
+    assert recus == [str(chemin)]
+    assert chemin.read_bytes() == b"debutfin"
+    fil.join()
+
+
+def test_mode_inconnu():
+    with pytest.raises(ValueError):
+        surveille(".", mode="magie")
+
+
+def test_inotify_n_est_ouvert_qu_au_premier_tour(tmp_path, monkeypatch):
+    ouvertures = []
+    monkeypatch.setattr(
+        _Inotify, "ouvre", classmethod(lambda cls: ouvertures.append(1))
+    )
+    fichiers = surveille(tmp_path, mode="inotify")
+    assert ouvertures == []
+    fichiers.close()
+    assert ouvertures == []
+    with pytest.raises(OSError):
+        next(surveille(tmp_path, mode="inotify"))
+    assert ouvertures == [1]